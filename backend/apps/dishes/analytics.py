@@ -0,0 +1,137 @@
+""" Statistics of dishes aggregated by the database
+
+Energy is measured in power-seconds, the sum of seconds x power over
+atomic timings. Power histograms count seconds spent in buckets of
+POWER_BUCKET power units. A timing linked to a dish more than once counts
+once per link in every statistic, as it is listed in the timings of the
+dish. Statistics of a dish are cached under its dish cache version, so
+after a write only the changed dishes are aggregated again.
+"""
+from django.db import models
+from django.db.models.functions import Coalesce
+
+from distributions import percentile
+
+from .cache import statistics_cache
+from .models import AtomicTiming, Dish, DishTiming
+
+POWER_BUCKET = 10
+
+
+def empty_statistics():
+    return {
+        'timings': 0,
+        'steps': 0,
+        'total_seconds': 0,
+        'energy': 0,
+        'average_power': 0,
+        'power_histogram': [],
+    }
+
+
+def aggregate_statistics(dish_ids):
+    """
+    Aggregates statistics of dishes with two grouped queries whatever
+    the number of dishes and atomic timings is
+    :param dish_ids: list of int
+    :return: dict {dish_id: statistics}
+    """
+    statistics = {dish_id: empty_statistics() for dish_id in dish_ids}
+
+    # order_by() drops the default ordering which would be grouped by too
+    totals = DishTiming.objects.filter(dish_id__in=dish_ids).values(
+        'dish_id'
+    ).annotate(
+        timings=models.Count('id', distinct=True),
+        steps=models.Count('timing__atomic_timings'),
+        total_seconds=Coalesce(models.Sum('timing__atomic_timings__seconds'),
+                               0),
+        energy=Coalesce(models.Sum(
+            models.F('timing__atomic_timings__seconds') *
+            models.F('timing__atomic_timings__power')
+        ), 0),
+    ).order_by()
+    for row in totals:
+        dish_statistics = statistics[row['dish_id']]
+
+        for field in ('timings', 'steps', 'total_seconds', 'energy'):
+            dish_statistics[field] = row[field]
+        if row['total_seconds']:
+            dish_statistics['average_power'] = round(
+                row['energy'] / row['total_seconds'], 2
+            )
+
+    # one row per atomic timing and link of its timing to a dish
+    atomic_timings = AtomicTiming.objects.filter(
+        timing__dishes__id__in=dish_ids
+    ).order_by()
+
+    # integer division on both SQLite and PostgreSQL
+    buckets = atomic_timings.annotate(bucket=models.ExpressionWrapper(
+        models.F('power') / POWER_BUCKET * POWER_BUCKET,
+        output_field=models.IntegerField(),
+    )).values('timing__dishes', 'bucket').annotate(
+        seconds=models.Sum('seconds'),
+    ).order_by('timing__dishes', 'bucket')
+
+    for row in buckets:
+        statistics[row['timing__dishes']]['power_histogram'].append({
+            'power': row['bucket'],
+            'seconds': row['seconds'],
+        })
+
+    return statistics
+
+
+def dish_statistics(dish_ids):
+    """
+    Returns statistics of dishes, aggregating only the ones which are not
+    cached
+    :param dish_ids: list of int
+    :return: dict {dish_id: statistics}
+    """
+    return statistics_cache.get_many(dish_ids, aggregate_statistics)
+
+
+def summarize(values):
+    """
+    Describes a distribution
+    :param values: list of numbers
+    :return: dict {mean, p50, p90, max}
+    """
+    if not values:
+        return {'mean': 0, 'p50': 0, 'p90': 0, 'max': 0}
+
+    values = sorted(values)
+
+    return {
+        'mean': round(sum(values) / len(values), 2),
+        'p50': percentile(values, 0.5),
+        'p90': percentile(values, 0.9),
+        'max': values[-1],
+    }
+
+
+def users_distribution():
+    """
+    Describes how cook time and energy of dishes are distributed across
+    users, every user counting the whole of every dish they have. Totals
+    of users are aggregated by the database in one grouped query.
+    :return: dict {users, total_seconds, energy}
+    """
+    atomic = 'dish__timings__atomic_timings__'
+
+    # order_by() drops the default ordering which would be grouped by too
+    totals = Dish.users.through.objects.values('user_id').annotate(
+        total_seconds=Coalesce(models.Sum(f'{atomic}seconds'), 0),
+        energy=Coalesce(models.Sum(models.F(f'{atomic}seconds') *
+                                   models.F(f'{atomic}power')), 0),
+    ).order_by().values_list('total_seconds', 'energy')
+
+    totals = list(totals)
+
+    return {
+        'users': len(totals),
+        'total_seconds': summarize([seconds for seconds, _ in totals]),
+        'energy': summarize([energy for _, energy in totals]),
+    }
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class DishesConfig(AppConfig):
     name = 'dishes'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
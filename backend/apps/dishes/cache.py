@@ -0,0 +1,144 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class DishCache:
+    """
+    Caches data built from a dish tree per dish, e.g. serialized dishes
+    (DishSerializer output). Every dish has a version which is a part of
+    the cache keys of all kinds, so a write to a dish drops only its
+    entries. Dish lists of users are assembled from the entries, and the
+    backend is expected to be size bounded (LocMemCache culls least
+    recently used entries over MAX_ENTRIES) and shared by all processes,
+    since versions are bumped only in the cache, see dishes.checks.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.DISH_CACHE]
+
+    @staticmethod
+    def version_key(dish_id):
+        return f'dish-version:{dish_id}'
+
+    def key(self, dish_id, version):
+        return f'{self.kind}:{dish_id}:{version}'
+
+    def get_versions(self, dish_ids):
+        version_keys = {self.version_key(dish_id): dish_id
+                        for dish_id in dish_ids}
+
+        versions = {version_keys[key]: version for key, version
+                    in self.cache.get_many(version_keys).items()}
+
+        missing = [dish_id for dish_id in dish_ids if dish_id not in versions]
+        if missing:
+            # Start from the current time so that entries cached before
+            # the version key got evicted can not be served again
+            now = int(time.time() * 1000)
+            for dish_id in missing:
+                self.cache.add(self.version_key(dish_id), now, None)
+
+            versions.update(
+                (version_keys[key], version) for key, version
+                in self.cache.get_many(map(self.version_key, missing)).items()
+            )
+
+            # a full cache may cull the keys right away, the entries built
+            # under a version which is not kept are just never read again
+            for dish_id in missing:
+                versions.setdefault(dish_id, now)
+
+        return versions
+
+    def get_many(self, dish_ids, build):
+        """
+        Returns cached data of dishes building and caching only the
+        missing ones
+        :param dish_ids: list of int
+        :param build: callable which takes a list of missing dish ids and
+                      returns {dish_id: data}
+        :return: dict {dish_id: data}
+        """
+        versions = self.get_versions(dish_ids)
+        keys = {self.key(dish_id, versions[dish_id]): dish_id
+                for dish_id in dish_ids}
+
+        found = {keys[key]: data
+                 for key, data in self.cache.get_many(keys).items()}
+
+        missing = [dish_id for dish_id in dish_ids if dish_id not in found]
+        self.count(hits=len(found), misses=len(missing))
+
+        if missing:
+            built = build(missing)
+
+            self.cache.set_many(
+                {self.key(dish_id, versions[dish_id]): data
+                 for dish_id, data in built.items()},
+                settings.DISH_CACHE_TIMEOUT
+            )
+            found.update(built)
+
+        return found
+
+    def invalidate(self, dish_ids):
+        """
+        Drops cached entries of all kinds of the dishes, once right away
+        and once more when the transaction commits, so a concurrent read
+        of the old rows can not be cached under the new version
+        :param dish_ids: iterable of int
+        :return: None
+        """
+        dish_ids = set(dish_ids)
+        if not dish_ids:
+            return
+
+        self._incr_versions(dish_ids)
+        transaction.on_commit(lambda: self._incr_versions(dish_ids))
+
+    def _incr_versions(self, dish_ids):
+        for dish_id in dish_ids:
+            try:
+                self.cache.incr(self.version_key(dish_id))
+            except ValueError:
+                self.get_versions([dish_id])
+
+    def count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+
+        total = hits + misses
+
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+dish_cache = DishCache('dish')
+
+# see dishes.analytics
+statistics_cache = DishCache('dish-statistics')
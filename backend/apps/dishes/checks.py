@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_dish_cache(app_configs, **kwargs):
+    """
+    Dish cache versions are bumped in the cache, so every process serving
+    dishes has to share it, or processes serve bodies their own writes
+    did not invalidate under ETags of the current DishesVersion
+    """
+    if not isinstance(caches[settings.DISH_CACHE], LocMemCache):
+        return []
+
+    return [Warning(
+        f'DISH_CACHE {settings.DISH_CACHE!r} is local to the process.',
+        hint='Set DISH_CACHE_URL to a cache shared by all the processes, '
+             'e.g. Redis or memcached, unless a single process serves '
+             'the API.',
+        id='dishes.W001',
+    )]
@@ -0,0 +1,48 @@
+""" Conditional GET helpers for the dish endpoints """
+import hashlib
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, quote_etag
+
+
+def dishes_etag(request, version):
+    """
+    Builds an ETag of user's dishes representation. Query parameters
+    select different representations, so they are a part of the tag.
+    :param request: HttpRequest
+    :param version: DishesVersion
+    :return: str
+    """
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()[:8]
+
+    return quote_etag(f'{version.user_id}.{version.version}.{path}')
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Checks whether the client already has the current representation.
+    Only ETags are compared: Last-Modified has a precision of a second,
+    so a client could miss a write made later in the same second.
+    If-Modified-Since is ignored.
+    :param request: HttpRequest
+    :param etag: str - quoted ETag
+    :param last_modified: datetime or None - sent with the 304
+    :return: HttpResponseNotModified or None
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+
+    if if_none_match is None or etag not in parse_etags(if_none_match):
+        return None
+
+    return set_validators(HttpResponseNotModified(), etag, last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+
+    patch_vary_headers(response, ('Authorization',))
+
+    return response
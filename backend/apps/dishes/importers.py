@@ -0,0 +1,220 @@
+import codecs
+import json
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Dish
+from .serializers import DishImportSerializer
+from .utils import create_dishes
+
+
+class ImportStreamError(ValueError):
+    pass
+
+
+def iter_ndjson(stream):
+    """
+    Yields (index, dish data) pairs from a newline delimited JSON stream
+    reading one line at a time. A line which is not valid JSON is yielded
+    as ImportStreamError so the rest of the stream is still imported.
+    :param stream: file-like object with readline()
+    :return: generator
+    """
+    index = 0
+
+    for line in iter(stream.readline, b''):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            yield index, json.loads(line.decode())
+        except ValueError:
+            yield index, ImportStreamError('Invalid JSON')
+
+        index += 1
+
+
+def iter_json_array(stream, chunk_size=64 * 1024):
+    """
+    Yields (index, dish data) pairs from a JSON array decoding one element
+    at a time, so only the current element is kept in memory.
+    Stops with an ImportStreamError if the array is malformed.
+    :param stream: file-like object with read()
+    :param chunk_size: int - bytes read at once
+    :return: generator
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer, eof = '', False
+
+    def read():
+        nonlocal buffer, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer += utf8.decode(chunk, final=eof)
+
+    def next_char():
+        nonlocal buffer
+        buffer = buffer.lstrip()
+        while not buffer and not eof:
+            read()
+            buffer = buffer.lstrip()
+        return buffer[:1]
+
+    if next_char() != '[':
+        yield 0, ImportStreamError('Expected "["')
+        return
+
+    buffer = buffer[1:]
+    if next_char() == ']':
+        return
+
+    index = 0
+    while True:
+        next_char()
+        while True:
+            try:
+                data, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if eof:
+                    yield index, ImportStreamError('Invalid JSON')
+                    return
+                read()
+                continue
+
+            # a value which ends the buffer may go on in the next chunk
+            if end == len(buffer) and not eof:
+                read()
+                continue
+            break
+
+        yield index, data
+
+        index += 1
+        buffer = buffer[end:]
+
+        char = next_char()
+        if char == ']':
+            return
+        if char != ',':
+            yield index, ImportStreamError('Expected "," or "]"')
+            return
+
+        buffer = buffer[1:]
+
+
+class DishImporter:
+    """
+    Imports dishes of a cook in batches. Every batch is validated through
+    DishImportSerializer and written in a single transaction.
+    """
+
+    def __init__(self, cook, batch_size=None):
+        self.cook = cook
+        self.batch_size = batch_size or settings.DISHES_IMPORT_BATCH_SIZE
+
+        self.created = 0
+        self.failed = 0
+
+    def run(self, rows):
+        """
+        Imports rows and yields a result for every row followed by
+        a summary of the whole import
+        :param rows: iterable of (index, dish data) pairs
+        :return: generator of dicts
+        """
+        started = time.monotonic()
+        batch = []
+
+        for row in rows:
+            batch.append(row)
+
+            if len(batch) >= self.batch_size:
+                yield from self.import_batch(batch)
+                batch = []
+
+        if batch:
+            yield from self.import_batch(batch)
+
+        seconds = time.monotonic() - started
+        yield {
+            'created': self.created,
+            'failed': self.failed,
+            'seconds': round(seconds, 3),
+            'dishes_per_second': round(self.created / seconds, 1)
+            if seconds else 0,
+        }
+
+    def import_batch(self, batch):
+        results = {}
+        valid = []
+        names = set()
+
+        for index, data in batch:
+            if isinstance(data, ImportStreamError):
+                results[index] = {'non_field_errors': [str(data)]}
+                continue
+
+            serializer = DishImportSerializer(data=data)
+            if not serializer.is_valid():
+                results[index] = serializer.errors
+                continue
+
+            name = serializer.validated_data['name']
+            if name in names:
+                results[index] = {'name': ['Duplicate dish name in import']}
+                continue
+
+            names.add(name)
+            valid.append((index, serializer.validated_data))
+
+        existing_names = set(Dish.objects.filter(name__in=names)
+                             .values_list('name', flat=True))
+
+        for index, dish in valid:
+            if dish['name'] in existing_names:
+                results[index] = {'name': ['dish with this name '
+                                           'already exists.']}
+
+        valid = [(index, dish) for index, dish in valid
+                 if index not in results]
+
+        try:
+            with transaction.atomic():
+                db_dishes = create_dishes(self.cook,
+                                          [dish for _, dish in valid])
+        except IntegrityError:
+            # Another request took some of the names in the meantime
+            db_dishes = self.import_one_by_one(valid, results)
+
+        for (index, _), db_dish in zip(valid, db_dishes):
+            if db_dish:
+                results[index] = db_dish
+
+        for index, _ in batch:
+            result = results[index]
+
+            if isinstance(result, Dish):
+                self.created += 1
+                yield {'index': index, 'id': result.id}
+            else:
+                self.failed += 1
+                yield {'index': index, 'errors': result}
+
+    def import_one_by_one(self, valid, results):
+        db_dishes = []
+
+        for index, dish in valid:
+            try:
+                with transaction.atomic():
+                    db_dish, = create_dishes(self.cook, [dish])
+            except IntegrityError as error:
+                db_dish = None
+                results[index] = {'non_field_errors': [str(error)]}
+
+            db_dishes.append(db_dish)
+
+        return db_dishes
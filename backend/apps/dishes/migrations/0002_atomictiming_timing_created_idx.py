@@ -0,0 +1,23 @@
+# Generated by Django 2.1.4 on 2026-10-18 18:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='atomictiming',
+            name='timing',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='atomic_timings', to='dishes.Timing'),
+        ),
+        migrations.AddIndex(
+            model_name='atomictiming',
+            index=models.Index(fields=['timing', 'created'], name='atomic_timing_created_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 2.1.15 on 2026-10-18 18:17
+
+import struct
+import sys
+from array import array
+
+from django.db import migrations, models
+
+
+# format version 1 of dishes.programs, frozen as of this migration
+def compile_program(steps):
+    offsets = array('I')
+    powers = array('B')
+    total_seconds = power_seconds = 0
+
+    for seconds, power in steps:
+        total_seconds += seconds
+        power_seconds += seconds * power
+
+        offsets.append(total_seconds)
+        powers.append(power)
+
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+
+    header = struct.pack('<3sBHIQ', b'SSP', 1, len(powers), total_seconds,
+                         power_seconds)
+
+    return header + offsets.tobytes() + powers.tobytes()
+
+
+def compile_programs(apps, schema_editor):
+    Timing = apps.get_model('dishes', 'Timing')
+    AtomicTiming = apps.get_model('dishes', 'AtomicTiming')
+
+    for timing in Timing.objects.only('id').iterator():
+        timing.program = compile_program(
+            AtomicTiming.objects.filter(timing_id=timing.id)
+            .order_by('created', 'pk').values_list('seconds', 'power')
+        )
+        timing.save(update_fields=('program',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0002_atomictiming_timing_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timing',
+            name='program',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(compile_programs, migrations.RunPython.noop),
+    ]
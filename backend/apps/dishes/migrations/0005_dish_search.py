@@ -0,0 +1,83 @@
+from django.db import migrations
+
+# dishes.search as of this migration, frozen so that later changes of the
+# search backends do not change what it does
+SEARCH_TABLE = 'dishes_dish_search'
+
+
+def sqlite_has_fts5(cursor):
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+
+    return bool(cursor.fetchone()[0])
+
+
+def create_sqlite_index(cursor):
+    cursor.execute(
+        f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+        f"name, description, timings, tokenize='unicode61')"
+    )
+    cursor.execute(
+        f'INSERT INTO {SEARCH_TABLE} '
+        f'(rowid, name, description, timings) '
+        f'SELECT d.id, d.name, d.description, COALESCE(('
+        f"  SELECT group_concat(t.name, ' ') "
+        f'  FROM dishes_dish_timings dt '
+        f'  JOIN dishes_timing t ON t.id = dt.timing_id '
+        f'  WHERE dt.dish_id = d.id'
+        f"), '') "
+        f'FROM dishes_dish d'
+    )
+
+
+def create_postgres_index(cursor):
+    cursor.execute(
+        f'CREATE TABLE {SEARCH_TABLE} ('
+        f'  dish_id integer PRIMARY KEY REFERENCES dishes_dish (id) '
+        f'    ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,'
+        f'  document tsvector NOT NULL'
+        f')'
+    )
+    cursor.execute(
+        f'CREATE INDEX {SEARCH_TABLE}_document_idx '
+        f'ON {SEARCH_TABLE} USING GIN (document)'
+    )
+    cursor.execute(
+        f'INSERT INTO {SEARCH_TABLE} (dish_id, document) '
+        f"SELECT d.id, setweight(to_tsvector('simple', d.name), 'A') "
+        f"  || setweight(to_tsvector('simple', "
+        f"       COALESCE(string_agg(t.name, ' '), '')), 'B') "
+        f"  || setweight(to_tsvector('simple', d.description), 'C') "
+        f'FROM dishes_dish d '
+        f'LEFT JOIN dishes_dish_timings dt ON dt.dish_id = d.id '
+        f'LEFT JOIN dishes_timing t ON t.id = dt.timing_id '
+        f'GROUP BY d.id'
+    )
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite' and sqlite_has_fts5(cursor):
+            create_sqlite_index(cursor)
+        elif connection.vendor == 'postgresql':
+            create_postgres_index(cursor)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+
+    if connection.vendor in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0004_dishesversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
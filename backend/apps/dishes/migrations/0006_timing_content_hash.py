@@ -0,0 +1,70 @@
+# Generated by Django 2.1.15 on 2026-10-18 21:40
+
+import hashlib
+import struct
+import sys
+from array import array
+
+from django.db import migrations, models
+
+
+# format version 1 of dishes.programs, frozen as of this migration
+def compile_program(steps):
+    offsets = array('I')
+    powers = array('B')
+    total_seconds = power_seconds = 0
+
+    for seconds, power in steps:
+        total_seconds += seconds
+        power_seconds += seconds * power
+
+        offsets.append(total_seconds)
+        powers.append(power)
+
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+
+    header = struct.pack('<3sBHIQ', b'SSP', 1, len(powers), total_seconds,
+                         power_seconds)
+
+    return header + offsets.tobytes() + powers.tobytes()
+
+
+def timing_hash(name, program):
+    name = name.encode()
+
+    return hashlib.sha256(struct.pack('<I', len(name)) + name +
+                          bytes(program)).hexdigest()
+
+
+def hash_timings(apps, schema_editor):
+    Timing = apps.get_model('dishes', 'Timing')
+    AtomicTiming = apps.get_model('dishes', 'AtomicTiming')
+
+    for timing in Timing.objects.only('id', 'name', 'program').iterator():
+        program = timing.program
+        if program is None:
+            program = compile_program(
+                AtomicTiming.objects.filter(timing_id=timing.id)
+                .order_by('created', 'pk').values_list('seconds', 'power')
+            )
+
+        Timing.objects.filter(pk=timing.pk).update(
+            program=program, content_hash=timing_hash(timing.name, program)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0005_dish_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timing',
+            name='content_hash',
+            field=models.CharField(db_index=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(hash_timings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """
+    Turns the automatic table of Dish.timings into the DishTiming model
+    and drops its unique (dish, timing) constraint, so a dish can link
+    identical timings more than once
+    """
+
+    dependencies = [
+        ('dishes', '0006_timing_content_hash'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.CreateModel(
+                name='DishTiming',
+                fields=[
+                    ('id', models.AutoField(auto_created=True,
+                                            primary_key=True,
+                                            serialize=False,
+                                            verbose_name='ID')),
+                    ('dish', models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='dishes.Dish')),
+                    ('timing', models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='dishes.Timing')),
+                ],
+                options={
+                    'db_table': 'dishes_dish_timings',
+                    'unique_together': {('dish', 'timing')},
+                },
+            ),
+            migrations.AlterField(
+                model_name='dish',
+                name='timings',
+                field=models.ManyToManyField(related_name='dishes',
+                                             through='dishes.DishTiming',
+                                             to='dishes.Timing'),
+            ),
+        ]),
+        migrations.AlterUniqueTogether(
+            name='dishtiming',
+            unique_together=set(),
+        ),
+    ]
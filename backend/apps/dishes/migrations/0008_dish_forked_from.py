@@ -0,0 +1,19 @@
+# Generated by Django 2.1.15 on 2026-10-18 19:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0007_dishtiming'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='forked_from',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='forks', to='dishes.Dish'),
+        ),
+    ]
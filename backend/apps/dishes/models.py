@@ -1,22 +1,64 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.dispatch import Signal
 from django.utils import timezone
 
 from users.models import User
+from .programs import compile_program
 
 
+class TimingQuerySet(models.QuerySet):
+
+    def with_atomic(self):
+        """
+        Prefetches atomic timings in their execution order
+        :return: TimingQuerySet
+        """
+        return self.prefetch_related(
+            models.Prefetch('atomic_timings',
+                            queryset=AtomicTiming.objects.order_by('created',
+                                                                   'pk'))
+        )
+
 
 class Timing(models.Model):
+    """
+    Timings are shared by every dish with the same timing content and are
+    not modified in place, see dishes.utils.bulk_create_timings and
+    dishes.utils.replace_timing
+    """
     name = models.CharField(max_length=50)
 
+    # see dishes.programs, compiled whenever atomic timings are written
+    program = models.BinaryField(null=True)
+
+    # see dishes.programs.timing_hash
+    content_hash = models.CharField(max_length=64, null=True, db_index=True)
+
+    objects = TimingQuerySet.as_manager()
+
+    def compile_program(self):
+        """
+        Compiles and saves the program from stored atomic timings
+        :return: bytes
+        """
+        self.program = compile_program(
+            self.atomic_timings.order_by('created', 'pk')
+            .values_list('seconds', 'power')
+        )
+        self.save(update_fields=('program',))
+
+        return self.program
+
     class Meta:
         ordering = ('name',)
 
 
 class AtomicTiming(models.Model):
 
+    # indexed as the leading column of the index below
     timing = models.ForeignKey(Timing, on_delete=models.CASCADE,
-                               related_name='atomic_timings')
+                               related_name='atomic_timings', db_index=False)
     seconds = models.IntegerField(validators=[MinValueValidator(10),
                                             MaxValueValidator(18000)])
     power = models.IntegerField(validators=[MinValueValidator(10),
@@ -25,6 +67,56 @@ class AtomicTiming(models.Model):
 
     class Meta:
         ordering = ('created',)
+        indexes = [
+            models.Index(fields=('timing', 'created'),
+                         name='atomic_timing_created_idx'),
+        ]
+
+
+def timings_prefetch():
+    """
+    Prefetch of the whole timing tree of dishes
+    :return: Prefetch
+    """
+    return models.Prefetch('timings', queryset=Timing.objects.with_atomic())
+
+
+class DishQuerySet(models.QuerySet):
+
+    def owned_by(self, user):
+        return self.filter(users__id=user.id)
+
+    def with_timings(self):
+        """
+        Prefetches the whole timing tree so that serializing any number of
+        dishes costs a fixed number of queries
+        :return: DishQuerySet
+        """
+        return self.prefetch_related(timings_prefetch())
+
+    def iter_pages(self, page_size):
+        """
+        Yields dishes ordered by name page by page. Every page is fetched
+        with a keyset condition on the unique name, so it costs the same
+        however deep into the list it is and prefetches still apply.
+        :param page_size: int
+        :return: generator of lists of Dish
+        """
+        queryset = self.order_by('name', 'id')
+        last_name = None
+
+        while True:
+            if last_name is not None:
+                page = list(queryset.filter(name__gt=last_name)[:page_size])
+            else:
+                page = list(queryset[:page_size])
+
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+
+            last_name = page[-1].name
 
 
 class Dish(models.Model):
@@ -33,10 +125,77 @@ class Dish(models.Model):
     description = models.TextField(blank=True)
 
     users = models.ManyToManyField(User, related_name='dishes')
-    timings = models.ManyToManyField(Timing, related_name='dishes')
+    timings = models.ManyToManyField(Timing, related_name='dishes',
+                                     through='DishTiming')
+
+    # the dish this one was forked from, see dishes.utils.fork_dishes
+    forked_from = models.ForeignKey('self', null=True, blank=True,
+                                    on_delete=models.SET_NULL,
+                                    related_name='forks')
+
+    objects = DishQuerySet.as_manager()
 
     class Meta:
         ordering = ('name',)
 
 
+class DishTiming(models.Model):
+    """
+    A timing of a dish. A dish links a timing once per time it has been
+    submitted, so identical timings of a dish share a Timing row but keep
+    their links. Links are written by dishes.utils.
+    """
+
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE)
+    timing = models.ForeignKey(Timing, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'dishes_dish_timings'
+
+
+# Sent with user_ids whenever DishesVersion of the users is bumped
+dishes_changed = Signal(providing_args=['user_ids'])
+
+
+class DishesVersionQuerySet(models.QuerySet):
+
+    def for_user(self, user):
+        """
+        Returns version of user's dishes creating it on the first read
+        :param user: User
+        :return: DishesVersion
+        """
+        version, _ = self.get_or_create(user_id=user.id)
+
+        return version
+
+    def bump(self, user_ids):
+        """
+        Marks dishes of the users as changed
+        :param user_ids: iterable of int or a values_list queryset
+        :return: None
+        """
+        if not isinstance(user_ids, models.QuerySet):
+            user_ids = set(user_ids)
+
+        self.filter(user_id__in=user_ids).update(
+            version=models.F('version') + 1, modified=timezone.now()
+        )
+
+        dishes_changed.send(sender=self.model, user_ids=user_ids)
+
+
+class DishesVersion(models.Model):
+    """
+    Version of everything a user can read through the dish endpoints.
+    It is bumped on every write to user's dishes, timings and atomic
+    timings, so reads can be answered conditionally.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='dishes_version')
+    version = models.PositiveIntegerField(default=1)
+    modified = models.DateTimeField(default=timezone.now)
 
+    objects = DishesVersionQuerySet.as_manager()
@@ -0,0 +1,89 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, _positive_int
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class DishCursorPagination(CursorPagination):
+    ordering = ('name', 'id')
+    page_size = settings.DISHES_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.DISHES_MAX_PAGE_SIZE
+
+    def is_requested(self, request):
+        """
+        Pagination is opt-in so that clients which expect a plain list
+        keep working
+        :param request: Request
+        :return: bool
+        """
+        return (self.cursor_query_param in request.query_params or
+                self.page_size_query_param in request.query_params)
+
+
+class DishSearchPagination:
+    """
+    Offset pagination of ranked search results. Ranking is computed by
+    the search index, so pages are sliced there and no total is counted,
+    one extra result tells whether there is a next page.
+    """
+    page_size = settings.DISHES_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.DISHES_MAX_PAGE_SIZE
+    offset_query_param = 'offset'
+
+    def __init__(self, request):
+        self.request = request
+
+        try:
+            self.page_size = _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True, cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            pass
+
+        try:
+            self.offset = _positive_int(
+                request.query_params[self.offset_query_param]
+            )
+        except (KeyError, ValueError):
+            self.offset = 0
+
+    def paginate(self, search):
+        """
+        :param search: callable which takes limit and offset and returns
+                       a list
+        :return: list - the page
+        """
+        results = search(self.page_size + 1, self.offset)
+
+        self.has_next = len(results) > self.page_size
+
+        return results[:self.page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.offset_query_param,
+                                   self.offset + self.page_size)
+
+
+def stream_json_list(pages, serialize):
+    """
+    Serializes pages of objects into JSON list chunks one page at a time
+    :param pages: iterable of lists of model instances
+    :param serialize: callable which serializes a page into a list
+    :return: generator of str
+    """
+    encoder = JSONEncoder()
+    separator = '['
+
+    for page in pages:
+        for item in serialize(page):
+            yield separator + encoder.encode(item)
+            separator = ','
+
+    yield '[]' if separator == '[' else ']'
@@ -0,0 +1,98 @@
+""" Compiled cooking programs which stoves execute
+
+A program is a little-endian binary blob:
+    header: magic b'SSP', format version (uint8), steps count (uint16),
+            total seconds (uint32), energy in power-seconds (uint64)
+    steps count uint32 cumulative offsets in seconds at which steps end
+    steps count uint8 power levels
+"""
+import hashlib
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+MAGIC = b'SSP'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<3sBHIQ')
+
+# fits the uint16 steps count, offsets and power-seconds of that many
+# atomic timings of at most 18000 seconds and 100 power fit as well
+MAX_STEPS = 0xFFFF
+
+Program = namedtuple('Program', ('total_seconds', 'power_seconds',
+                                 'offsets', 'powers'))
+
+
+def compile_program(steps):
+    """
+    Compiles atomic timings of a timing in their execution order
+    :param steps: iterable of (seconds, power) pairs
+    :return: bytes
+    :raise ValueError: if there are more than MAX_STEPS steps
+    """
+    offsets = array('I')
+    powers = array('B')
+    total_seconds = power_seconds = 0
+
+    for seconds, power in steps:
+        total_seconds += seconds
+        power_seconds += seconds * power
+
+        offsets.append(total_seconds)
+        powers.append(power)
+
+    if len(powers) > MAX_STEPS:
+        raise ValueError(f'A program has at most {MAX_STEPS} steps')
+
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(powers), total_seconds,
+                         power_seconds)
+
+    return header + offsets.tobytes() + powers.tobytes()
+
+
+def parse_program(program):
+    """
+    Reads a compiled program back
+    :param program: bytes
+    :return: Program
+    :raise ValueError: if it is not a program
+    """
+    program = bytes(program)
+    if len(program) < HEADER.size:
+        raise ValueError('Unknown program format')
+
+    magic, version, count, total_seconds, power_seconds = \
+        HEADER.unpack_from(program)
+
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError('Unknown program format')
+
+    offsets = array('I')
+    offsets.frombytes(program[HEADER.size:HEADER.size + 4 * count])
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+
+    powers = array('B', program[HEADER.size + 4 * count:])
+
+    return Program(total_seconds, power_seconds, list(offsets), list(powers))
+
+
+def program_etag(program):
+    return hashlib.md5(bytes(program)).hexdigest()
+
+
+def timing_hash(name, program):
+    """
+    Content hash of a timing, the program stands for its atomic timings
+    :param name: str
+    :param program: bytes - compiled atomic timings of the timing
+    :return: str - hex digest
+    """
+    name = name.encode()
+
+    return hashlib.sha256(struct.pack('<I', len(name)) + name +
+                          bytes(program)).hexdigest()
@@ -0,0 +1,256 @@
+""" Full text search over dishes
+
+The search index keeps a document of every dish made of its name,
+description and timing names. SQLite uses an FTS5 table ranked by bm25,
+PostgreSQL a tsvector table with a GIN index ranked by ts_rank and other
+databases fall back to unranked icontains lookups. The index is created
+by migration 0005_dish_search and kept in sync by dishes.signals and the
+bulk writes in dishes.utils.
+
+Every word of a query has to match the beginning of a word of the dish.
+"""
+import re
+
+from django.db import connection as default_connection
+from django.db.models import Q
+
+from .models import Dish
+
+SEARCH_TABLE = 'dishes_dish_search'
+INDEX_BATCH_SIZE = 500
+
+# name, description and timing names weights
+SQLITE_WEIGHTS = (10.0, 1.0, 5.0)
+
+# search backend classes by connection alias
+_search_classes = {}
+
+
+def query_words(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def batches(dish_ids):
+    dish_ids = list(dish_ids)
+
+    for start in range(0, len(dish_ids), INDEX_BATCH_SIZE):
+        yield dish_ids[start:start + INDEX_BATCH_SIZE]
+
+
+class SqliteSearch:
+
+    @staticmethod
+    def is_available(connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+
+            return bool(cursor.fetchone()[0])
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+            f"name, description, timings, tokenize='unicode61')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def index(self, cursor, dish_ids):
+        for batch in batches(dish_ids):
+            placeholders = ', '.join(['%s'] * len(batch))
+
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+                batch
+            )
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} '
+                f'(rowid, name, description, timings) '
+                f'SELECT d.id, d.name, d.description, COALESCE(('
+                f"  SELECT group_concat(t.name, ' ') "
+                f'  FROM dishes_dish_timings dt '
+                f'  JOIN dishes_timing t ON t.id = dt.timing_id '
+                f'  WHERE dt.dish_id = d.id'
+                f"), '') "
+                f'FROM dishes_dish d WHERE d.id IN ({placeholders})',
+                batch
+            )
+
+    def unindex(self, cursor, dish_ids):
+        for batch in batches(dish_ids):
+            placeholders = ', '.join(['%s'] * len(batch))
+
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+                batch
+            )
+
+    def search(self, cursor, user_id, words, limit, offset):
+        weights = ', '.join(map(str, SQLITE_WEIGHTS))
+        match = ' '.join(f'"{word}"*' for word in words)
+
+        cursor.execute(
+            f'SELECT {SEARCH_TABLE}.rowid FROM {SEARCH_TABLE} '
+            f'JOIN dishes_dish_users u ON u.dish_id = {SEARCH_TABLE}.rowid '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND u.user_id = %s '
+            f'ORDER BY bm25({SEARCH_TABLE}, {weights}), '
+            f'{SEARCH_TABLE}.rowid '
+            f'LIMIT %s OFFSET %s',
+            [match, user_id, limit, offset]
+        )
+
+        return [dish_id for dish_id, in cursor.fetchall()]
+
+
+class PostgresSearch:
+
+    @staticmethod
+    def is_available(connection):
+        return True
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE {SEARCH_TABLE} ('
+            f'  dish_id integer PRIMARY KEY REFERENCES dishes_dish (id) '
+            f'    ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,'
+            f'  document tsvector NOT NULL'
+            f')'
+        )
+        cursor.execute(
+            f'CREATE INDEX {SEARCH_TABLE}_document_idx '
+            f'ON {SEARCH_TABLE} USING GIN (document)'
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def index(self, cursor, dish_ids):
+        for batch in batches(dish_ids):
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (dish_id, document) '
+                f"SELECT d.id, setweight(to_tsvector('simple', d.name), 'A') "
+                f"  || setweight(to_tsvector('simple', "
+                f"       COALESCE(string_agg(t.name, ' '), '')), 'B') "
+                f"  || setweight(to_tsvector('simple', d.description), 'C') "
+                f'FROM dishes_dish d '
+                f'LEFT JOIN dishes_dish_timings dt ON dt.dish_id = d.id '
+                f'LEFT JOIN dishes_timing t ON t.id = dt.timing_id '
+                f'WHERE d.id = ANY(%s) GROUP BY d.id '
+                f'ON CONFLICT (dish_id) '
+                f'DO UPDATE SET document = EXCLUDED.document',
+                [batch]
+            )
+
+    def unindex(self, cursor, dish_ids):
+        # rows of deleted dishes are deleted in cascade
+        pass
+
+    def search(self, cursor, user_id, words, limit, offset):
+        query = ' & '.join(f'{word}:*' for word in words)
+
+        cursor.execute(
+            f'SELECT s.dish_id FROM {SEARCH_TABLE} s '
+            f'JOIN dishes_dish_users u ON u.dish_id = s.dish_id, '
+            f"to_tsquery('simple', %s) query "
+            f'WHERE s.document @@ query AND u.user_id = %s '
+            f'ORDER BY ts_rank(s.document, query) DESC, s.dish_id '
+            f'LIMIT %s OFFSET %s',
+            [query, user_id, limit, offset]
+        )
+
+        return [dish_id for dish_id, in cursor.fetchall()]
+
+
+class FallbackSearch:
+    """ Scans dishes, for databases without a supported full text search """
+
+    @staticmethod
+    def is_available(connection):
+        return True
+
+    def create(self, cursor):
+        pass
+
+    def drop(self, cursor):
+        pass
+
+    def index(self, cursor, dish_ids):
+        pass
+
+    def unindex(self, cursor, dish_ids):
+        pass
+
+    def search(self, cursor, user_id, words, limit, offset):
+        dishes = Dish.objects.filter(users__id=user_id)
+
+        for word in words:
+            dishes = dishes.filter(Q(name__icontains=word) |
+                                   Q(description__icontains=word) |
+                                   Q(timings__name__icontains=word))
+
+        return list(dishes.order_by('name', 'id').distinct()
+                    .values_list('id', flat=True)[offset:offset + limit])
+
+
+def get_search(connection=None):
+    """
+    Returns search backend of a database connection
+    :param connection: DatabaseWrapper, the default one if None
+    :return: SqliteSearch, PostgresSearch or FallbackSearch
+    """
+    connection = connection or default_connection
+
+    search_class = _search_classes.get(connection.alias)
+    if search_class is None:
+        search_class = {
+            'sqlite': SqliteSearch,
+            'postgresql': PostgresSearch,
+        }.get(connection.vendor, FallbackSearch)
+
+        if not search_class.is_available(connection):
+            search_class = FallbackSearch
+
+        _search_classes[connection.alias] = search_class
+
+    return search_class()
+
+
+def index_dishes(dish_ids):
+    """
+    Writes current documents of the dishes into the search index
+    :param dish_ids: iterable of int
+    :return: None
+    """
+    dish_ids = set(dish_ids)
+    if dish_ids:
+        with default_connection.cursor() as cursor:
+            get_search().index(cursor, dish_ids)
+
+
+def unindex_dishes(dish_ids):
+    """
+    Removes documents of deleted dishes from the search index
+    :param dish_ids: iterable of int
+    :return: None
+    """
+    dish_ids = set(dish_ids)
+    if dish_ids:
+        with default_connection.cursor() as cursor:
+            get_search().unindex(cursor, dish_ids)
+
+
+def search_dishes(user, text, limit, offset=0):
+    """
+    Searches user's dishes, the best matching first
+    :param user: User
+    :param text: str - query
+    :param limit: int
+    :param offset: int
+    :return: list of dish ids
+    """
+    words = query_words(text)
+    if not words:
+        return []
+
+    with default_connection.cursor() as cursor:
+        return get_search().search(cursor, user.id, words, limit, offset)
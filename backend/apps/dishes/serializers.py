@@ -1,6 +1,11 @@
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 
-from .models import Dish, Timing, AtomicTiming
+from .cache import dish_cache
+from .models import Dish, Timing, AtomicTiming, timings_prefetch
+from .programs import MAX_STEPS
+from .utils import create_dishes, create_timings, fork_dish, replace_timing
 
 
 class AtomicTimingSerializer(serializers.ModelSerializer):
@@ -13,19 +18,34 @@ class AtomicTimingSerializer(serializers.ModelSerializer):
 class TimingSerializer(serializers.ModelSerializer):
     atomic_timings = AtomicTimingSerializer(many=True, read_only=False)
 
+    def validate_atomic_timings(self, atomic_timings):
+        # every atomic timing is a step of the compiled program
+        if len(atomic_timings) > MAX_STEPS:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {MAX_STEPS} elements.'
+            )
+
+        return atomic_timings
+
     def create(self, validated_data):
 
-        db_timing = Timing.objects.create(name=validated_data['name'])
-        db_timing.dishes.add(validated_data['dish'])
+        with transaction.atomic():
+            db_timing, = create_timings(validated_data['dish'],
+                                        [validated_data])
 
-        for atomic_timing in validated_data.get('atomic_timings', ()):
-            AtomicTiming.objects.create(
-                seconds=atomic_timing['seconds'],
-                power=atomic_timing['power'],
-                timing=db_timing
-            )
+        dish_cache.invalidate([validated_data['dish'].id])
+
+        return Timing.objects.with_atomic().get(pk=db_timing.pk)
+
+    def update(self, instance, validated_data):
+        # the timing may be shared by other dishes, it is copied on write
+        with transaction.atomic():
+            db_timing = replace_timing(validated_data['dish'], instance,
+                                       validated_data)
 
-        return db_timing
+        dish_cache.invalidate([validated_data['dish'].id])
+
+        return Timing.objects.with_atomic().get(pk=db_timing.pk)
 
     class Meta:
         model = Timing
@@ -37,28 +57,68 @@ class DishSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
 
-        db_dish = Dish.objects.create(
-            name=validated_data['name'],
-            description=validated_data.get('description', '')
-        )
+        with transaction.atomic():
+            db_dish, = create_dishes(validated_data['cook'],
+                                     [validated_data])
+
+        dish_cache.invalidate([db_dish.id])
+
+        return Dish.objects.with_timings().get(pk=db_dish.pk)
 
-        db_dish.users.add(validated_data['cook'])
+    class Meta:
+        model = Dish
+        fields = ('id', 'name', 'description', 'timings')
 
-        for timing in validated_data.get('timings', ()):
 
-            db_timing = Timing.objects.create(name=timing['name'])
-            db_timing.dishes.add(db_dish)
+class DishForkSerializer(serializers.ModelSerializer):
+    """ Name and description of a dish forked from another one """
 
-            for atomic_timing in timing.get('atomic_timings', ()):
-                AtomicTiming.objects.create(
-                    seconds=atomic_timing['seconds'],
-                    power=atomic_timing['power'],
-                    timing=db_timing
-                )
+    def create(self, validated_data):
+        source = validated_data['source']
 
-        return db_dish
+        with transaction.atomic():
+            return fork_dish(
+                source, validated_data['cook'], validated_data['name'],
+                validated_data.get('description', source.description)
+            )
 
     class Meta:
         model = Dish
-        fields = ('id', 'name', 'description', 'timings')
+        fields = ('name', 'description')
+
+
+def serialize_dishes(dishes):
+    """
+    Serializes dishes with DishSerializer through the dish cache.
+    Timing trees are prefetched only for the dishes which are not cached.
+    :param dishes: iterable of Dish
+    :return: list of serialized dishes in the order of dishes
+    """
+    dishes = list(dishes)
+    dishes_by_id = {dish.id: dish for dish in dishes}
+
+    def build(dish_ids):
+        missing = [dishes_by_id[dish_id] for dish_id in dish_ids]
+        prefetch_related_objects(missing, timings_prefetch())
+
+        serializer = DishSerializer(missing, many=True)
+
+        return {dish.id: data for dish, data in zip(missing, serializer.data)}
+
+    serialized = dish_cache.get_many(list(dishes_by_id), build)
+
+    return [serialized[dish.id] for dish in dishes]
+
+
+class DishImportSerializer(DishSerializer):
+    """
+    Validates dishes of a batch import. Name uniqueness is checked
+    for the whole batch at once by the importer.
+    """
 
+    class Meta(DishSerializer.Meta):
+        extra_kwargs = {
+            'name': {
+                'validators': [],
+            },
+        }
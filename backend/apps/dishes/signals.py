@@ -0,0 +1,112 @@
+"""
+Bumps DishesVersion of the users whose dishes change through model saves
+and deletes, drops the changed dishes from the dish cache and updates
+their search documents. Bulk writes in dishes.utils send no signals and
+bump the versions and update the search index themselves, their
+serializers invalidate the dish cache. Links of dishes and timings
+(DishTiming) saved one by one are handled too, links are deleted along
+with their dish or timing.
+"""
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .cache import dish_cache
+from .models import AtomicTiming, Dish, DishesVersion, DishTiming, Timing
+from .search import index_dishes, unindex_dishes
+
+
+def dish_user_ids(dish_ids):
+    return Dish.users.through.objects.filter(dish_id__in=dish_ids) \
+        .values_list('user_id', flat=True)
+
+
+def timing_user_ids(timing_ids):
+    return Dish.users.through.objects.filter(
+        dish__timings__id__in=timing_ids
+    ).values_list('user_id', flat=True)
+
+
+def timing_dish_ids(timing_ids):
+    return DishTiming.objects.filter(timing_id__in=timing_ids) \
+        .values_list('dish_id', flat=True)
+
+
+def dish_ids_of(instance):
+    if isinstance(instance, Dish):
+        return [instance.id]
+    if isinstance(instance, Timing):
+        return list(timing_dish_ids([instance.id]))
+
+    return list(timing_dish_ids([instance.timing_id]))
+
+
+def user_ids_of(instance):
+    if isinstance(instance, Dish):
+        return list(dish_user_ids([instance.id]))
+    if isinstance(instance, Timing):
+        return list(timing_user_ids([instance.id]))
+
+    return list(timing_user_ids([instance.timing_id]))
+
+
+@receiver(post_save, sender=Dish)
+@receiver(post_save, sender=Timing)
+@receiver(post_save, sender=AtomicTiming)
+def bump_saved(sender, instance, update_fields, **kwargs):
+    if update_fields == frozenset(('program',)):
+        # compiled programs are not a part of dishes and timings lists
+        return
+
+    dish_ids = dish_ids_of(instance)
+
+    DishesVersion.objects.bump(user_ids_of(instance))
+    dish_cache.invalidate(dish_ids)
+
+    if not isinstance(instance, AtomicTiming):
+        index_dishes(dish_ids)
+
+
+@receiver(pre_delete, sender=Dish)
+@receiver(pre_delete, sender=Timing)
+@receiver(pre_delete, sender=AtomicTiming)
+def collect_deleted(sender, instance, **kwargs):
+    # relations are gone once the instance is deleted
+    instance._dishes_user_ids = user_ids_of(instance)
+    instance._dish_ids = dish_ids_of(instance)
+
+
+@receiver(post_delete, sender=Dish)
+@receiver(post_delete, sender=Timing)
+@receiver(post_delete, sender=AtomicTiming)
+def bump_deleted(sender, instance, **kwargs):
+    dish_ids = getattr(instance, '_dish_ids', ())
+
+    DishesVersion.objects.bump(getattr(instance, '_dishes_user_ids', ()))
+    dish_cache.invalidate(dish_ids)
+
+    if isinstance(instance, Dish):
+        unindex_dishes(dish_ids)
+    elif isinstance(instance, Timing):
+        index_dishes(dish_ids)
+
+
+@receiver(m2m_changed, sender=Dish.users.through)
+def bump_dish_users(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        instance._dishes_user_ids = (
+            [instance.id] if reverse else user_ids_of(instance)
+        )
+    elif action == 'post_clear':
+        DishesVersion.objects.bump(instance._dishes_user_ids)
+    elif action in ('post_add', 'post_remove'):
+        DishesVersion.objects.bump(
+            [instance.id] if reverse else pk_set
+        )
+
+
+@receiver(post_save, sender=DishTiming)
+def bump_dish_timing(sender, instance, **kwargs):
+    DishesVersion.objects.bump(dish_user_ids([instance.dish_id]))
+    dish_cache.invalidate([instance.dish_id])
+    index_dishes([instance.dish_id])
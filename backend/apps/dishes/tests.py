@@ -1,3 +1,973 @@
-from django.test import TestCase
+import json
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from stoves.models import CookingRun, Stove
+from users.models import User, UserToken
+from .analytics import aggregate_statistics, users_distribution
+from .cache import DishCache, dish_cache, statistics_cache
+from .checks import check_dish_cache
+from .models import AtomicTiming, Dish, DishesVersion, DishTiming, Timing
+from .programs import MAX_STEPS, compile_program, parse_program
+from .search import FallbackSearch, get_search
+from .serializers import DishSerializer
+from .utils import create_timings
+
+
+def create_dishes(user, dishes_count, timings_count, atomic_count):
+    for dish_index in range(dishes_count):
+        dish = Dish.objects.create(name=f'{user.id}-dish-{dish_index}')
+        dish.users.add(user)
+
+        for timing_index in range(timings_count):
+            timing = Timing.objects.create(name=f'timing-{timing_index}')
+            DishTiming.objects.create(dish=dish, timing=timing)
+
+            for atomic_index in range(atomic_count):
+                AtomicTiming.objects.create(timing=timing,
+                                            seconds=10 + atomic_index,
+                                            power=50)
+
+
+def dish_payload(name, timings_count, atomic_count):
+    return {
+        'name': name,
+        'description': '',
+        'timings': [{
+            'name': f'timing-{timing_index}',
+            'atomic_timings': [{'seconds': 10 + atomic_index, 'power': 50}
+                               for atomic_index in range(atomic_count)],
+        } for timing_index in range(timings_count)],
+    }
+
+
+class AuthenticatedTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='cook@example.com', password='secret1!', is_active=True
+        )
+        self.token = UserToken.objects.create(user=self.user)
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+        # resolve the token once so that it is served from the cache
+        caches[settings.USER_TOKEN_CACHE].clear()
+        self.client.get('/api/users/token-validation')
+        DishesVersion.objects.for_user(self.user)
+
+        # test databases reuse dish ids
+        caches[settings.DISH_CACHE].clear()
+        dish_cache.reset_stats()
+        statistics_cache.reset_stats()
+
+
+class DishTreeQueriesTest(AuthenticatedTestCase):
+
+    def test_dish_list_query_count_does_not_depend_on_tree_size(self):
+        create_dishes(self.user, 2, 1, 1)
+
+        # version + dishes + timings + atomic timings
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/dishes/')
+        self.assertEqual(len(response.data), 2)
+
+        Dish.objects.all().delete()
+        create_dishes(self.user, 20, 5, 4)
+
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/dishes/')
+        self.assertEqual(len(response.data), 20)
+        self.assertEqual(len(response.data[0]['timings']), 5)
+        self.assertEqual(len(response.data[0]['timings'][0]['atomic_timings']),
+                         4)
+
+    def test_timing_list_query_count_does_not_depend_on_tree_size(self):
+        create_dishes(self.user, 1, 10, 6)
+        dish = Dish.objects.get()
+
+        # version + dish + timings + atomic timings
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/dishes/{dish.id}/timings')
+        self.assertEqual(len(response.data), 10)
+
+    def test_atomic_timings_are_ordered_by_creation(self):
+        create_dishes(self.user, 1, 1, 3)
+
+        response = self.client.get('/api/dishes/')
+        seconds = [atomic['seconds'] for atomic
+                   in response.data[0]['timings'][0]['atomic_timings']]
+
+        self.assertEqual(seconds, [10, 11, 12])
+
+
+class DishBulkCreateTest(AuthenticatedTestCase):
+
+    def post_dish(self, payload):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/dishes/', payload,
+                                        format='json')
+        self.assertEqual(response.status_code, 201)
+
+        return response, len(queries)
+
+    def test_dish_create_query_count_does_not_depend_on_tree_size(self):
+        _, small_count = self.post_dish(dish_payload('small', 1, 1))
+        response, large_count = self.post_dish(dish_payload('large', 10, 20))
+
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(response.data['timings']), 10)
+        self.assertEqual(AtomicTiming.objects.count(), 1 + 10 * 20)
+
+        dish = Dish.objects.get(name='large')
+        self.assertEqual(list(dish.users.all()), [self.user])
+        self.assertEqual(dish.timings.count(), 10)
+
+    def test_timing_create_query_count_does_not_depend_on_tree_size(self):
+        create_dishes(self.user, 1, 0, 0)
+        dish = Dish.objects.get()
+        url = f'/api/dishes/{dish.id}/timings'
+
+        payload = dish_payload('', 1, 1)['timings'][0]
+        with CaptureQueriesContext(connection) as small_queries:
+            self.client.post(url, payload, format='json')
+
+        payload = dish_payload('', 1, 20)['timings'][0]
+        with CaptureQueriesContext(connection) as large_queries:
+            response = self.client.post(url, payload, format='json')
+
+        self.assertEqual(len(small_queries), len(large_queries))
+        self.assertEqual(len(response.data['atomic_timings']), 20)
+        self.assertEqual(dish.timings.count(), 2)
+
+    def test_atomic_timing_bounds_are_enforced(self):
+        payload = dish_payload('too-hot', 2, 2)
+        payload['timings'][1]['atomic_timings'][1]['power'] = 101
+
+        response = self.client.post('/api/dishes/', payload, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Dish.objects.exists())
+        self.assertFalse(Timing.objects.exists())
+
+    def test_bulk_writes_run_model_validators(self):
+        create_dishes(self.user, 1, 0, 0)
+        timings_data = dish_payload('', 1, 1)['timings']
+        timings_data[0]['atomic_timings'][0]['seconds'] = 5
+
+        with self.assertRaises(serializers.ValidationError):
+            create_timings(Dish.objects.get(), timings_data)
+
+        self.assertFalse(AtomicTiming.objects.exists())
+
+    def test_bulk_created_atomic_timings_keep_order(self):
+        response, _ = self.post_dish(dish_payload('ordered', 1, 30))
+
+        seconds = [atomic['seconds'] for atomic
+                   in response.data['timings'][0]['atomic_timings']]
+        self.assertEqual(seconds, list(range(10, 40)))
+
+
+class DishImportTest(AuthenticatedTestCase):
+
+    def import_dishes(self, body, content_type):
+        response = self.client.post('/api/dishes/bulk', body,
+                                    content_type=content_type)
+        self.assertEqual(response.status_code, 200)
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        return [json.loads(line) for line in lines]
+
+    def test_ndjson_import_reports_every_row(self):
+        Dish.objects.create(name='taken')
+        rows = [
+            json.dumps(dish_payload('first', 2, 3)),
+            'not json',
+            json.dumps(dish_payload('taken', 1, 1)),
+            json.dumps(dish_payload('first', 1, 1)),
+            '',
+            json.dumps(dish_payload('second', 0, 0)),
+        ]
+
+        results = self.import_dishes('\n'.join(rows),
+                                     'application/x-ndjson')
+        *rows, summary = results
+
+        self.assertEqual([row['index'] for row in rows], [0, 1, 2, 3, 4])
+        self.assertIn('id', rows[0])
+        self.assertIn('errors', rows[1])
+        self.assertIn('name', rows[2]['errors'])
+        self.assertIn('name', rows[3]['errors'])
+        self.assertIn('id', rows[4])
+        self.assertEqual(summary['created'], 2)
+        self.assertEqual(summary['failed'], 3)
+        self.assertIn('dishes_per_second', summary)
+
+        dish = Dish.objects.with_timings().get(name='first')
+        self.assertEqual(list(dish.users.all()), [self.user])
+        self.assertEqual(
+            [timing.atomic_timings.count() for timing in dish.timings.all()],
+            [3, 3]
+        )
+
+    def test_json_array_import_is_written_in_batches(self):
+        body = json.dumps([dish_payload(f'dish-{index}', 1, 2)
+                           for index in range(12)])
+
+        with self.settings(DISHES_IMPORT_BATCH_SIZE=5):
+            *rows, summary = self.import_dishes(body, 'application/json')
+
+        self.assertEqual(summary['created'], 12)
+        self.assertEqual(len({row['id'] for row in rows}), 12)
+        self.assertEqual(Dish.objects.owned_by(self.user).count(), 12)
+        # the dishes have the same timing, it is stored once
+        self.assertEqual(Dish.timings.through.objects.count(), 12)
+        self.assertEqual(AtomicTiming.objects.count(), 2)
+
+    def test_invalid_json_array_stops_import(self):
+        body = '[' + json.dumps(dish_payload('first', 0, 0)) + ' {'
+
+        *rows, summary = self.import_dishes(body, 'application/json')
+
+        self.assertEqual(summary['created'], 1)
+        self.assertEqual(summary['failed'], 1)
+        self.assertIn('errors', rows[1])
+
+
+class DishListPaginationTest(AuthenticatedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        create_dishes(self.user, 7, 2, 2)
+
+    def test_cursor_pages_cover_all_dishes(self):
+        names = []
+        url = '/api/dishes/?page_size=3'
+
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data['results']), 3)
+
+            names += [dish['name'] for dish in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), 7)
+
+    def test_stream_matches_plain_list(self):
+        plain = self.client.get('/api/dishes/')
+
+        with self.settings(DISHES_STREAM_CHUNK_SIZE=3):
+            # version + a query per chunk of dishes cached by the plain list
+            with self.assertNumQueries(1 + 3):
+                streamed = self.client.get('/api/dishes/?stream=1')
+                content = b''.join(streamed.streaming_content)
+
+        self.assertEqual(json.loads(content.decode()),
+                         json.loads(json.dumps(plain.data)))
+
+    def test_stream_of_empty_list(self):
+        Dish.objects.all().delete()
+
+        streamed = self.client.get('/api/dishes/?stream=1')
+
+        self.assertEqual(b''.join(streamed.streaming_content), b'[]')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite')
+class AtomicTimingIndexTest(TestCase):
+
+    def test_atomic_timings_are_read_in_index_order(self):
+        queryset = AtomicTiming.objects.filter(timing_id=1) \
+            .order_by('created', 'pk')
+        sql, params = queryset.query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+        self.assertIn('USING INDEX atomic_timing_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class TimingProgramTest(AuthenticatedTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        payload = dish_payload('program', 1, 0)
+        payload['timings'][0]['atomic_timings'] = [
+            {'seconds': 60, 'power': 100},
+            {'seconds': 30, 'power': 50},
+            {'seconds': 10, 'power': 20},
+        ]
+        response = self.client.post('/api/dishes/', payload, format='json')
+
+        self.dish_id = response.data['id']
+        self.timing_id = response.data['timings'][0]['id']
+        self.url = (f'/api/dishes/{self.dish_id}/timings/'
+                    f'{self.timing_id}/program')
+
+    def test_program_is_compiled_on_write(self):
+        program = parse_program(Timing.objects.get().program)
+
+        self.assertEqual(program.total_seconds, 100)
+        self.assertEqual(program.power_seconds, 60 * 100 + 30 * 50 + 10 * 20)
+        self.assertEqual(program.offsets, [60, 90, 100])
+        self.assertEqual(program.powers, [100, 50, 20])
+
+    def test_longest_program_is_compiled(self):
+        program = parse_program(compile_program([(18000, 100)] * MAX_STEPS))
+
+        self.assertEqual(program.total_seconds, 18000 * MAX_STEPS)
+        self.assertEqual(program.power_seconds, 18000 * 100 * MAX_STEPS)
+        self.assertEqual(len(program.offsets), MAX_STEPS)
+
+        with self.assertRaises(ValueError):
+            compile_program([(10, 10)] * (MAX_STEPS + 1))
+
+    @mock.patch('dishes.serializers.MAX_STEPS', 2)
+    def test_too_many_steps_are_rejected(self):
+        payload = dish_payload('long', 1, 3)
+
+        response = self.client.post('/api/dishes/', payload, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('atomic_timings', response.data['timings'][0])
+
+        payload = dish_payload('short', 1, 2)
+        response = self.client.post('/api/dishes/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_program_is_served_with_etag(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertEqual(parse_program(response.content).offsets,
+                         [60, 90, 100])
+
+        response = self.client.get(self.url,
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_legacy_timing_program_is_compiled_on_read(self):
+        Timing.objects.update(program=None)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(parse_program(response.content).total_seconds, 100)
+        self.assertIsNotNone(Timing.objects.get().program)
+
+    def test_program_of_foreign_dish_is_forbidden(self):
+        other = User.objects.create_user(email='other@example.com',
+                                         password='secret1!', is_active=True)
+        Dish.objects.get().users.set([other])
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 403)
+
+
+class ConditionalGetTest(AuthenticatedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        create_dishes(self.user, 2, 2, 2)
+        self.dish = Dish.objects.first()
+
+    def assertNotModified(self, url, **headers):
+        # version only
+        with self.assertNumQueries(1):
+            response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_dish_list_is_not_modified(self):
+        response = self.client.get('/api/dishes/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Authorization', response['Vary'])
+        self.assertNotModified('/api/dishes/',
+                               HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_dish_list_is_not_validated_by_date(self):
+        response = self.client.get('/api/dishes/')
+
+        # a write within the same second keeps Last-Modified
+        Dish.objects.create(name='stew').users.add(self.user)
+
+        response = self.client.get(
+            '/api/dishes/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+
+    def test_timing_list_is_not_modified(self):
+        url = f'/api/dishes/{self.dish.id}/timings'
+        response = self.client.get(url)
+
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_representations_have_different_etags(self):
+        plain = self.client.get('/api/dishes/')
+        paginated = self.client.get('/api/dishes/?page_size=1')
+
+        self.assertNotEqual(plain['ETag'], paginated['ETag'])
+
+        response = self.client.get('/api/dishes/?page_size=1',
+                                   HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def assertChangesEtag(self, write):
+        etag = self.client.get('/api/dishes/')['ETag']
+
+        write()
+
+        response = self.client.get('/api/dishes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_dish_create_changes_etag(self):
+        self.assertChangesEtag(lambda: self.client.post(
+            '/api/dishes/', dish_payload('new', 1, 1), format='json'
+        ))
+
+    def test_timing_create_changes_etag(self):
+        self.assertChangesEtag(lambda: self.client.post(
+            f'/api/dishes/{self.dish.id}/timings',
+            dish_payload('', 1, 1)['timings'][0], format='json'
+        ))
+
+    def test_dish_save_changes_etag(self):
+        def write():
+            self.dish.description = 'Changed'
+            self.dish.save()
+
+        self.assertChangesEtag(write)
+
+    def test_atomic_timing_delete_changes_etag(self):
+        self.assertChangesEtag(lambda: AtomicTiming.objects.first().delete())
+
+    def test_timing_delete_changes_etag(self):
+        self.assertChangesEtag(lambda: Timing.objects.first().delete())
+
+    def test_dish_sharing_changes_etag_of_new_user(self):
+        other = User.objects.create_user(email='other@example.com',
+                                         password='secret1!')
+        version = DishesVersion.objects.for_user(other).version
+
+        self.dish.users.add(other)
+
+        self.assertEqual(DishesVersion.objects.for_user(other).version,
+                         version + 1)
+
+
+class DishCacheCheckTest(SimpleTestCase):
+
+    def test_process_local_cache_is_reported(self):
+        warnings = check_dish_cache(None)
+
+        self.assertEqual([warning.id for warning in warnings],
+                         ['dishes.W001'])
+
+    @override_settings(DISH_CACHE='shared', CACHES=dict(
+        settings.CACHES,
+        shared={'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    ))
+    def test_shared_cache_is_accepted(self):
+        self.assertEqual(check_dish_cache(None), [])
+
+
+class DishCacheTest(AuthenticatedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        create_dishes(self.user, 3, 2, 2)
+        self.dish = Dish.objects.first()
+
+    def list_dishes(self):
+        response = self.client.get('/api/dishes/')
+        self.assertEqual(response.status_code, 200)
+
+        return response.data
+
+    def test_cached_dishes_need_no_tree_queries(self):
+        cold = self.list_dishes()
+        self.assertEqual(dish_cache.stats()['misses'], 3)
+
+        # version + dishes
+        with self.assertNumQueries(2):
+            warm = self.list_dishes()
+
+        self.assertEqual(warm, cold)
+        self.assertEqual(dish_cache.stats(), {
+            'hits': 3, 'misses': 3, 'hit_rate': 0.5,
+        })
+
+    def test_culled_version_keys_are_not_needed(self):
+        # every add culls the whole cache, so only the last version key
+        # added survives until it is read back
+        culling = LocMemCache('culling', {
+            'OPTIONS': {'MAX_ENTRIES': 1, 'CULL_FREQUENCY': 1},
+        })
+        dish_ids = list(Dish.objects.values_list('id', flat=True))
+
+        with mock.patch.object(DishCache, 'cache', new=culling):
+            built = dish_cache.get_many(
+                dish_ids, lambda missing: {dish_id: dish_id
+                                           for dish_id in missing}
+            )
+
+        self.assertEqual(built, {dish_id: dish_id for dish_id in dish_ids})
+
+    def test_timing_create_invalidates_only_its_dish(self):
+        self.list_dishes()
+        dish_cache.reset_stats()
+
+        self.client.post(f'/api/dishes/{self.dish.id}/timings',
+                         dish_payload('', 1, 1)['timings'][0],
+                         format='json')
+
+        dishes = self.list_dishes()
+        self.assertEqual(dish_cache.stats()['misses'], 1)
+        self.assertEqual(dish_cache.stats()['hits'], 2)
+        self.assertEqual(len(dishes[0]['timings']), 3)
+
+    def test_atomic_timing_save_invalidates_only_its_dish(self):
+        self.list_dishes()
+        dish_cache.reset_stats()
+
+        atomic = AtomicTiming.objects.filter(
+            timing__dishes=self.dish
+        ).first()
+        atomic.power = 100
+        atomic.save()
+
+        dishes = self.list_dishes()
+        self.assertEqual(dish_cache.stats()['misses'], 1)
+        self.assertIn(100, [atomic['power']
+                            for timing in dishes[0]['timings']
+                            for atomic in timing['atomic_timings']])
+
+    def test_dish_create_is_listed(self):
+        self.list_dishes()
+
+        self.client.post('/api/dishes/', dish_payload('new', 1, 1),
+                         format='json')
+
+        self.assertEqual(len(self.list_dishes()), 4)
+
+    def test_timing_list_reuses_cached_dish(self):
+        dishes = self.list_dishes()
+
+        # version + dish
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/dishes/{self.dish.id}/timings')
+
+        self.assertEqual(response.data, dishes[0]['timings'])
+
+    def test_stats_are_for_admins(self):
+        response = self.client.get('/api/dishes/cache')
+        self.assertEqual(response.status_code, 403)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        caches[settings.USER_TOKEN_CACHE].clear()
+
+        response = self.client.get('/api/dishes/cache')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'hits', 'misses', 'hit_rate'})
+
+
+class DishStatisticsTest(AuthenticatedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # atomic timings of 10, 11 and 12 seconds at power 50
+        create_dishes(self.user, 3, 2, 3)
+        self.dish = Dish.objects.first()
+
+    def get_statistics(self):
+        response = self.client.get('/api/dishes/statistics')
+        self.assertEqual(response.status_code, 200)
+
+        return response.data
+
+    def test_statistics_are_aggregated(self):
+        statistics = self.get_statistics()
+
+        dish = statistics['dishes'][0]
+        self.assertEqual(dish['id'], self.dish.id)
+        self.assertEqual(dish['timings'], 2)
+        self.assertEqual(dish['steps'], 6)
+        self.assertEqual(dish['total_seconds'], 66)
+        self.assertEqual(dish['energy'], 66 * 50)
+        self.assertEqual(dish['average_power'], 50)
+        self.assertEqual(dish['power_histogram'],
+                         [{'power': 50, 'seconds': 66}])
+        self.assertEqual(statistics['total_seconds'], 3 * 66)
+
+    def test_histogram_buckets(self):
+        timing = Timing.objects.create(name='mixed')
+        DishTiming.objects.create(dish=self.dish, timing=timing)
+        for seconds, power in ((10, 15), (20, 19), (30, 100)):
+            AtomicTiming.objects.create(timing=timing, seconds=seconds,
+                                        power=power)
+
+        statistics = aggregate_statistics([self.dish.id])[self.dish.id]
+
+        self.assertEqual(statistics['power_histogram'], [
+            {'power': 10, 'seconds': 30},
+            {'power': 50, 'seconds': 66},
+            {'power': 100, 'seconds': 30},
+        ])
+
+    def test_repeated_timing_counts_per_link(self):
+        timing = self.dish.timings.first()
+        DishTiming.objects.create(dish=self.dish, timing=timing)
+        empty = Timing.objects.create(name='empty')
+        DishTiming.objects.create(dish=self.dish, timing=empty)
+
+        statistics = aggregate_statistics([self.dish.id])[self.dish.id]
+
+        self.assertEqual(statistics['timings'],
+                         len(DishSerializer(self.dish).data['timings']))
+        self.assertEqual(statistics['timings'], 4)
+        self.assertEqual(statistics['steps'], 9)
+        self.assertEqual(statistics['total_seconds'], 99)
+        self.assertEqual(statistics['energy'], 99 * 50)
+        self.assertEqual(statistics['power_histogram'],
+                         [{'power': 50, 'seconds': 99}])
+
+    def test_aggregation_query_count_does_not_depend_on_size(self):
+        dish_ids = list(Dish.objects.values_list('id', flat=True))
+
+        with self.assertNumQueries(2):
+            aggregate_statistics(dish_ids)
+
+    def test_only_changed_dishes_are_aggregated_again(self):
+        self.get_statistics()
+        self.assertEqual(statistics_cache.stats()['misses'], 3)
+
+        # version + dishes
+        with self.assertNumQueries(2):
+            self.get_statistics()
+
+        atomic = AtomicTiming.objects.filter(
+            timing__dishes=self.dish
+        ).first()
+        atomic.power = 100
+        atomic.save()
+        statistics_cache.reset_stats()
+
+        statistics = self.get_statistics()
+        self.assertEqual(statistics_cache.stats(), {
+            'hits': 2, 'misses': 1, 'hit_rate': 0.6667,
+        })
+        self.assertEqual(statistics['dishes'][0]['energy'],
+                         66 * 50 + atomic.seconds * 50)
+
+    def test_statistics_are_not_modified(self):
+        response = self.client.get('/api/dishes/statistics')
+
+        response = self.client.get('/api/dishes/statistics',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_users_distribution(self):
+        other = User.objects.create_user(email='other@example.com',
+                                         password='secret1!')
+        self.dish.users.add(other)
+
+        response = self.client.get('/api/dishes/statistics/users')
+        self.assertEqual(response.status_code, 403)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        caches[settings.USER_TOKEN_CACHE].clear()
+
+        response = self.client.get('/api/dishes/statistics/users')
+        self.assertEqual(response.data, {
+            'users': 2,
+            'total_seconds': {'mean': 132.0, 'p50': 66, 'p90': 66,
+                              'max': 198},
+            'energy': {'mean': 6600.0, 'p50': 3300, 'p90': 3300,
+                       'max': 9900},
+        })
+
+    def test_users_distribution_is_one_query(self):
+        other = User.objects.create_user(email='other@example.com',
+                                         password='secret1!')
+        Dish.objects.create(name='empty').users.add(other)
+
+        with self.assertNumQueries(1):
+            distribution = users_distribution()
+
+        self.assertEqual(distribution['users'], 2)
+        self.assertEqual(distribution['total_seconds']['p50'], 0)
+        self.assertEqual(distribution['total_seconds']['max'], 198)
+
+
+class DishSearchTest(AuthenticatedTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.soup = self.create_dish('Tomato soup', 'Slow cooked',
+                                     ['simmer'])
+        self.stew = self.create_dish('Beef stew', 'With tomato paste',
+                                     ['brown', 'braise'])
+        self.pasta = self.create_dish('Pasta', 'Boiled', ['boil tomatoes'])
+
+    def create_dish(self, name, description, timing_names):
+        response = self.client.post('/api/dishes/', {
+            'name': name,
+            'description': description,
+            'timings': [{
+                'name': timing_name,
+                'atomic_timings': [{'seconds': 10, 'power': 50}],
+            } for timing_name in timing_names],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        return Dish.objects.get(name=name)
+
+    def search(self, query, **params):
+        response = self.client.get('/api/dishes/search',
+                                   dict(params, q=query))
+        self.assertEqual(response.status_code, 200)
+
+        return response.data
+
+    def search_names(self, query):
+        return [dish['name'] for dish in self.search(query)['results']]
+
+    def test_name_ranks_above_timings_and_description(self):
+        names = self.search_names('tomato')
+
+        if isinstance(get_search(), FallbackSearch):
+            self.assertEqual(set(names), {'Tomato soup', 'Beef stew',
+                                          'Pasta'})
+        else:
+            self.assertEqual(names, ['Tomato soup', 'Pasta', 'Beef stew'])
+
+    def test_all_words_match_word_prefixes(self):
+        self.assertEqual(self.search_names('bee bra'), ['Beef stew'])
+        self.assertEqual(self.search_names('beef soup'), [])
+        self.assertEqual(self.search_names('  '), [])
+
+    def test_results_are_serialized_dishes(self):
+        dish, = self.search('simmer')['results']
+
+        self.assertEqual(dish['id'], self.soup.id)
+        self.assertEqual(dish['timings'][0]['name'], 'simmer')
+
+    def test_only_users_dishes_are_found(self):
+        other = User.objects.create_user(email='other@example.com',
+                                         password='secret1!')
+        dish = Dish.objects.create(name='Tomato salad')
+        dish.users.add(other)
+
+        self.assertNotIn('Tomato salad', self.search_names('tomato'))
+
+    def test_index_follows_writes(self):
+        self.soup.name = 'Onion soup'
+        self.soup.save()
+        self.assertEqual(self.search_names('onion'), ['Onion soup'])
+
+        timing = Timing.objects.create(name='caramelize')
+        DishTiming.objects.create(dish=self.pasta, timing=timing)
+        self.assertEqual(self.search_names('caramel'), ['Pasta'])
+
+        timing.name = 'toast'
+        timing.save()
+        self.assertEqual(self.search_names('caramel'), [])
+
+        timing.delete()
+        self.assertEqual(self.search_names('toast'), [])
+
+        create_timings(self.stew, [{
+            'name': 'deglaze',
+            'atomic_timings': [{'seconds': 10, 'power': 50}],
+        }])
+        self.assertEqual(self.search_names('deglaze'), ['Beef stew'])
+
+        self.stew.delete()
+        self.assertEqual(self.search_names('beef'), [])
+
+    def test_pages(self):
+        page = self.search('tomato', page_size=2)
+        self.assertEqual(len(page['results']), 2)
+        self.assertIn('offset=2', page['next'])
+
+        last_page = self.client.get(page['next']).data
+        self.assertEqual(len(last_page['results']), 1)
+        self.assertIsNone(last_page['next'])
+
+        found = [dish['id'] for dish in
+                 page['results'] + last_page['results']]
+        self.assertEqual(len(set(found)), 3)
+
+    def test_search_query_count(self):
+        self.search('tomato')
+
+        # version + search + dishes, serialized dishes are cached
+        with self.assertNumQueries(3):
+            self.search('tomato')
+
+
+class DishSharingTest(AuthenticatedTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        response = self.client.post('/api/dishes/',
+                                    dish_payload('soup', 2, 3),
+                                    format='json')
+        self.dish = Dish.objects.get(pk=response.data['id'])
+        self.timing = self.dish.timings.get(name='timing-0')
+
+    def fork(self, name='soup fork'):
+        response = self.client.post(f'/api/dishes/{self.dish.id}/fork',
+                                    {'name': name}, format='json')
+        if response.status_code == 201:
+            return Dish.objects.get(pk=response.data['id'])
+
+        return response
+
+    def replace(self, dish, timing, name='timing-0', power=100):
+        return self.client.put(
+            f'/api/dishes/{dish.id}/timings/{timing.id}',
+            {'name': name, 'atomic_timings': [{'seconds': 20,
+                                               'power': power}]},
+            format='json'
+        )
+
+    def test_identical_timings_are_stored_once(self):
+        self.client.post('/api/dishes/', dish_payload('stew', 2, 3),
+                         format='json')
+        stew = Dish.objects.get(name='stew')
+
+        self.assertEqual(Timing.objects.count(), 2)
+        self.assertEqual(AtomicTiming.objects.count(), 6)
+        self.assertEqual(set(stew.timings.all()), set(self.dish.timings.all()))
+
+        payload = dish_payload('', 1, 3)['timings'][0]
+        response = self.client.post(f'/api/dishes/{stew.id}/timings',
+                                    payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], self.timing.id)
+        self.assertEqual(Timing.objects.count(), 2)
+
+    def test_fork_links_timings(self):
+        fork = self.fork()
+
+        self.assertEqual(set(fork.timings.all()), set(self.dish.timings.all()))
+        self.assertEqual(Timing.objects.count(), 2)
+        self.assertEqual(list(fork.users.all()), [self.user])
+        self.assertEqual(fork.description, self.dish.description)
+
+        names = [dish['name'] for dish in self.client.get('/api/dishes/').data]
+        self.assertEqual(names, ['soup', 'soup fork'])
+
+    def test_fork_name_is_unique(self):
+        response = self.fork(name='soup')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.data)
+
+    def test_only_own_dishes_are_forked(self):
+        other = User.objects.create_user(email='other@example.com',
+                                         password='secret1!')
+        self.dish.users.set([other])
+
+        self.assertEqual(self.fork().status_code, 403)
+
+    def test_shared_timing_is_copied_on_write(self):
+        fork = self.fork()
+
+        response = self.replace(fork, self.timing)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['id'], self.timing.id)
+        self.assertEqual(response.data['atomic_timings'],
+                         [{'seconds': 20, 'power': 100}])
+
+        self.assertIn(self.timing, self.dish.timings.all())
+        self.assertNotIn(self.timing, fork.timings.all())
+        self.assertEqual(self.timing.atomic_timings.count(), 3)
+        self.assertEqual(Timing.objects.count(), 3)
+
+        timings = self.client.get(f'/api/dishes/{self.dish.id}/timings').data
+        self.assertEqual(len(timings[0]['atomic_timings']), 3)
+
+    def test_unshared_timing_is_replaced(self):
+        response = self.replace(self.dish, self.timing)
+
+        self.assertFalse(Timing.objects.filter(pk=self.timing.pk).exists())
+        self.assertEqual(Timing.objects.count(), 2)
+        self.assertEqual(
+            self.dish.timings.get(name='timing-0').id, response.data['id']
+        )
+
+    def test_replacing_with_the_same_content_keeps_timing(self):
+        response = self.client.put(
+            f'/api/dishes/{self.dish.id}/timings/{self.timing.id}',
+            dish_payload('', 1, 3)['timings'][0], format='json'
+        )
+
+        self.assertEqual(response.data['id'], self.timing.id)
+        self.assertEqual(Timing.objects.count(), 2)
+
+    def test_identical_timings_of_a_dish_are_linked_each(self):
+        timing = dish_payload('', 1, 3)['timings'][0]
+        response = self.client.post('/api/dishes/', {
+            'name': 'stew', 'timings': [timing, timing],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        stew = Dish.objects.get(name='stew')
+        self.assertEqual(
+            list(DishTiming.objects.filter(dish=stew)
+                 .values_list('timing_id', flat=True)),
+            [self.timing.id, self.timing.id]
+        )
+        self.assertEqual(Timing.objects.count(), 2)
+
+        timings = self.client.get(f'/api/dishes/{stew.id}/timings').data
+        self.assertEqual([timing['id'] for timing in timings],
+                         [self.timing.id, self.timing.id])
+
+        fork = self.fork()
+        self.assertEqual(DishTiming.objects.filter(dish=fork).count(), 2)
+
+    def test_replaced_timing_is_kept_for_its_runs(self):
+        stove = Stove.objects.create(serial_id='serial')
+        run = CookingRun.objects.create(stove=stove, timing=self.timing)
+
+        response = self.replace(self.dish, self.timing)
+        self.assertEqual(response.status_code, 200)
+
+        run.refresh_from_db()
+        self.assertEqual(run.timing_id, self.timing.id)
+        self.assertNotIn(self.timing, self.dish.timings.all())
+
+    def test_replaced_timing_must_belong_to_dish(self):
+        stew = Dish.objects.create(name='stew')
+        stew.users.add(self.user)
+
+        response = self.replace(stew, self.timing)
+        self.assertEqual(response.status_code, 404)
+
+        response = self.replace(self.dish, self.timing, power=101)
+        self.assertEqual(response.status_code, 400)
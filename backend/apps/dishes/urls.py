@@ -5,6 +5,16 @@ from . import views
 urlpatterns = [
     path('dishes/', include([
         path('', views.DishView.as_view()),
+        path('bulk', views.DishImportView.as_view()),
+        path('cache', views.DishCacheStats.as_view()),
+        path('search', views.DishSearchView.as_view()),
+        path('statistics', views.DishStatisticsView.as_view()),
+        path('statistics/users', views.UsersStatisticsView.as_view()),
+        path('<int:dish_id>/fork', views.DishForkView.as_view()),
         path('<int:dish_id>/timings', views.TimingView.as_view()),
+        path('<int:dish_id>/timings/<int:timing_id>',
+             views.TimingDetailView.as_view()),
+        path('<int:dish_id>/timings/<int:timing_id>/program',
+             views.TimingProgramView.as_view()),
     ])),
 ]
@@ -0,0 +1,298 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+
+from .models import Dish, DishesVersion, DishTiming, Timing, AtomicTiming
+from .programs import compile_program, timing_hash
+from .search import index_dishes
+
+
+def bulk_create_with_ids(model, objs):
+    """
+    Inserts objects with a single statement and makes sure that every
+    object has its primary key set afterwards.
+    Backends which can not return ids from a bulk insert (SQLite) get them
+    with one more query. It must be called inside a transaction which
+    holds the write lock so the newest ids are the inserted ones.
+    :param model: Model class
+    :param objs: list of unsaved model instances
+    :return: list of saved model instances
+    """
+    if not objs:
+        return objs
+
+    model.objects.bulk_create(objs)
+
+    if objs[0].pk is None:
+        ids = (model.objects.order_by('-pk')
+               .values_list('pk', flat=True)[:len(objs)])
+
+        for obj, pk in zip(objs, reversed(ids)):
+            obj.pk = pk
+
+    return objs
+
+
+def clean_fields(objs, exclude=()):
+    """
+    Runs model field validators which bulk_create does not run
+    :param objs: list of unsaved model instances
+    :param exclude: field names which should not be validated
+    :return: None
+    """
+    for obj in objs:
+        try:
+            obj.clean_fields(exclude=exclude)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.message_dict)
+
+
+def create_dishes(cook, dishes_data):
+    """
+    Creates dishes of a cook with their whole timing trees in a fixed
+    number of statements. Should be called inside a transaction.
+    :param cook: User
+    :param dishes_data: list of validated dishes
+    :return: list of Dish
+    """
+    db_dishes = [
+        Dish(name=dish['name'], description=dish.get('description', ''))
+        for dish in dishes_data
+    ]
+
+    clean_fields(db_dishes)
+    bulk_create_with_ids(Dish, db_dishes)
+
+    DishUser = Dish.users.through
+    DishUser.objects.bulk_create([
+        DishUser(dish_id=db_dish.id, user_id=cook.id)
+        for db_dish in db_dishes
+    ])
+
+    bulk_create_timings([
+        (db_dish, timing)
+        for db_dish, dish in zip(db_dishes, dishes_data)
+        for timing in dish.get('timings', ())
+    ])
+
+    DishesVersion.objects.bump([cook.id])
+    index_dishes(db_dish.id for db_dish in db_dishes)
+
+    return db_dishes
+
+
+def create_timings(dish, timings_data):
+    """
+    Creates timings with their atomic timings for a dish in a fixed number
+    of statements. Should be called inside a transaction.
+    :param dish: Dish
+    :param timings_data: list of validated timings
+    :return: list of Timing
+    """
+    db_timings = bulk_create_timings([(dish, timing)
+                                      for timing in timings_data])
+
+    DishesVersion.objects.bump(dish.users.values_list('id', flat=True))
+    index_dishes([dish.id])
+
+    return db_timings
+
+
+def fork_dish(dish, cook, name, description):
+    """
+    Creates a dish of a cook which links the timings of another dish.
+    Timings are not copied, see replace_timing. Should be called inside
+    a transaction.
+    :param dish: Dish - the forked dish
+    :param cook: User
+    :param name: str - unique name of the new dish
+    :param description: str
+    :return: Dish
+    """
+    db_dish, = fork_dishes(dish, [(cook.id, name)], description)
+
+    return db_dish
+
+
+def fork_dishes(dish, user_names, description):
+    """
+    Creates forks of a dish for many users in a fixed number of
+    statements, see fork_dish. Should be called inside a transaction.
+    :param dish: Dish - the forked dish
+    :param user_names: list of (user_id, unique name of the new dish)
+    :param description: str
+    :return: list of Dish in the order of user_names
+    """
+    if not user_names:
+        return []
+
+    db_dishes = [Dish(name=name, description=description, forked_from=dish)
+                 for _, name in user_names]
+
+    clean_fields(db_dishes, exclude=('forked_from',))
+    bulk_create_with_ids(Dish, db_dishes)
+
+    DishUser = Dish.users.through
+    DishUser.objects.bulk_create([
+        DishUser(dish_id=db_dish.id, user_id=user_id)
+        for db_dish, (user_id, _) in zip(db_dishes, user_names)
+    ])
+
+    timing_ids = list(DishTiming.objects.filter(dish=dish).order_by('pk')
+                      .values_list('timing_id', flat=True))
+    DishTiming.objects.bulk_create([
+        DishTiming(dish_id=db_dish.id, timing_id=timing_id)
+        for db_dish in db_dishes for timing_id in timing_ids
+    ])
+
+    DishesVersion.objects.bump([user_id for user_id, _ in user_names])
+    index_dishes(db_dish.id for db_dish in db_dishes)
+
+    return db_dishes
+
+
+def shared_dish_name(dish, user_id):
+    """
+    Name of the fork of a dish shared with a user
+    :param dish: Dish
+    :param user_id: int
+    :return: str which fits Dish.name
+    """
+    suffix = f' ({dish.id}.{user_id})'
+    max_length = Dish._meta.get_field('name').max_length
+
+    return dish.name[:max_length - len(suffix)] + suffix
+
+
+def share_dish(dish, user_ids):
+    """
+    Gives users their own fork of a dish in a fixed number of statements.
+    Users who own the dish or a fork of it get nothing new. Dish names are
+    unique across all users, so a user whose fork name, see
+    shared_dish_name, is already taken by another dish gets nothing either
+    and is reported as a conflict. Should be called inside a transaction.
+    :param dish: Dish
+    :param user_ids: iterable of ids of existing users
+    :return: ({user_id: forked Dish} of the new forks, sorted conflicting
+             user ids)
+    """
+    user_ids = set(user_ids) - set(dish.users.values_list('id', flat=True))
+    user_ids -= set(Dish.users.through.objects.filter(
+        dish__forked_from=dish, user_id__in=user_ids
+    ).values_list('user_id', flat=True))
+
+    names = {user_id: shared_dish_name(dish, user_id)
+             for user_id in sorted(user_ids)}
+    taken = set(Dish.objects.filter(name__in=names.values())
+                .values_list('name', flat=True))
+
+    user_names = [(user_id, name) for user_id, name in names.items()
+                  if name not in taken]
+    forks = fork_dishes(dish, user_names, dish.description)
+
+    return (
+        {user_id: fork for (user_id, _), fork in zip(user_names, forks)},
+        [user_id for user_id, name in names.items() if name in taken],
+    )
+
+
+def replace_timing(dish, timing, timing_data):
+    """
+    Copies a timing of a dish on write: the links of the dish are moved to
+    a timing with the new content, other dishes keep the old one. The old
+    timing is deleted once no dish links it and no cooking run refers to
+    it. Should be called inside a transaction.
+    :param dish: Dish
+    :param timing: Timing - a timing of the dish
+    :param timing_data: validated timing
+    :return: Timing
+    """
+    db_timing, = store_timings([timing_data])
+
+    DishTiming.objects.filter(dish=dish, timing=timing).update(
+        timing=db_timing
+    )
+
+    DishesVersion.objects.bump(dish.users.values_list('id', flat=True))
+    index_dishes([dish.id])
+
+    if not (timing.dishes.exists() or timing.runs.exists()):
+        timing.delete()
+
+    return db_timing
+
+
+def bulk_create_timings(dish_timings):
+    """
+    Links timings to possibly different dishes, one link per pair, see
+    store_timings. Versions of the dish users are left to the caller.
+    :param dish_timings: list of (Dish, validated timing) pairs
+    :return: list of Timing in the order of dish_timings
+    """
+    db_timings = store_timings([timing for _, timing in dish_timings])
+
+    DishTiming.objects.bulk_create([
+        DishTiming(dish_id=dish.id, timing_id=db_timing.id)
+        for (dish, _), db_timing in zip(dish_timings, db_timings)
+    ])
+
+    return db_timings
+
+
+def store_timings(timings_data):
+    """
+    Stores timings with their atomic timings without linking them.
+    Timings are deduplicated by content, so a timing which is already
+    stored, or repeated in timings_data, is returned instead of created.
+    :param timings_data: list of validated timings
+    :return: list of Timing in the order of timings_data
+    """
+    atomic_timings = [
+        [AtomicTiming(seconds=atomic_timing['seconds'],
+                      power=atomic_timing['power'])
+         for atomic_timing in timing.get('atomic_timings', ())]
+        for timing in timings_data
+    ]
+
+    for timing_atomic_timings in atomic_timings:
+        clean_fields(timing_atomic_timings, exclude=('timing',))
+
+    programs = [
+        compile_program((atomic.seconds, atomic.power)
+                        for atomic in timing_atomic_timings)
+        for timing_atomic_timings in atomic_timings
+    ]
+    hashes = [timing_hash(timing['name'], program)
+              for timing, program in zip(timings_data, programs)]
+
+    # the oldest timing of a content is the linked one
+    db_timings = {
+        db_timing.content_hash: db_timing for db_timing
+        in Timing.objects.filter(content_hash__in=set(hashes)).order_by('-pk')
+    }
+
+    new_timings = []
+    new_atomic_timings = []
+    for timing, program, content_hash, timing_atomic_timings in zip(
+            timings_data, programs, hashes, atomic_timings):
+        if content_hash in db_timings:
+            continue
+
+        db_timing = Timing(name=timing['name'], program=program,
+                           content_hash=content_hash)
+        db_timings[content_hash] = db_timing
+        new_timings.append(db_timing)
+        new_atomic_timings.append(timing_atomic_timings)
+
+    clean_fields(new_timings)
+    bulk_create_with_ids(Timing, new_timings)
+
+    db_atomic_timings = []
+    for db_timing, timing_atomic_timings in zip(new_timings,
+                                                new_atomic_timings):
+        for atomic in timing_atomic_timings:
+            atomic.timing = db_timing
+            db_atomic_timings.append(atomic)
+
+    AtomicTiming.objects.bulk_create(db_atomic_timings)
+
+    return [db_timings[content_hash] for content_hash in hashes]
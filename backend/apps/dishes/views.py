@@ -1,22 +1,68 @@
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import quote_etag
 from rest_framework.views import APIView
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
-from .serializers import DishSerializer, TimingSerializer
-from .models import Dish
+from users.authentication import ExpiringTokenAuthentication
+from .analytics import dish_statistics, users_distribution
+from .cache import dish_cache
+from .conditional import dishes_etag, not_modified, set_validators
+from .importers import DishImporter, iter_json_array, iter_ndjson
+from .pagination import (DishCursorPagination, DishSearchPagination,
+                         stream_json_list)
+from .programs import program_etag
+from .search import search_dishes
+from .serializers import (DishForkSerializer, DishSerializer,
+                          TimingSerializer, serialize_dishes)
+from .models import Dish, DishesVersion, Timing
 
 
 class DishView(APIView):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get(self, request):
-        user_dishes = Dish.objects.filter(users__id=request.user.id)
+        """
+        Lists user's dishes. `?cursor=` or `?page_size=` switch to keyset
+        paginated pages, `?stream=1` streams the whole list in chunks.
+        Answers 304 if the client's ETag is current.
+        :param request: HttpRequest
+        :return: Response([dish], status), paginated Response,
+                 StreamingHttpResponse or HttpResponseNotModified
+        """
+        version = DishesVersion.objects.for_user(request.user)
+        etag = dishes_etag(request, version)
+
+        response = not_modified(request, etag, version.modified)
+        if response:
+            return response
+
+        return set_validators(self.list_dishes(request), etag,
+                              version.modified)
+
+    def list_dishes(self, request):
+        user_dishes = Dish.objects.owned_by(request.user)
+
+        if request.query_params.get('stream'):
+            pages = user_dishes.iter_pages(settings.DISHES_STREAM_CHUNK_SIZE)
+
+            return StreamingHttpResponse(
+                stream_json_list(pages, serialize_dishes),
+                content_type='application/json',
+            )
+
+        paginator = DishCursorPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(user_dishes, request,
+                                               view=self)
 
-        serializer = DishSerializer(user_dishes, many=True)
+            return paginator.get_paginated_response(serialize_dishes(page))
 
-        response_data = serializer.data
+        response_data = serialize_dishes(user_dishes)
 
         return Response(data=response_data, status=200)
 
@@ -30,11 +76,58 @@ class DishView(APIView):
         return Response(data=serializer.data, status=201)
 
 
+class DishSearchView(APIView):
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        """
+        Searches user's dishes by name, description and timing names,
+        the best matching first, see dishes.search. `?q=` is the query,
+        `?page_size=` and `?offset=` select the page.
+        :param request: HttpRequest
+        :return: Response({results, next}, status)
+                 or HttpResponseNotModified
+        """
+        version = DishesVersion.objects.for_user(request.user)
+        etag = dishes_etag(request, version)
+
+        response = not_modified(request, etag, version.modified)
+        if response:
+            return response
+
+        text = request.query_params.get('q', '')
+        paginator = DishSearchPagination(request)
+
+        dish_ids = paginator.paginate(
+            lambda limit, offset: search_dishes(request.user, text,
+                                                limit, offset)
+        )
+        dishes = Dish.objects.in_bulk(dish_ids)
+
+        response_data = {
+            'results': serialize_dishes([dishes[dish_id]
+                                         for dish_id in dish_ids
+                                         if dish_id in dishes]),
+            'next': paginator.get_next_link(),
+        }
+
+        return set_validators(Response(data=response_data, status=200),
+                              etag, version.modified)
+
+
 class TimingView(APIView):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get(self, request, dish_id):
+        version = DishesVersion.objects.for_user(request.user)
+        etag = dishes_etag(request, version)
+
+        response = not_modified(request, etag, version.modified)
+        if response:
+            return response
+
         dish = Dish.objects.filter(users__id=request.user.id,
                                    pk=dish_id).first()
         if not dish:
@@ -43,11 +136,13 @@ class TimingView(APIView):
                 status=403
             )
 
-        timings = dish.timings.all()
-
-        serializer = TimingSerializer(timings, many=True)
+        # timings of a dish are a part of its cached serialization
+        serialized_dish, = serialize_dishes([dish])
 
-        return Response(data=serializer.data, status=200)
+        return set_validators(
+            Response(data=serialized_dish['timings'], status=200),
+            etag, version.modified
+        )
 
     def post(self, request, dish_id):
         dish = Dish.objects.filter(users__id=request.user.id,
@@ -64,3 +159,198 @@ class TimingView(APIView):
         serializer.save(dish=dish)
 
         return Response(data=serializer.data, status=201)
+
+
+class TimingDetailView(APIView):
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def put(self, request, dish_id, timing_id):
+        """
+        Replaces a timing of a dish. Other dishes which share the timing
+        keep the old one, so the timing id may change.
+        :param request: HttpRequest
+        :param dish_id: int
+        :param timing_id: int
+        :return: Response(timing, status)
+        """
+        dish = Dish.objects.filter(users__id=request.user.id,
+                                   pk=dish_id).first()
+        if not dish:
+            return Response(
+                data=f"User not allowed to edit dish with id {dish_id}",
+                status=403
+            )
+
+        timing = dish.timings.filter(pk=timing_id).first()
+        if not timing:
+            return Response(
+                data=f"Timing {timing_id} was not found in dish {dish_id}",
+                status=404
+            )
+
+        serializer = TimingSerializer(timing, data=request.data)
+
+        serializer.is_valid(raise_exception=True)
+        serializer.save(dish=dish)
+
+        return Response(data=serializer.data, status=200)
+
+
+class DishForkView(APIView):
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, dish_id):
+        """
+        Creates user's own copy of a dish under a new name. Timings are
+        shared with the forked dish until they are replaced.
+        :param request: HttpRequest
+        :param dish_id: int
+        :return: Response(dish, status)
+        """
+        dish = Dish.objects.filter(users__id=request.user.id,
+                                   pk=dish_id).first()
+        if not dish:
+            return Response(
+                data=f"User not allowed to read dish with id {dish_id}",
+                status=403
+            )
+
+        serializer = DishForkSerializer(data=request.data)
+
+        serializer.is_valid(raise_exception=True)
+        fork = serializer.save(source=dish, cook=request.user)
+
+        serialized_dish, = serialize_dishes([fork])
+
+        return Response(data=serialized_dish, status=201)
+
+
+class TimingProgramView(APIView):
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, dish_id, timing_id):
+        """
+        Returns compiled program of a timing, see dishes.programs
+        :param request: HttpRequest
+        :param dish_id: int
+        :param timing_id: int
+        :return: HttpResponse(program) with ETag or HttpResponseNotModified
+        """
+        timing = Timing.objects.filter(
+            pk=timing_id, dishes__id=dish_id, dishes__users__id=request.user.id
+        ).only('id', 'program').first()
+        if not timing:
+            return Response(
+                data=f"User not allowed to read timing with id {timing_id}",
+                status=403
+            )
+
+        program = timing.program
+        if program is None:
+            program = timing.compile_program()
+
+        etag = quote_etag(program_etag(program))
+
+        response = not_modified(request, etag)
+        if response:
+            return response
+
+        return set_validators(
+            HttpResponse(bytes(program),
+                         content_type='application/octet-stream'),
+            etag
+        )
+
+
+class DishImportView(APIView):
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        """
+        Imports dishes from a newline delimited JSON or a JSON array body.
+        The body is read and written in batches and never loaded as a whole.
+        :param request: HttpRequest
+        :return: StreamingHttpResponse with a JSON line per imported row
+                 and a summary line at the end
+        """
+        stream = request.stream
+
+        if stream is None:
+            rows = ()
+        elif request.content_type.startswith('application/json'):
+            rows = iter_json_array(stream)
+        else:
+            rows = iter_ndjson(stream)
+
+        results = DishImporter(request.user).run(rows)
+
+        return StreamingHttpResponse(
+            (json.dumps(result) + '\n' for result in results),
+            content_type='application/x-ndjson',
+        )
+
+
+class DishStatisticsView(APIView):
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        """
+        Returns cook time, energy and power histogram of user's dishes,
+        see dishes.analytics
+        :param request: HttpRequest
+        :return: Response({dishes, total_seconds, energy}, status)
+                 or HttpResponseNotModified
+        """
+        version = DishesVersion.objects.for_user(request.user)
+        etag = dishes_etag(request, version)
+
+        response = not_modified(request, etag, version.modified)
+        if response:
+            return response
+
+        dishes = list(Dish.objects.owned_by(request.user)
+                      .values_list('id', 'name'))
+        statistics = dish_statistics([dish_id for dish_id, _ in dishes])
+
+        response_data = {
+            'dishes': [dict(statistics[dish_id], id=dish_id, name=name)
+                       for dish_id, name in dishes],
+            'total_seconds': sum(dish['total_seconds']
+                                 for dish in statistics.values()),
+            'energy': sum(dish['energy'] for dish in statistics.values()),
+        }
+
+        return set_validators(Response(data=response_data, status=200),
+                              etag, version.modified)
+
+
+class UsersStatisticsView(APIView):
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """
+        Returns distribution of cook time and energy of dishes across users
+        :param request: HttpRequest
+        :return: Response({users, total_seconds, energy}, status)
+        """
+        return Response(data=users_distribution(), status=200)
+
+
+class DishCacheStats(APIView):
+
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """
+        Returns hit and miss counters of this process' dish cache
+        :param request: HttpRequest
+        :return: Response({hits, misses, hit_rate}, status)
+        """
+        return Response(data=dish_cache.stats(), status=200)
@@ -0,0 +1,20 @@
+""" Percentiles shared by the statistics and the benchmark reports
+
+Every report picks percentiles by the lower nearest rank, so p50, p95
+and p99 mean the same in all of them.
+"""
+
+
+def percentile(values, share):
+    """
+    The value a share of the way through sorted values, rounded down to
+    a value, so p50 of an even number of values is the lower middle one
+    :param values: sorted non empty list of numbers
+    :param share: float from 0 to 1
+    :return: one of values
+    """
+    return values[int(share * (len(values) - 1))]
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class StovesConfig(AppConfig):
     name = 'stoves'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_membership_cache(app_configs, **kwargs):
+    """
+    Membership versions are bumped in the cache, so every process serving
+    stoves has to share it, or a process keeps granting access its own
+    writes did not revoke
+    """
+    if not isinstance(caches[settings.STOVE_MEMBERSHIP_CACHE], LocMemCache):
+        return []
+
+    return [Warning(
+        f'STOVE_MEMBERSHIP_CACHE {settings.STOVE_MEMBERSHIP_CACHE!r} is '
+        f'local to the process.',
+        hint='Set STOVE_MEMBERSHIP_CACHE to a cache shared by all the '
+             'processes, e.g. Redis or memcached, unless a single process '
+             'serves the API.',
+        id='stoves.W001',
+    )]
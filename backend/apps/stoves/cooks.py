@@ -0,0 +1,132 @@
+""" Adding and removing cooks of many stoves at once
+
+A bulk request takes stove ids and user ids and applies to every
+(stove, user) pair. It is resolved with a fixed number of queries
+whatever the number of pairs is, and every pair gets its own status.
+"""
+from django.db import IntegrityError, transaction
+
+from users.models import User
+from .events import publish
+from .membership import membership_cache
+from .models import Cook
+
+ADDED = 'added'
+REMOVED = 'removed'
+ALREADY_COOK = 'already_cook'
+NOT_COOK = 'not_cook'
+IS_CHIEF = 'chief'
+NOT_CHIEF = 'not_chief'
+USER_NOT_FOUND = 'user_not_found'
+
+# concurrent requests may insert the same cooks
+ADD_ATTEMPTS = 3
+
+
+def chief_stove_ids(chief, stove_ids):
+    return set(Cook.objects.filter(
+        user_id=chief.id, is_chief=True, stove_id__in=stove_ids
+    ).values_list('stove_id', flat=True))
+
+
+def memberships(stove_ids, user_ids):
+    return set(Cook.objects.filter(
+        stove_id__in=stove_ids, user_id__in=user_ids
+    ).values_list('stove_id', 'user_id'))
+
+
+def result(stove_id, user_id, status):
+    return {'stove_id': stove_id, 'user_id': user_id, 'status': status}
+
+
+def add_cooks(chief, stove_ids, user_ids):
+    """
+    Makes the users cooks of the stoves the chief is a chief of
+    :param chief: User
+    :param stove_ids: list of int
+    :param user_ids: list of int
+    :return: list of {stove_id, user_id, status} in the order of the pairs
+    """
+    users = User.objects.in_bulk(user_ids)
+    allowed = chief_stove_ids(chief, stove_ids)
+
+    for attempt in range(1, ADD_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                existing = memberships(allowed, list(users))
+                new_cooks = [
+                    Cook(stove_id=stove_id, user_id=user_id)
+                    for stove_id in stove_ids if stove_id in allowed
+                    for user_id in user_ids if user_id in users
+                    and (stove_id, user_id) not in existing
+                ]
+                # pairs may repeat in a request
+                new_cooks = list({(cook.stove_id, cook.user_id): cook
+                                  for cook in new_cooks}.values())
+
+                Cook.objects.bulk_create(new_cooks)
+                break
+        except IntegrityError:
+            if attempt == ADD_ATTEMPTS:
+                raise
+
+    # bulk_create sends no signals, see stoves.signals
+    for stove_id in {cook.stove_id for cook in new_cooks}:
+        membership_cache.invalidate(stove_id)
+    for cook in new_cooks:
+        publish([cook.stove_id], 'cook_added', {'user_id': cook.user_id})
+
+    results = []
+    for stove_id in stove_ids:
+        for user_id in user_ids:
+            if stove_id not in allowed:
+                status = NOT_CHIEF
+            elif user_id not in users:
+                status = USER_NOT_FOUND
+            elif (stove_id, user_id) in existing:
+                status = ALREADY_COOK
+            else:
+                status = ADDED
+
+            results.append(result(stove_id, user_id, status))
+
+    return results
+
+
+def remove_cooks(chief, stove_ids, user_ids):
+    """
+    Removes the users from cooks of the stoves the chief is a chief of.
+    Chiefs are not removed.
+    :param chief: User
+    :param stove_ids: list of int
+    :param user_ids: list of int
+    :return: list of {stove_id, user_id, status} in the order of the pairs
+    """
+    allowed = chief_stove_ids(chief, stove_ids)
+
+    with transaction.atomic():
+        cooks = {(stove_id, user_id): is_chief
+                 for stove_id, user_id, is_chief in Cook.objects.filter(
+                     stove_id__in=allowed, user_id__in=user_ids
+                 ).values_list('stove_id', 'user_id', 'is_chief')}
+
+        # post_delete signals invalidate memberships and publish events
+        if not all(cooks.values()):
+            Cook.objects.filter(stove_id__in=allowed, user_id__in=user_ids,
+                                is_chief=False).delete()
+
+    results = []
+    for stove_id in stove_ids:
+        for user_id in user_ids:
+            if stove_id not in allowed:
+                status = NOT_CHIEF
+            elif (stove_id, user_id) not in cooks:
+                status = NOT_COOK
+            elif cooks[stove_id, user_id]:
+                status = IS_CHIEF
+            else:
+                status = REMOVED
+
+            results.append(result(stove_id, user_id, status))
+
+    return results
@@ -0,0 +1,158 @@
+""" Stove events pub/sub
+
+Events are published after the transaction which caused them commits and
+go through the broker set in STOVE_EVENTS_BROKER. LocalBroker delivers
+them to the connections of this process only. A broker shared by several
+processes (e.g. on top of Redis pub/sub) publishes into its channel and
+calls hub.deliver() for every event it receives from there. Brokers are
+created with the hub and implement publish(stove_id, event) and is_idle().
+"""
+import asyncio
+import threading
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+Event = namedtuple('Event', ('type', 'data'))
+
+
+class Subscription:
+    """ Events of a stove for one connection, read in its event loop """
+
+    __slots__ = ('stove_id', 'loop', 'queue', 'overflown')
+
+    def __init__(self, stove_id, loop, size):
+        self.stove_id = stove_id
+        self.loop = loop
+        self.queue = asyncio.Queue(size)
+        self.overflown = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # the connection gets closed and the stove reloads its state
+            # once it reconnects
+            self.overflown = True
+
+    async def get(self):
+        """
+        Waits for the next event
+        :return: Event or None if the connection fell behind
+        """
+        event = await self.queue.get()
+
+        return None if self.overflown else event
+
+
+class EventHub:
+    """
+    Keeps subscriptions of the connections of this process.
+    Subscriptions are made in the event loop of their connection,
+    events may be delivered from any thread.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, stove_id):
+        """
+        Subscribes to events of a stove, must be called in the event loop
+        which reads the subscription
+        :param stove_id: int
+        :return: Subscription
+        """
+        subscription = Subscription(stove_id, asyncio.get_event_loop(),
+                                    settings.STOVE_EVENTS_QUEUE_SIZE)
+
+        with self._lock:
+            self._subscriptions[stove_id].add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions[subscription.stove_id]
+            subscriptions.discard(subscription)
+
+            if not subscriptions:
+                del self._subscriptions[subscription.stove_id]
+
+    def deliver(self, stove_id, event):
+        """
+        Passes an event to every connection of a stove in this process
+        :param stove_id: int
+        :param event: Event
+        :return: None
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(stove_id, ()))
+
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put,
+                                                       event)
+            except RuntimeError:
+                # the event loop is closed
+                self.unsubscribe(subscription)
+
+    def connections(self):
+        with self._lock:
+            return sum(map(len, self._subscriptions.values()))
+
+
+class LocalBroker:
+    """ Delivers events to the connections of this process only """
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, stove_id, event):
+        self.hub.deliver(stove_id, event)
+
+    def is_idle(self):
+        """
+        Tells that nobody listens, so events do not need to be built
+        :return: bool
+        """
+        return not self.hub.connections()
+
+
+hub = EventHub()
+
+
+@lru_cache(maxsize=None)
+def _broker(path):
+    return import_string(path)(hub)
+
+
+def get_broker():
+    """
+    Returns the broker set in STOVE_EVENTS_BROKER setting, it is created
+    once per process
+    :return: broker
+    """
+    return _broker(settings.STOVE_EVENTS_BROKER)
+
+
+def publish(stove_ids, event_type, data):
+    """
+    Publishes an event to the stoves once the current transaction commits
+    :param stove_ids: iterable of int
+    :param event_type: str
+    :param data: JSON serializable object
+    :return: None
+    """
+    event = Event(event_type, data)
+    stove_ids = list(stove_ids)
+    broker = get_broker()
+
+    def send():
+        for stove_id in stove_ids:
+            broker.publish(stove_id, event)
+
+    transaction.on_commit(send)
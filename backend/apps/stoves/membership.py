@@ -0,0 +1,112 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Stove
+
+
+class MembershipCache:
+    """
+    Caches stoves annotated with a user's membership
+    (see StoveQuerySet.with_membership) per (user, stove).
+    Every stove has a version which is a part of the cache keys,
+    so changing a stove or any of its cooks drops the entries
+    of all users at once. Versions are bumped only in the cache, so it
+    has to be shared by all processes, see stoves.checks.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.STOVE_MEMBERSHIP_CACHE]
+
+    @staticmethod
+    def version_key(stove_id):
+        return f'stove-membership-version:{stove_id}'
+
+    def get_version(self, stove_id):
+        version_key = self.version_key(stove_id)
+
+        version = self.cache.get(version_key)
+        if version is None:
+            # Start from the current time so that entries cached before
+            # the version key got evicted can not be served again
+            self.cache.add(version_key, int(time.time() * 1000), None)
+            version = self.cache.get(version_key)
+
+        return version
+
+    def get_stove(self, user, stove_id):
+        """
+        Returns stove annotated with user's membership or None
+        if stove does not exist
+        :param user: User
+        :param stove_id: int
+        :return: Stove or None
+        """
+        version = self.get_version(stove_id)
+        key = f'stove-membership:{stove_id}:{version}:{user.id}'
+
+        stove = self.cache.get(key)
+        self.count(hit=stove is not None)
+
+        if stove is None:
+            stove = (Stove.objects.with_membership(user)
+                     .filter(id=stove_id).first())
+
+            if stove is not None:
+                self.cache.set(key, stove,
+                               settings.STOVE_MEMBERSHIP_CACHE_TIMEOUT)
+
+        return stove
+
+    def invalidate(self, stove_id):
+        """
+        Drops cached memberships of all users of a stove, once right away
+        and once more when the transaction commits, so a concurrent read
+        of the old rows can not be cached under the new version
+        :param stove_id: int
+        :return: None
+        """
+        self._incr_version(stove_id)
+        transaction.on_commit(lambda: self._incr_version(stove_id))
+
+    def _incr_version(self, stove_id):
+        try:
+            self.cache.incr(self.version_key(stove_id))
+        except ValueError:
+            self.get_version(stove_id)
+
+    def count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+
+        total = hits + misses
+
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+membership_cache = MembershipCache()
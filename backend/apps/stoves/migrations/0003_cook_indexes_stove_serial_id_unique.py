@@ -0,0 +1,79 @@
+# Generated by Django 2.1.4 on 2026-10-18 18:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def delete_duplicate_cooks(apps, schema_editor):
+    """
+    Keeps one cook per (stove, user), the chief one if there is any
+    """
+    Cook = apps.get_model('stoves', 'Cook')
+
+    seen = set()
+    duplicates = []
+
+    for cook in Cook.objects.order_by('stove_id', 'user_id', '-is_chief',
+                                      'id').iterator():
+        if (cook.stove_id, cook.user_id) in seen:
+            duplicates.append(cook.id)
+        seen.add((cook.stove_id, cook.user_id))
+
+    Cook.objects.filter(id__in=duplicates).delete()
+
+
+def reject_duplicate_serial_ids(apps, schema_editor):
+    """
+    Stops the migration before the unique constraint fails on stoves
+    sharing a serial id. Which of them is the real stove, and where its
+    cooks and runs belong, can not be told from the data, so they have
+    to be resolved by hand.
+    """
+    Stove = apps.get_model('stoves', 'Stove')
+
+    duplicates = list(
+        Stove.objects.values('serial_id')
+        .annotate(stoves=models.Count('id'))
+        .filter(stoves__gt=1)
+        .order_by('serial_id')
+        .values_list('serial_id', flat=True)
+    )
+    if duplicates:
+        raise ValueError(
+            f'Stoves share serial ids {", ".join(duplicates)}. Rename or '
+            f'delete the duplicates and migrate again.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stoves', '0002_cook_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_cooks,
+                             migrations.RunPython.noop),
+        migrations.RunPython(reject_duplicate_serial_ids,
+                             migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cook',
+            name='stove',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='cooks', to='stoves.Stove'),
+        ),
+        migrations.AlterField(
+            model_name='stove',
+            name='serial_id',
+            field=models.CharField(max_length=32, unique=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cook',
+            unique_together={('stove', 'user')},
+        ),
+        migrations.AddIndex(
+            model_name='cook',
+            index=models.Index(fields=['stove', 'is_chief'], name='cook_stove_chief_idx'),
+        ),
+    ]
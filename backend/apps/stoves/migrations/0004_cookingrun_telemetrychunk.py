@@ -0,0 +1,45 @@
+# Generated by Django 2.1.15 on 2026-10-18 18:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dishes', '0004_dishesversion'),
+        ('stoves', '0003_cook_indexes_stove_serial_id_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CookingRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.DateTimeField(default=django.utils.timezone.now)),
+                ('samples_count', models.PositiveIntegerField(default=0)),
+                ('stove', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='stoves.Stove')),
+                ('timing', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='runs', to='dishes.Timing')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TelemetryChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_timestamp', models.BigIntegerField()),
+                ('last_timestamp', models.BigIntegerField()),
+                ('samples_count', models.PositiveIntegerField()),
+                ('samples', models.BinaryField()),
+                ('run', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='stoves.CookingRun')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='telemetrychunk',
+            index=models.Index(fields=['run', 'first_timestamp'], name='telemetry_chunk_run_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cookingrun',
+            index=models.Index(fields=['stove', 'started'], name='cooking_run_stove_started_idx'),
+        ),
+    ]
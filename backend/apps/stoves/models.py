@@ -1,16 +1,90 @@
 from django.db import models
+from django.utils import timezone
+
+from dishes.models import Timing
 from users.models import User
 
 
+class StoveQuerySet(models.QuerySet):
+
+    def with_membership(self, user):
+        """
+        Annotates stoves with the number of cooks and with the user's
+        cook and chief flags, all in the same query
+        :param user: User
+        :return: StoveQuerySet
+        """
+        def flag(**conditions):
+            # MAX over booleans is not supported by every backend
+            return models.Max(models.Case(
+                models.When(then=models.Value(1), **conditions),
+                default=models.Value(0),
+                output_field=models.IntegerField(),
+            ))
+
+        return self.annotate(
+            cooks_count=models.Count('cooks'),
+            caller_is_cook=flag(cooks__user=user.id),
+            caller_is_chief=flag(cooks__user=user.id,
+                                 cooks__is_chief=True),
+        )
+
+
 class Stove(models.Model):
-    serial_id = models.CharField(max_length=32)
+    serial_id = models.CharField(max_length=32, unique=True)
     name = models.CharField(max_length=50, blank=True)
 
+    objects = StoveQuerySet.as_manager()
+
 
 class Cook(models.Model):
     user = models.ForeignKey(User, on_delete=models.PROTECT,
                              related_name='as_cook')
+    # indexed as the leading column of the indexes below
     stove = models.ForeignKey(Stove, related_name='cooks',
-                              on_delete=models.CASCADE)
+                              on_delete=models.CASCADE, db_index=False)
 
     is_chief = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = (('stove', 'user'),)
+        indexes = [
+            models.Index(fields=('stove', 'is_chief'),
+                         name='cook_stove_chief_idx'),
+        ]
+
+
+class CookingRun(models.Model):
+    """ A timing executed by a stove, see TelemetryChunk for its samples """
+
+    stove = models.ForeignKey(Stove, related_name='runs',
+                              on_delete=models.CASCADE, db_index=False)
+    timing = models.ForeignKey(Timing, related_name='runs', null=True,
+                               on_delete=models.SET_NULL)
+    started = models.DateTimeField(default=timezone.now)
+    samples_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('stove', 'started'),
+                         name='cooking_run_stove_started_idx'),
+        ]
+
+
+class TelemetryChunk(models.Model):
+    """ Samples of a run packed by stoves.telemetry.pack_samples """
+
+    # indexed as the leading column of the index below
+    run = models.ForeignKey(CookingRun, related_name='chunks',
+                            on_delete=models.CASCADE, db_index=False)
+    # milliseconds since epoch
+    first_timestamp = models.BigIntegerField()
+    last_timestamp = models.BigIntegerField()
+    samples_count = models.PositiveIntegerField()
+    samples = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('run', 'first_timestamp'),
+                         name='telemetry_chunk_run_idx'),
+        ]
@@ -1,15 +1,42 @@
 from rest_framework import permissions
 
-from .models import Stove, Cook
+from .membership import membership_cache
+from .models import Stove
 
 
-class CooksOnly(permissions.BasePermission):
+class StovePermission(permissions.BasePermission):
     expects_authentication = True
 
+    @staticmethod
+    def get_stove(request, view):
+        """
+        Resolves the stove together with the caller's membership in one
+        query and keeps it on the request for other permissions and views.
+        Safe requests are answered from the membership cache, the others
+        always see the current membership.
+        :param request: Request
+        :param view: APIView
+        :return: Stove or None
+        """
+        if not hasattr(request, 'stove'):
+            stove_id = view.kwargs.get('stove_id', 0)
+
+            if request.method in permissions.SAFE_METHODS:
+                request.stove = membership_cache.get_stove(request.user,
+                                                           stove_id)
+            else:
+                request.stove = (Stove.objects.with_membership(request.user)
+                                 .filter(id=stove_id).first())
+
+        return request.stove
+
+
+class CooksOnly(StovePermission):
+
     def has_permission(self, request, view):
         stove_id = view.kwargs.get('stove_id', 0)
 
-        stove = Stove.objects.filter(id=stove_id).first()
+        stove = self.get_stove(request, view)
         if not stove:
             self.message = (
                 'Cook permission denied. Stove id was not found'
@@ -18,9 +45,7 @@ class CooksOnly(permissions.BasePermission):
             return False
 
         if request.method in permissions.SAFE_METHODS:
-            cook = stove.cooks.filter(user=request.user).first()
-
-            if not cook:
+            if not stove.caller_is_cook:
                 self.message = (
                     f'Cook permission denied. User '
                     f'{request.user.id} is not a cook of '
@@ -29,7 +54,7 @@ class CooksOnly(permissions.BasePermission):
 
                 return False
         else:
-            if len(stove.cooks.all()):
+            if stove.cooks_count:
                 self.message = (f'Cook permission denied. '
                                 f'Stove {stove_id} already has a chief')
                 return False
@@ -42,26 +67,23 @@ class CooksOnly(permissions.BasePermission):
         return True
 
 
-class ChiefsOnly(permissions.BasePermission):
-    expects_authentication = True
+class ChiefsOnly(StovePermission):
 
     def has_permission(self, request, view):
 
         stove_id = view.kwargs.get('stove_id', 0)
 
-        stove = Stove.objects.filter(id=stove_id).first()
+        stove = self.get_stove(request, view)
         if not stove:
             self.message = 'Chief permission denied. Stove id was not found'
 
             return False
 
-        cook = stove.cooks.filter(user=request.user).first()
-
-        if not cook:
+        if not stove.caller_is_cook:
             self.message = (f'User {request.user.id} is not a cook of a stove '
                             f'{stove_id}')
             return False
-        elif not cook.is_chief:
+        elif not stove.caller_is_chief:
             self.message = (f'Cook '
                             f'{request.user.id} has no chief permission '
                             f'for a stove {stove_id}')
@@ -70,4 +92,22 @@ class ChiefsOnly(permissions.BasePermission):
         return True
 
 
+class StoveCooksOnly(StovePermission):
+    """ Any cook of the stove, chief or not, for any method """
+
+    def has_permission(self, request, view):
+        stove_id = view.kwargs.get('stove_id', 0)
 
+        stove = self.get_stove(request, view)
+        if not stove:
+            self.message = 'Cook permission denied. Stove id was not found'
+
+            return False
+
+        if not stove.caller_is_cook:
+            self.message = (f'Cook permission denied. User '
+                            f'{request.user.id} is not a cook of '
+                            f'a stove {stove_id}')
+            return False
+
+        return True
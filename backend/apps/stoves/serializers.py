@@ -1,5 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
 
+from dishes.models import Timing
+from exceptions import NotFound
 from users.serializers import UserSerializer
 from .models import Cook
 
@@ -12,3 +15,33 @@ class CookSerializer(serializers.ModelSerializer):
         model = Cook
         fields = ('id', 'user', 'is_chief')
 
+
+class CookingRunSerializer(serializers.Serializer):
+    """ A run started by a cook, of a timing of the cook's dishes """
+    timing_id = serializers.IntegerField(required=False, allow_null=True)
+
+    def validate_timing_id(self, value):
+        user = self.context['request'].user
+
+        if value is not None and not Timing.objects.filter(
+                pk=value, dishes__users=user).exists():
+            raise NotFound(f'Timing {value} was not found')
+
+        return value
+
+
+class BulkCooksSerializer(serializers.Serializer):
+    stove_ids = serializers.ListField(child=serializers.IntegerField(),
+                                      allow_empty=False)
+    user_ids = serializers.ListField(child=serializers.IntegerField(),
+                                     allow_empty=False)
+
+    def validate(self, attrs):
+        pairs = len(attrs['stove_ids']) * len(attrs['user_ids'])
+        if pairs > settings.STOVE_COOKS_MAX_BULK_SIZE:
+            raise serializers.ValidationError(
+                f'At most {settings.STOVE_COOKS_MAX_BULK_SIZE} stove and '
+                f'user pairs can be sent at once, got {pairs}'
+            )
+
+        return attrs
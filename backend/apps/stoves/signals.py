@@ -0,0 +1,49 @@
+from collections import defaultdict
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from dishes.models import dishes_changed
+from .events import get_broker, publish
+from .membership import membership_cache
+from .models import Cook, Stove
+
+
+@receiver((post_save, post_delete), sender=Cook)
+def invalidate_cook_membership(sender, instance, **kwargs):
+    membership_cache.invalidate(instance.stove_id)
+
+
+@receiver((post_save, post_delete), sender=Stove)
+def invalidate_stove_membership(sender, instance, **kwargs):
+    membership_cache.invalidate(instance.id)
+
+
+@receiver(post_save, sender=Cook)
+def publish_cook_added(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    publish([instance.stove_id],
+            'chief_claimed' if instance.is_chief else 'cook_added',
+            {'user_id': instance.user_id})
+
+
+@receiver(post_delete, sender=Cook)
+def publish_cook_removed(sender, instance, **kwargs):
+    publish([instance.stove_id], 'cook_removed',
+            {'user_id': instance.user_id})
+
+
+@receiver(dishes_changed)
+def publish_dishes_changed(sender, user_ids, **kwargs):
+    if get_broker().is_idle():
+        return
+
+    stove_cooks = defaultdict(list)
+    for stove_id, user_id in (Cook.objects.filter(user_id__in=user_ids)
+                              .values_list('stove_id', 'user_id')):
+        stove_cooks[stove_id].append(user_id)
+
+    for stove_id, cook_ids in stove_cooks.items():
+        publish([stove_id], 'dishes_changed', {'user_ids': sorted(cook_ids)})
@@ -0,0 +1,189 @@
+""" Server-sent events of stoves over ASGI
+
+GET /api/stoves/<stove_id>/events streams events of a stove
+(see stoves.events) to its cooks as text/event-stream:
+
+    event: cook_added
+    data: {"user_id": 5}
+
+Every connection is a coroutine waiting on its subscription, so idle
+connections hold no thread. Only the token and membership checks run
+in the default executor, as they use the ORM. They are repeated every
+STOVE_EVENTS_KEEPALIVE seconds, and the stream of a cook is closed
+after the cook_removed event of the cook, so cooks removed from the
+stove and revoked or expired tokens stop receiving events.
+"""
+import asyncio
+import json
+import re
+
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework import exceptions
+
+from users.authentication import ExpiringTokenAuthentication
+from .events import get_broker, hub
+from .membership import membership_cache
+
+EVENTS_PATH = re.compile(r'^/api/stoves/(?P<stove_id>\d+)/events$')
+
+
+def authorize(headers, stove_id):
+    """
+    Checks that the request is made by a cook of the stove
+    :param headers: dict of ASGI headers
+    :param stove_id: int
+    :return: (int status, str reason, int user id or None)
+    """
+    close_old_connections()
+    try:
+        auth = headers.get(b'authorization', b'').decode('latin-1').split()
+        if len(auth) != 2 or auth[0].lower() != 'token':
+            return 401, 'Authentication credentials were not provided.', None
+
+        try:
+            user, _ = ExpiringTokenAuthentication() \
+                .authenticate_credentials(auth[1])
+        except exceptions.AuthenticationFailed as error:
+            return 401, str(error.detail), None
+
+        stove = membership_cache.get_stove(user, stove_id)
+        if stove is None:
+            return 404, 'Not found.', user.id
+        if not stove.caller_is_cook:
+            return 403, 'User is not a cook of the stove.', user.id
+
+        return 200, '', user.id
+    finally:
+        close_old_connections()
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def encode_event(event):
+    return (f'event: {event.type}\n'
+            f'data: {json.dumps(event.data)}\n\n').encode()
+
+
+class StoveEventsApp:
+    """
+    ASGI application serving stove events, other requests are passed
+    to the fallback application if there is one
+    """
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(scope, receive, send)
+
+        match = scope['type'] == 'http' and EVENTS_PATH.match(scope['path'])
+        if not match:
+            if self.fallback is not None:
+                return await self.fallback(scope, receive, send)
+
+            return await self.respond(send, 404, 'Not found.')
+
+        if scope['method'] != 'GET':
+            return await self.respond(send, 405, 'Method not allowed.')
+
+        stove_id = int(match.group('stove_id'))
+        headers = dict(scope['headers'])
+        status, reason, user_id = await self.authorize(headers, stove_id)
+        if status != 200:
+            return await self.respond(send, status, reason)
+
+        await self.stream(stove_id, user_id, headers, receive, send)
+
+    @staticmethod
+    async def authorize(headers, stove_id):
+        return await asyncio.get_event_loop().run_in_executor(
+            None, authorize, headers, stove_id
+        )
+
+    async def lifespan(self, scope, receive, send):
+        while True:
+            message = await receive()
+
+            if message['type'] == 'lifespan.startup':
+                # connects a shared broker before the first event
+                get_broker()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def respond(send, status, reason):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json')],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': json.dumps({'detail': reason}).encode(),
+        })
+
+    async def stream(self, stove_id, user_id, headers, receive, send):
+        loop = asyncio.get_event_loop()
+        authorized = loop.time()
+
+        subscription = hub.subscribe(stove_id)
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [(b'content-type', b'text/event-stream'),
+                            (b'cache-control', b'no-cache'),
+                            (b'x-accel-buffering', b'no')],
+            })
+            await send({'type': 'http.response.body',
+                        'body': b': connected\n\n', 'more_body': True})
+
+            while True:
+                event = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait(
+                    (event, disconnect),
+                    timeout=settings.STOVE_EVENTS_KEEPALIVE,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                if disconnect in done:
+                    event.cancel()
+                    return
+
+                removed = False
+                if event in done:
+                    event = event.result()
+                    if event is None:
+                        break
+                    body = encode_event(event)
+                    removed = (event.type == 'cook_removed' and
+                               event.data['user_id'] == user_id)
+                else:
+                    event.cancel()
+                    body = b': keepalive\n\n'
+
+                await send({'type': 'http.response.body', 'body': body,
+                            'more_body': True})
+
+                if removed:
+                    break
+                if (loop.time() - authorized >=
+                        settings.STOVE_EVENTS_KEEPALIVE):
+                    status, _, _ = await self.authorize(headers, stove_id)
+                    if status != 200:
+                        break
+                    authorized = loop.time()
+
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnect.cancel()
+            hub.unsubscribe(subscription)
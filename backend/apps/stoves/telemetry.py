@@ -0,0 +1,137 @@
+""" Telemetry samples of cooking runs
+
+Samples are stored in chunks, a chunk is a little-endian binary blob:
+    header: magic b'STC', format version (uint8), samples count (uint32)
+    samples count uint32 millisecond offsets from the first sample
+    samples count uint8 power levels
+    samples count float32 temperatures in degrees Celsius
+The timestamp of the first sample is kept in the chunk row.
+"""
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from itertools import islice
+
+MAGIC = b'STC'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<3sBI')
+MAX_OFFSET = 2 ** 32 - 1
+# first timestamps of chunks are kept in a BigIntegerField
+MAX_TIMESTAMP = 2 ** 63 - 1
+MIN_TEMPERATURE = -273.15
+MAX_TEMPERATURE = 10000
+
+Sample = namedtuple('Sample', ('timestamp', 'power', 'temperature'))
+
+
+def parse_samples(raw_samples, max_samples):
+    """
+    Validates samples sent as [timestamp ms, power, temperature] lists
+    :param raw_samples: list
+    :param max_samples: int - maximum number of samples in a batch
+    :return: list of Sample ordered by timestamp
+    :raise ValueError: if samples are not valid
+    """
+    if not isinstance(raw_samples, list) or not raw_samples:
+        raise ValueError('Samples should be a non empty list')
+    if len(raw_samples) > max_samples:
+        raise ValueError(f'At most {max_samples} samples can be sent at once')
+
+    samples = []
+    for index, raw in enumerate(raw_samples):
+        try:
+            timestamp, power, temperature = raw
+        except (TypeError, ValueError):
+            raise ValueError(f'Sample {index} should be '
+                             f'[timestamp, power, temperature]')
+
+        if (type(timestamp) is not int or
+                not 0 <= timestamp <= MAX_TIMESTAMP or
+                type(power) is not int or not 0 <= power <= 100 or
+                type(temperature) not in (int, float) or
+                not MIN_TEMPERATURE <= temperature <= MAX_TEMPERATURE):
+            raise ValueError(f'Sample {index} is not valid')
+
+        samples.append(Sample(timestamp, power, temperature))
+
+    samples.sort(key=lambda sample: sample.timestamp)
+
+    return samples
+
+
+def iter_chunks(samples, chunk_size):
+    """
+    Splits ordered samples into chunks which fit a packed chunk
+    :param samples: list of Sample ordered by timestamp
+    :param chunk_size: int - maximum number of samples in a chunk
+    :return: generator of lists of Sample
+    """
+    samples = iter(samples)
+
+    chunk = list(islice(samples, chunk_size))
+    while chunk:
+        if chunk[-1].timestamp - chunk[0].timestamp > MAX_OFFSET:
+            first = chunk[0].timestamp
+            fits = next(index for index, sample in enumerate(chunk)
+                        if sample.timestamp - first > MAX_OFFSET)
+            rest = chunk[fits:]
+            chunk = chunk[:fits]
+        else:
+            rest = []
+
+        yield chunk
+
+        chunk = rest + list(islice(samples, chunk_size - len(rest)))
+
+
+def pack_samples(samples):
+    """
+    Packs samples of a chunk
+    :param samples: list of Sample ordered by timestamp, see iter_chunks
+    :return: bytes
+    """
+    first = samples[0].timestamp
+
+    offsets = array('I', [sample.timestamp - first for sample in samples])
+    powers = array('B', [sample.power for sample in samples])
+    temperatures = array('f', [sample.temperature for sample in samples])
+
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+        temperatures.byteswap()
+
+    return (HEADER.pack(MAGIC, FORMAT_VERSION, len(samples)) +
+            offsets.tobytes() + powers.tobytes() + temperatures.tobytes())
+
+
+def unpack_samples(first_timestamp, packed):
+    """
+    Reads samples of a chunk back
+    :param first_timestamp: int - timestamp of the first sample
+    :param packed: bytes
+    :return: list of Sample, temperatures are rounded to hundredths
+             as they are stored in single precision
+    :raise ValueError: if it is not a packed chunk
+    """
+    packed = bytes(packed)
+    if len(packed) < HEADER.size:
+        raise ValueError('Unknown chunk format')
+
+    magic, version, count = HEADER.unpack_from(packed)
+    if (magic != MAGIC or version != FORMAT_VERSION or
+            len(packed) != HEADER.size + 9 * count):
+        raise ValueError('Unknown chunk format')
+
+    start = HEADER.size
+    offsets = array('I', packed[start:start + 4 * count])
+    powers = array('B', packed[start + 4 * count:start + 5 * count])
+    temperatures = array('f', packed[start + 5 * count:])
+
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+        temperatures.byteswap()
+
+    return [Sample(first_timestamp + offset, power, round(temperature, 2))
+            for offset, power, temperature
+            in zip(offsets, powers, temperatures)]
@@ -1,3 +1,854 @@
-from django.test import TestCase
+import asyncio
+import json
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import request_finished
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from backend.asgi import application
+from dishes.models import Dish, Timing
+from dishes.utils import create_dishes, shared_dish_name
+from users.authentication import revoke_tokens
+from users.models import User, UserToken
+from .checks import check_membership_cache
+from .events import hub
+from .membership import membership_cache
+from .models import Cook, CookingRun, Stove, TelemetryChunk
+from .streams import StoveEventsApp
+from .telemetry import (MAX_OFFSET, MAX_TIMESTAMP, Sample, iter_chunks,
+                        pack_samples, unpack_samples)
+
+
+class StoveFixture:
+
+    def setUp(self):
+        caches[settings.USER_TOKEN_CACHE].clear()
+        caches[settings.STOVE_MEMBERSHIP_CACHE].clear()
+        membership_cache.reset_stats()
+
+        self.chief = self.create_user('chief@example.com')
+        self.cook = self.create_user('cook@example.com')
+        self.stranger = self.create_user('stranger@example.com')
+
+        self.stove = Stove.objects.create(serial_id='serial', name='stove')
+        Cook.objects.create(user=self.chief, stove=self.stove, is_chief=True)
+        Cook.objects.create(user=self.cook, stove=self.stove)
+
+        self.free_stove = Stove.objects.create(serial_id='free')
+
+    @staticmethod
+    def create_user(email):
+        return User.objects.create_user(email=email, password='secret1!',
+                                        is_active=True)
+
+    def client_for(self, user):
+        token = UserToken.objects.create(user=user)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        # resolve the token once so that it is served from the cache
+        client.get('/api/users/token-validation')
+
+        return client
+
+    def cooks_url(self, stove):
+        return f'/api/stoves/{stove.id}/cooks'
+
+    def chiefs_url(self, stove):
+        return f'/api/stoves/{stove.id}/chiefs'
+
+
+class StoveTestCase(StoveFixture, TestCase):
+    pass
+
+
+class MembershipCommitTest(StoveFixture, TransactionTestCase):
+
+    def test_membership_read_before_commit_is_not_kept(self):
+        stale = membership_cache.get_stove(self.cook, self.stove.id)
+        self.assertTrue(stale.caller_is_cook)
+
+        with transaction.atomic():
+            Cook.objects.filter(user=self.cook).delete()
+
+            # a concurrent request caches the membership it still reads
+            version = membership_cache.get_version(self.stove.id)
+            membership_cache.cache.set(
+                f'stove-membership:{self.stove.id}:{version}:{self.cook.id}',
+                stale
+            )
+
+        stove = membership_cache.get_stove(self.cook, self.stove.id)
+        self.assertFalse(stove.caller_is_cook)
+
+    def test_process_local_cache_is_reported(self):
+        self.assertEqual([warning.id for warning
+                          in check_membership_cache(None)], ['stoves.W001'])
+
+
+def query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+
+        return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+
+class StovePermissionQueriesTest(StoveTestCase):
+
+    def test_cooks_list(self):
+        client = self.client_for(self.chief)
+
+        # stove with membership + cooks with users
+        with self.assertNumQueries(2):
+            response = client.get(self.cooks_url(self.stove))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+    def test_cooks_list_denied_for_cook(self):
+        client = self.client_for(self.cook)
+
+        with self.assertNumQueries(1):
+            response = client.get(self.cooks_url(self.stove))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_cooks_list_of_missing_stove(self):
+        client = self.client_for(self.chief)
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/stoves/0/cooks')
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_cook_add(self):
+        client = self.client_for(self.chief)
+
+        # stove with membership + user + savepoint + insert + release
+        with self.assertNumQueries(5):
+            response = client.post(self.cooks_url(self.stove),
+                                   {'new_cook_id': self.stranger.id})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Cook.objects.filter(user=self.stranger,
+                                            stove=self.stove).exists())
+
+    def test_cook_add_of_existing_cook(self):
+        client = self.client_for(self.chief)
+
+        response = client.post(self.cooks_url(self.stove),
+                               {'new_cook_id': self.cook.id})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.stove.cooks.filter(user=self.cook).count(), 1)
+
+    def test_chief_get(self):
+        client = self.client_for(self.cook)
+
+        # stove with membership + chief with user
+        with self.assertNumQueries(2):
+            response = client.get(self.chiefs_url(self.stove))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['id'], self.chief.id)
+
+    def test_chief_get_denied_for_stranger(self):
+        client = self.client_for(self.stranger)
+
+        with self.assertNumQueries(1):
+            response = client.get(self.chiefs_url(self.stove))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_chief_claim(self):
+        client = self.client_for(self.stranger)
+
+        # stove with membership + insert
+        with self.assertNumQueries(2):
+            response = client.post(self.chiefs_url(self.free_stove),
+                                   {'stove_serial_id': 'free'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Cook.objects.get(user=self.stranger).is_chief)
+
+    def test_chief_claim_of_taken_stove(self):
+        client = self.client_for(self.stranger)
+
+        with self.assertNumQueries(1):
+            response = client.post(self.chiefs_url(self.stove),
+                                   {'stove_serial_id': 'serial'})
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_chief_claim_with_wrong_serial_id(self):
+        client = self.client_for(self.stranger)
+
+        response = client.post(self.chiefs_url(self.free_stove),
+                               {'stove_serial_id': 'wrong'})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(self.free_stove.cooks.exists())
+
+
+class MembershipCacheTest(StoveTestCase):
+
+    def test_repeated_reads_are_served_from_cache(self):
+        client = self.client_for(self.cook)
+
+        client.get(self.chiefs_url(self.stove))
+
+        # chief with user only
+        with self.assertNumQueries(1):
+            response = client.get(self.chiefs_url(self.stove))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(membership_cache.stats(),
+                         {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_cook_removal_invalidates_membership(self):
+        client = self.client_for(self.cook)
+        client.get(self.chiefs_url(self.stove))
+
+        Cook.objects.filter(user=self.cook).get().delete()
+
+        response = client.get(self.chiefs_url(self.stove))
+        self.assertEqual(response.status_code, 403)
+
+    def test_cook_promotion_invalidates_membership(self):
+        client = self.client_for(self.cook)
+        self.assertEqual(client.get(self.cooks_url(self.stove)).status_code,
+                         403)
+
+        cook = Cook.objects.get(user=self.cook)
+        cook.is_chief = True
+        cook.save()
+
+        self.assertEqual(client.get(self.cooks_url(self.stove)).status_code,
+                         200)
+
+    def test_stove_deletion_invalidates_membership(self):
+        client = self.client_for(self.chief)
+        client.get(self.cooks_url(self.free_stove))
+        Cook.objects.create(user=self.chief, stove=self.free_stove,
+                            is_chief=True)
+        self.assertEqual(
+            client.get(self.cooks_url(self.free_stove)).status_code, 200
+        )
+
+        url = self.cooks_url(self.free_stove)
+        self.free_stove.delete()
+
+        self.assertEqual(client.get(url).status_code, 403)
+
+    def test_stats_are_admin_only(self):
+        admin = self.create_user('admin@example.com')
+        admin.is_staff = True
+        admin.save()
+
+        response = self.client_for(self.chief).get(
+            '/api/stoves/membership-cache'
+        )
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client_for(admin).get('/api/stoves/membership-cache')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_rate', response.data)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite')
+class StoveIndexesTest(StoveTestCase):
+
+    def test_cook_membership_lookup_uses_unique_index(self):
+        plan = query_plan(Cook.objects.filter(stove=self.stove,
+                                              user=self.cook))
+
+        self.assertIn('USING INDEX stoves_cook_stove_id_user_id', plan)
+
+    def test_chief_lookup_uses_index(self):
+        plan = query_plan(Cook.objects.filter(stove=self.stove,
+                                              is_chief=True))
+
+        self.assertIn('USING INDEX cook_stove_chief_idx', plan)
+
+    def test_serial_id_lookup_uses_index(self):
+        plan = query_plan(Stove.objects.filter(serial_id='serial'))
+
+        self.assertIn('USING INDEX', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_duplicate_cook_is_rejected(self):
+        with self.assertRaises(IntegrityError):
+            Cook.objects.create(user=self.cook, stove=self.stove)
+
+    def test_duplicate_serial_id_is_rejected(self):
+        with self.assertRaises(IntegrityError):
+            Stove.objects.create(serial_id='serial')
+
+
+class StoveEventsTest(StoveFixture, TransactionTestCase):
+    """ Events are published on commit, so the test data is committed """
+
+    def request(self, user=None, stove=None, method='GET', path=None):
+        headers = []
+        if user is not None:
+            token, _ = UserToken.objects.get_or_create(user=user)
+            headers.append((b'authorization', f'Token {token.key}'.encode()))
+
+        return {
+            'type': 'http',
+            'method': method,
+            'path': path or f'/api/stoves/{(stove or self.stove).id}/events',
+            'headers': headers,
+        }
+
+    def run_connection(self, scope, client):
+        """
+        Serves the request like an ASGI server and runs client(sent)
+        against it, the connection is closed once the client returns
+        """
+        async def connection():
+            sent = asyncio.Queue()
+            disconnected = asyncio.Event()
+            messages = [{'type': 'http.request', 'body': b''}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def next_message():
+                return await asyncio.wait_for(sent.get(), 5)
+
+            served = asyncio.ensure_future(
+                StoveEventsApp()(scope, receive, sent.put)
+            )
+            try:
+                await client(next_message)
+            finally:
+                disconnected.set()
+                await asyncio.wait_for(served, 5)
+
+        asyncio.run(connection())
+
+    def assertRejected(self, scope, status):
+        async def client(next_message):
+            start = await next_message()
+            self.assertEqual(start['status'], status)
+
+        self.run_connection(scope, client)
+
+    async def next_event(self, next_message):
+        body = (await next_message())['body'].decode()
+        event, data = body.strip().split('\n')
+
+        return event[len('event: '):], json.loads(data[len('data: '):])
+
+    def test_membership_changes_are_pushed(self):
+        async def client(next_message):
+            start = await next_message()
+            self.assertEqual(start['status'], 200)
+            self.assertIn((b'content-type', b'text/event-stream'),
+                          start['headers'])
+            await next_message()
+
+            Cook.objects.create(user=self.stranger, stove=self.stove)
+            self.assertEqual(await self.next_event(next_message),
+                             ('cook_added', {'user_id': self.stranger.id}))
+
+            Cook.objects.filter(user=self.stranger).delete()
+            self.assertEqual(await self.next_event(next_message),
+                             ('cook_removed', {'user_id': self.stranger.id}))
+
+            # other stoves are not pushed to this connection
+            Cook.objects.create(user=self.stranger, stove=self.free_stove,
+                                is_chief=True)
+            Cook.objects.filter(user=self.cook).delete()
+            self.assertEqual(await self.next_event(next_message),
+                             ('cook_removed', {'user_id': self.cook.id}))
+
+        self.run_connection(self.request(self.chief), client)
+
+        self.assertEqual(hub.connections(), 0)
+
+    def test_dish_changes_of_cooks_are_pushed(self):
+        async def client(next_message):
+            await next_message()
+            await next_message()
+
+            with transaction.atomic():
+                create_dishes(self.cook, [{'name': 'dish', 'timings': []}])
+
+            self.assertEqual(await self.next_event(next_message),
+                             ('dishes_changed', {'user_ids': [self.cook.id]}))
+
+        self.run_connection(self.request(self.chief), client)
+
+    def test_idle_connection_is_kept_alive(self):
+        async def client(next_message):
+            await next_message()
+            await next_message()
+
+            self.assertEqual((await next_message())['body'],
+                             b': keepalive\n\n')
+
+        with self.settings(STOVE_EVENTS_KEEPALIVE=0.01):
+            self.run_connection(self.request(self.cook), client)
+
+    async def end_of_stream(self, next_message):
+        message = await next_message()
+        while message.get('more_body'):
+            message = await next_message()
+
+        return message
+
+    def test_removed_cook_is_disconnected(self):
+        async def client(next_message):
+            await next_message()
+            await next_message()
+
+            Cook.objects.filter(user=self.cook).delete()
+            self.assertEqual(await self.next_event(next_message),
+                             ('cook_removed', {'user_id': self.cook.id}))
+
+            self.assertEqual(await next_message(),
+                             {'type': 'http.response.body', 'body': b''})
+
+        self.run_connection(self.request(self.cook), client)
+
+    def test_revoked_token_is_disconnected(self):
+        async def client(next_message):
+            await next_message()
+            await next_message()
+
+            revoke_tokens(self.cook)
+            self.assertEqual(await self.end_of_stream(next_message),
+                             {'type': 'http.response.body', 'body': b''})
+
+        with self.settings(STOVE_EVENTS_KEEPALIVE=0.01):
+            self.run_connection(self.request(self.cook), client)
+
+    def test_only_cooks_are_connected(self):
+        self.assertRejected(self.request(), 401)
+        self.assertRejected(self.request(self.stranger), 403)
+        self.assertRejected(self.request(self.cook, self.free_stove), 403)
+        self.assertRejected(self.request(self.cook, method='POST'), 405)
+        self.assertRejected(self.request(self.cook, path='/api/stoves/0/'
+                                                        'events'), 404)
+        self.assertRejected(self.request(self.cook, path='/api/dishes/'),
+                            404)
+
+
+class AsgiApplicationTest(SimpleTestCase):
+
+    def serve(self, scope, chunks=(b'',)):
+        messages = [{'type': 'http.request', 'body': chunk,
+                     'more_body': index < len(chunks) - 1}
+                    for index, chunk in enumerate(chunks)]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(application(dict({
+            'type': 'http', 'http_version': '1.1', 'query_string': b'',
+            'headers': [],
+        }, **scope), receive, send))
+
+        start, *body = sent
+        self.assertFalse(body[-1].get('more_body'))
+
+        return start, b''.join(message.get('body', b'') for message in body)
+
+    def test_views_are_served_by_django(self):
+        start, body = self.serve({'method': 'GET', 'path': '/api/dishes/'})
+
+        self.assertEqual(start['status'], 401)
+        self.assertIn((b'content-type', b'application/json'),
+                      start['headers'])
+        self.assertIn(b'credentials were not provided', body)
+
+    def test_chunked_request_body_is_passed(self):
+        start, body = self.serve(
+            {'method': 'POST', 'path': '/api/users/login',
+             'headers': [(b'content-type', b'application/json')]},
+            [b'{"email": "not', b' an email", ', b'"password": "x"}'],
+        )
+
+        self.assertEqual(start['status'], 400)
+        self.assertEqual(json.loads(body.decode()),
+                         {'email': ['Enter a valid email address.']})
+
+    def test_request_is_finished(self):
+        finished = []
+
+        def receiver(**kwargs):
+            finished.append(True)
+
+        request_finished.connect(receiver)
+        self.addCleanup(request_finished.disconnect, receiver)
+
+        self.serve({'method': 'GET', 'path': '/api/dishes/'})
+
+        self.assertEqual(finished, [True])
+
+
+class TelemetryTest(StoveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.cook)
+        self.run = CookingRun.objects.create(stove=self.stove)
+
+    def samples_url(self, run):
+        return f'/api/stoves/{run.stove_id}/runs/{run.id}/samples'
+
+    @staticmethod
+    def samples(count, start=1500000000000):
+        return [[start + 100 * index, index % 101, 20 + index / 4]
+                for index in range(count)]
+
+    def test_pack_round_trip(self):
+        samples = [Sample(*sample) for sample in self.samples(10)]
+
+        self.assertEqual(unpack_samples(samples[0].timestamp,
+                                        pack_samples(samples)), samples)
+
+        with self.assertRaises(ValueError):
+            unpack_samples(0, b'STC')
+
+    def test_chunks_fit_offsets(self):
+        samples = [Sample(0, 1, 1), Sample(MAX_OFFSET, 1, 1),
+                   Sample(MAX_OFFSET + 1, 1, 1)]
+
+        self.assertEqual([len(chunk) for chunk in iter_chunks(samples, 10)],
+                         [2, 1])
+
+    def test_run_is_started(self):
+        response = self.client.post(f'/api/stoves/{self.stove.id}/runs')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(CookingRun.objects.filter(
+            id=response.data['id'], stove=self.stove
+        ).exists())
+
+    def test_run_timing_is_validated(self):
+        dish, = create_dishes(self.cook, [{'name': 'soup', 'timings': [
+            {'name': 'boil', 'atomic_timings': [{'seconds': 10,
+                                                 'power': 50}]},
+        ]}])
+        other, = create_dishes(self.chief, [{'name': 'stew', 'timings': [
+            {'name': 'simmer', 'atomic_timings': [{'seconds': 20,
+                                                   'power': 30}]},
+        ]}])
+        url = f'/api/stoves/{self.stove.id}/runs'
+
+        response = self.client.post(url, {'timing_id': 'boil'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(url, {'timing_id': other.timings.get().id})
+        self.assertEqual(response.status_code, 404)
+
+        timing = dish.timings.get()
+        response = self.client.post(url, {'timing_id': timing.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(CookingRun.objects.get(pk=response.data['id'])
+                         .timing_id, timing.id)
+
+    def test_samples_are_written_in_packed_chunks(self):
+        samples = self.samples(2500)
+
+        with self.settings(TELEMETRY_CHUNK_SIZE=1000):
+            # membership + savepoint + run update + chunks insert + release
+            with self.assertNumQueries(5):
+                response = self.client.post(self.samples_url(self.run),
+                                            {'samples': samples},
+                                            format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            list(TelemetryChunk.objects.order_by('first_timestamp')
+                 .values_list('samples_count', flat=True)),
+            [1000, 1000, 500]
+        )
+        self.run.refresh_from_db()
+        self.assertEqual(self.run.samples_count, 2500)
+
+        response = self.client.get(self.samples_url(self.run))
+        self.assertEqual(response.data['samples'], samples)
+
+    def test_batches_are_merged_by_timestamp(self):
+        early, late = self.samples(4)[::2], self.samples(4)[1::2]
+
+        self.client.post(self.samples_url(self.run), {'samples': late},
+                         format='json')
+        self.client.post(self.samples_url(self.run), {'samples': early},
+                         format='json')
+
+        response = self.client.get(self.samples_url(self.run))
+        self.assertEqual(response.data['samples'], self.samples(4))
+
+    def test_invalid_samples_are_rejected(self):
+        for samples in ([], [[1, 2]], [[1, 101, 20]], [[-1, 50, 20]],
+                        [[1, 50, 'hot']], [[1, True, 20]], [[1, 50, 1e39]]):
+            response = self.client.post(self.samples_url(self.run),
+                                        {'samples': samples}, format='json')
+
+            self.assertEqual(response.status_code, 400, samples)
+
+        self.assertFalse(TelemetryChunk.objects.exists())
+
+    def test_timestamps_fit_the_database(self):
+        response = self.client.post(self.samples_url(self.run),
+                                    {'samples': [[MAX_TIMESTAMP + 1, 50, 20]]},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(self.samples_url(self.run),
+                                    {'samples': [[MAX_TIMESTAMP, 50, 20]]},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get(self.samples_url(self.run))
+        self.assertEqual(response.data['samples'], [[MAX_TIMESTAMP, 50, 20]])
+
+    def test_runs_of_other_stoves_are_not_found(self):
+        other_run = CookingRun.objects.create(stove=self.free_stove)
+        url = (f'/api/stoves/{self.stove.id}/runs/{other_run.id}/samples')
+
+        response = self.client.post(url, {'samples': self.samples(1)},
+                                    format='json')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(TelemetryChunk.objects.exists())
+
+    def test_only_cooks_send_samples(self):
+        client = self.client_for(self.stranger)
+
+        response = client.post(self.samples_url(self.run),
+                               {'samples': self.samples(1)}, format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+
+class StoveDishesTest(StoveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.chief)
+
+        self.dish, = create_dishes(self.chief, [{
+            'name': 'soup',
+            'timings': [{'name': 'boil',
+                         'atomic_timings': [{'seconds': 10, 'power': 50}]}],
+        }])
+        self.url = f'/api/stoves/{self.stove.id}/dishes'
+
+    def test_dish_is_forked_for_every_cook(self):
+        response = self.client.post(self.url, {'dish_id': self.dish.id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['users'], [self.cook.id])
+        self.assertEqual(response.data['conflicts'], [])
+        fork = Dish.objects.get(pk=response.data['forks'][0]['dish_id'])
+        self.assertEqual(list(fork.users.all()), [self.cook])
+        self.assertEqual(fork.forked_from, self.dish)
+        self.assertEqual(list(self.dish.users.all()), [self.chief])
+
+        response = self.client_for(self.cook).get('/api/dishes/')
+        self.assertEqual([dish['name'] for dish in response.data],
+                         [fork.name])
+        self.assertEqual(Timing.objects.count(), 1)
+
+        # sharing again forks nothing new, even after a rename
+        fork.name = 'my soup'
+        fork.save()
+        response = self.client.post(self.url, {'dish_id': self.dish.id})
+        self.assertEqual(response.data['forks'], [])
+        self.assertEqual(Dish.objects.count(), 2)
+
+    def test_queries_do_not_grow_with_cooks(self):
+        def share(dish):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, {'dish_id': dish.id})
+
+            self.assertEqual(response.status_code, 200)
+
+            return len(response.data['forks']), len(queries)
+
+        one_cook = share(self.dish)
+
+        for index in range(3):
+            Cook.objects.create(stove=self.stove, user=self.create_user(
+                f'cook{index}@example.com'
+            ))
+        dish, = create_dishes(self.chief, [{'name': 'stew', 'timings': [
+            {'name': 'boil', 'atomic_timings': [{'seconds': 10,
+                                                 'power': 50}]},
+        ]}])
+
+        self.assertEqual(share(dish), (4, one_cook[1]))
+
+    def test_taken_fork_names_are_conflicts(self):
+        create_dishes(self.cook, [{
+            'name': shared_dish_name(self.dish, self.cook.id),
+        }])
+
+        response = self.client.post(self.url, {'dish_id': self.dish.id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['forks'], [])
+        self.assertEqual(response.data['conflicts'], [self.cook.id])
+        self.assertFalse(self.dish.forks.exists())
+
+    def test_changes_of_a_fork_are_not_shared(self):
+        response = self.client.post(self.url, {'dish_id': self.dish.id})
+        fork_id = response.data['forks'][0]['dish_id']
+        timing = self.dish.timings.get()
+
+        response = self.client_for(self.cook).put(
+            f'/api/dishes/{fork_id}/timings/{timing.id}',
+            {'name': 'boil', 'atomic_timings': [{'seconds': 20,
+                                                 'power': 90}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(list(self.dish.timings.all()), [timing])
+        self.assertEqual(
+            list(timing.atomic_timings.values_list('seconds', 'power')),
+            [(10, 50)]
+        )
+
+    def test_only_own_dishes_are_shared(self):
+        dish, = create_dishes(self.cook, [{'name': 'stew'}])
+
+        response = self.client.post(self.url, {'dish_id': dish.id})
+        self.assertEqual(response.status_code, 404)
+
+    def test_only_chiefs_share(self):
+        dish, = create_dishes(self.cook, [{'name': 'stew'}])
+
+        response = self.client_for(self.cook).post(
+            self.url, {'dish_id': dish.id}
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Dish.objects.count(), 2)
+
+        response = self.client_for(self.stranger).post(
+            self.url, {'dish_id': self.dish.id}
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class BulkCooksTest(StoveTestCase):
+    url = '/api/stoves/cooks'
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.chief)
+
+        self.other_stove = Stove.objects.create(serial_id='other')
+        Cook.objects.create(user=self.chief, stove=self.other_stove,
+                            is_chief=True)
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+
+        return {(result['stove_id'], result['user_id']): result['status']
+                for result in response.data['results']}
+
+    def test_cooks_are_added_to_many_stoves(self):
+        stove_ids = [self.stove.id, self.other_stove.id, self.free_stove.id]
+        user_ids = [self.stranger.id, self.cook.id, 0]
+
+        response = self.client.post(self.url, {'stove_ids': stove_ids,
+                                               'user_ids': user_ids},
+                                    format='json')
+
+        statuses = self.statuses(response)
+        self.assertEqual(len(response.data['results']), 9)
+        self.assertEqual(statuses[self.stove.id, self.stranger.id], 'added')
+        self.assertEqual(statuses[self.stove.id, self.cook.id],
+                         'already_cook')
+        self.assertEqual(statuses[self.other_stove.id, self.cook.id],
+                         'added')
+        self.assertEqual(statuses[self.stove.id, 0], 'user_not_found')
+        self.assertEqual(statuses[self.free_stove.id, self.stranger.id],
+                         'not_chief')
+
+        self.assertEqual(
+            set(Cook.objects.filter(user=self.stranger)
+                .values_list('stove_id', flat=True)),
+            {self.stove.id, self.other_stove.id}
+        )
+
+    def test_query_count_does_not_depend_on_size(self):
+        users = [self.create_user(f'cook-{index}@example.com')
+                 for index in range(20)]
+        stove_ids = [self.stove.id, self.other_stove.id]
+
+        # users + stoves + savepoint + existing cooks + insert + release
+        with self.assertNumQueries(6):
+            response = self.client.post(self.url, {
+                'stove_ids': stove_ids,
+                'user_ids': [user.id for user in users],
+            }, format='json')
+
+        self.assertEqual(set(self.statuses(response).values()), {'added'})
+        self.assertEqual(Cook.objects.count(), 3 + 40)
+
+    def test_added_cooks_see_the_stove(self):
+        stranger = self.client_for(self.stranger)
+        chiefs_url = self.chiefs_url(self.stove)
+        self.assertEqual(stranger.get(chiefs_url).status_code, 403)
+
+        self.client.post(self.url, {'stove_ids': [self.stove.id],
+                                    'user_ids': [self.stranger.id]},
+                         format='json')
+
+        self.assertEqual(stranger.get(chiefs_url).status_code, 200)
+
+    def test_cooks_are_removed(self):
+        response = self.client.delete(self.url, {
+            'stove_ids': [self.stove.id, self.free_stove.id],
+            'user_ids': [self.cook.id, self.chief.id, self.stranger.id],
+        }, format='json')
+
+        statuses = self.statuses(response)
+        self.assertEqual(statuses[self.stove.id, self.cook.id], 'removed')
+        self.assertEqual(statuses[self.stove.id, self.chief.id], 'chief')
+        self.assertEqual(statuses[self.stove.id, self.stranger.id],
+                         'not_cook')
+        self.assertEqual(statuses[self.free_stove.id, self.cook.id],
+                         'not_chief')
+
+        self.assertEqual(list(self.stove.cooks.values_list('user_id',
+                                                           flat=True)),
+                         [self.chief.id])
+
+    def test_request_size_is_limited(self):
+        with self.settings(STOVE_COOKS_MAX_BULK_SIZE=3):
+            response = self.client.post(self.url, {
+                'stove_ids': [self.stove.id, self.other_stove.id],
+                'user_ids': [self.cook.id, self.stranger.id],
+            }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(self.url, {'stove_ids': [],
+                                               'user_ids': [1]},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
@@ -6,6 +6,11 @@ urlpatterns = [
     path('stoves/<int:stove_id>/', include([
         path('cooks', views.CRUDCooksView.as_view()),
         path('chiefs', views.CRUDChiefsView.as_view()),
+        path('dishes', views.StoveDishesView.as_view()),
+        path('runs', views.CookingRunsView.as_view()),
+        path('runs/<int:run_id>/samples', views.RunSamplesView.as_view()),
     ])),
+    path('stoves/cooks', views.BulkCooksView.as_view()),
+    path('stoves/membership-cache', views.MembershipCacheStats.as_view()),
 ]
 
@@ -1,21 +1,33 @@
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+import heapq
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from dishes.models import Dish
+from dishes.utils import share_dish
+from users.authentication import ExpiringTokenAuthentication
 from users.models import User
-from .permissions import ChiefsOnly, CooksOnly
-from .models import Cook, Stove
-from .serializers import CookSerializer
+from .cooks import add_cooks, remove_cooks
+from .membership import membership_cache
+from .permissions import ChiefsOnly, CooksOnly, StoveCooksOnly
+from .models import Cook, CookingRun, TelemetryChunk
+from .serializers import (BulkCooksSerializer, CookingRunSerializer,
+                          CookSerializer)
+from .telemetry import (iter_chunks, pack_samples, parse_samples,
+                        unpack_samples)
 
 
 class CRUDCooksView(APIView):
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (IsAuthenticated, ChiefsOnly)
 
     def get(self, request, stove_id):
-        stove_cooks = Stove.objects.get(id=stove_id).cooks
+        stove_cooks = request.stove.cooks.select_related('user')
 
         serializer = CookSerializer(stove_cooks, many=True)
 
@@ -25,43 +37,214 @@ class CRUDCooksView(APIView):
         new_cook_id = request.data.get('new_cook_id', 0)
 
         user = User.objects.filter(id=new_cook_id).first()
-        stove = Stove.objects.filter(id=stove_id).first()
+        stove = request.stove
 
         if not user:
             return Response(f'User was not found',
                             status=404)
 
-        if Cook.objects.filter(user=user, stove=stove).first():
+        try:
+            with transaction.atomic():
+                Cook.objects.create(user=user, stove=stove, is_chief=False)
+        except IntegrityError:
             return Response(
                 f'User {user.id} is already a cook of a'
                 f' stove {stove.id}', status=403
             )
 
-        Cook.objects.create(user=user, stove=stove, is_chief=False)
-
         return Response(status=201)
 
 
+class BulkCooksView(APIView):
+
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        """
+        Adds every user to cooks of every stove the caller is a chief of
+        :param request: HttpRequest with {stove_ids, user_ids}
+        :return: Response({results}, status), see stoves.cooks
+        """
+        serializer = BulkCooksSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = add_cooks(request.user, **serializer.validated_data)
+
+        return Response({'results': results}, status=200)
+
+    def delete(self, request):
+        """
+        Removes every user from cooks of every stove the caller is a chief
+        of, chiefs stay
+        :param request: HttpRequest with {stove_ids, user_ids}
+        :return: Response({results}, status), see stoves.cooks
+        """
+        serializer = BulkCooksSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = remove_cooks(request.user, **serializer.validated_data)
+
+        return Response({'results': results}, status=200)
+
+
 class CRUDChiefsView(APIView):
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (IsAuthenticated, CooksOnly)
 
     def get(self, request, stove_id):
-        stove = Stove.objects.filter(id=stove_id).first()
-
-        chief = stove.cooks.filter(is_chief=True).first()
+        chief = (request.stove.cooks.select_related('user')
+                 .filter(is_chief=True).first())
 
         serializer = CookSerializer(chief)
 
         return Response(data=serializer.data, status=200)
 
     def post(self, request, stove_id):
-        stove = Stove.objects.filter(id=stove_id).first()
+        Cook.objects.create(user=request.user, stove=request.stove,
+                            is_chief=True)
 
-        cook = Cook.objects.create(user=request.user, stove=stove,
-                                   is_chief=True)
+        return Response(status=201)
 
-        stove.cooks.add(cook)
 
-        return Response(status=201)
+class StoveDishesView(APIView):
+
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated, ChiefsOnly)
+
+    def post(self, request, stove_id):
+        """
+        Shares a dish of the chief with every other cook of the stove. Each
+        cook gets a fork of the dish, its timings are linked, not copied,
+        until a cook changes them. Cooks already given the dish get nothing
+        new, cooks whose fork name is taken are reported in conflicts.
+        :param request: HttpRequest
+        :param stove_id: int
+        :return: Response({dish_id, users, forks, conflicts}, status)
+        """
+        dish_id = request.data.get('dish_id', 0)
+
+        dish = Dish.objects.owned_by(request.user).filter(pk=dish_id).first()
+        if not dish:
+            return Response(f'Dish {dish_id} was not found', status=404)
+
+        user_ids = list(request.stove.cooks.exclude(user=request.user)
+                        .values_list('user_id', flat=True))
+
+        with transaction.atomic():
+            forks, conflicts = share_dish(dish, user_ids)
+
+        return Response({
+            'dish_id': dish.id,
+            'users': sorted(user_ids),
+            'forks': [{'user_id': user_id, 'dish_id': fork.id}
+                      for user_id, fork in forks.items()],
+            'conflicts': conflicts,
+        }, status=200)
+
+
+class CookingRunsView(APIView):
+
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated, StoveCooksOnly)
+
+    def post(self, request, stove_id):
+        """
+        Starts a cooking run of the stove, optionally of a timing of the
+        caller's dishes
+        :param request: HttpRequest
+        :param stove_id: int
+        :return: Response({id}, status)
+        """
+        serializer = CookingRunSerializer(data=request.data,
+                                          context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        run = CookingRun.objects.create(
+            stove=request.stove,
+            timing_id=serializer.validated_data.get('timing_id'),
+        )
+
+        return Response({'id': run.id}, status=201)
+
+
+class RunSamplesView(APIView):
+
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated, StoveCooksOnly)
+
+    def get(self, request, stove_id, run_id):
+        """
+        Returns all samples of a run ordered by timestamp
+        :param request: HttpRequest
+        :param stove_id: int
+        :param run_id: int
+        :return: Response({id, timing_id, started, samples}, status)
+        """
+        run = CookingRun.objects.filter(pk=run_id, stove_id=stove_id).first()
+        if not run:
+            return Response(f'Run {run_id} was not found', status=404)
+
+        chunks = run.chunks.order_by('first_timestamp') \
+            .values_list('first_timestamp', 'samples')
+
+        samples = heapq.merge(*(unpack_samples(first_timestamp, packed)
+                                for first_timestamp, packed in chunks))
+
+        return Response({
+            'id': run.id,
+            'timing_id': run.timing_id,
+            'started': run.started,
+            'samples': [list(sample) for sample in samples],
+        }, status=200)
+
+    def post(self, request, stove_id, run_id):
+        """
+        Stores a batch of [timestamp ms, power, temperature] samples
+        packed in chunks of TELEMETRY_CHUNK_SIZE samples, which are
+        written with a single insert
+        :param request: HttpRequest
+        :param stove_id: int
+        :param run_id: int
+        :return: Response({samples}, status)
+        """
+        try:
+            samples = parse_samples(request.data.get('samples'),
+                                    settings.TELEMETRY_MAX_BATCH_SIZE)
+        except ValueError as error:
+            return Response(str(error), status=400)
+
+        chunks = [
+            TelemetryChunk(run_id=run_id,
+                           first_timestamp=chunk[0].timestamp,
+                           last_timestamp=chunk[-1].timestamp,
+                           samples_count=len(chunk),
+                           samples=pack_samples(chunk))
+            for chunk in iter_chunks(samples, settings.TELEMETRY_CHUNK_SIZE)
+        ]
+
+        with transaction.atomic():
+            found = CookingRun.objects.filter(
+                pk=run_id, stove_id=stove_id
+            ).update(samples_count=F('samples_count') + len(samples))
+            if not found:
+                return Response(f'Run {run_id} was not found', status=404)
+
+            TelemetryChunk.objects.bulk_create(chunks)
+
+        return Response({'samples': len(samples)}, status=201)
+
+
+class MembershipCacheStats(APIView):
+
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        """
+        Returns hit and miss counters of this process' membership cache
+        :param request: HttpRequest
+        :return: Response({hits, misses, hit_rate}, status)
+        """
+        return Response(data=membership_cache.stats(), status=200)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
 
     name = 'users'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,164 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .models import UserToken
+
+
+def is_token_active(token):
+    """
+    Checks whether the token lifetime is not over yet
+    :param token: UserToken or None
+    :return: bool
+    """
+    return token is not None and timezone.now() < token.expires_at
+
+
+def token_cache_key(key):
+    # versioned since cached tokens are UserToken instances
+    return f'user-token:2:{key}'
+
+
+def invalidate_token(key):
+    """
+    Removes token from the authentication cache, so it can not be used
+    anymore even before the cache entry expires. Other processes see it
+    only if USER_TOKEN_CACHE is shared, see users.checks.
+    :param key: str - token key
+    :return: None
+    """
+    invalidate_tokens([key])
+
+
+def invalidate_tokens(keys):
+    """
+    Removes tokens from the authentication cache, see invalidate_token
+    :param keys: list of str - token keys
+    :return: None
+    """
+    caches[settings.USER_TOKEN_CACHE].delete_many(
+        [token_cache_key(key) for key in keys]
+    )
+
+
+def revoke_tokens(user, device_id=None):
+    """
+    Deletes tokens of a user and drops them from the authentication cache
+    :param user: User
+    :param device_id: str - revokes only the tokens of this device,
+                      all of them if None
+    :return: int - number of revoked tokens
+    """
+    tokens = UserToken.objects.filter(user=user)
+    if device_id is not None:
+        tokens = tokens.filter(device_id=device_id)
+
+    keys = list(tokens.values_list('key', flat=True))
+    if not keys:
+        return 0
+
+    deleted, _ = UserToken.objects.filter(key__in=keys).delete()
+    invalidate_tokens(keys)
+
+    return deleted
+
+
+def touch_token(token, now):
+    """
+    Records that the token has been used. Writes are coalesced: the row
+    is updated only when last_used is older than USER_TOKEN_TOUCH_INTERVAL
+    and the condition is a part of the update, so concurrent requests of
+    a device write it once per interval.
+    :param token: UserToken
+    :param now: datetime
+    :return: bool - whether last_used of the token has been changed,
+             a concurrent request may have written the row first
+    """
+    interval = settings.USER_TOKEN_TOUCH_INTERVAL
+    if token.last_used is not None and now - token.last_used < interval:
+        return False
+
+    UserToken.objects.filter(
+        Q(last_used__isnull=True) | Q(last_used__lte=now - interval),
+        key=token.key,
+    ).update(last_used=now)
+    token.last_used = now
+
+    return True
+
+
+def purge_expired_tokens(batch_size):
+    """
+    Deletes a batch of expired tokens. The batch is found through the
+    expires_at index and deleted by primary keys in a statement of its
+    own, so no lock is held for longer than a batch.
+    :param batch_size: int
+    :return: int - number of deleted tokens
+    """
+    keys = list(UserToken.objects.expired().order_by('expires_at')
+                .values_list('key', flat=True)[:batch_size])
+    if not keys:
+        return 0
+
+    deleted, _ = UserToken.objects.filter(key__in=keys).delete()
+
+    return deleted
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication which rejects expired tokens and keeps resolved
+    tokens in a cache, so an authenticated request needs no query.
+    Cache entries never outlive the token itself and are dropped when
+    the user is saved, see users.signals. Usage of tokens is
+    recorded in last_used at most once per USER_TOKEN_TOUCH_INTERVAL.
+    """
+    model = UserToken
+
+    def authenticate_credentials(self, key):
+        cache = caches[settings.USER_TOKEN_CACHE]
+        cache_key = token_cache_key(key)
+
+        token = cache.get(cache_key)
+        cached = token is not None
+
+        if token is None:
+            token = self.get_token(key)
+
+        now = timezone.now()
+        if not is_token_active(token):
+            cache.delete(cache_key)
+            raise exceptions.AuthenticationFailed('Token has expired.')
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        # the cached token keeps its last_used, so that the next touch
+        # of the device is skipped without a query
+        if touch_token(token, now) or not cached:
+            expires_in = (token.expires_at - now).total_seconds()
+            timeout = min(expires_in, settings.USER_TOKEN_CACHE_TIMEOUT)
+
+            if timeout > 0:
+                cache.set(cache_key, token, timeout)
+
+        return token.user, token
+
+    @staticmethod
+    def get_token(key):
+        """
+        Resolves an active token with one query on the primary key,
+        expired tokens are not found
+        :param key: str
+        :return: UserToken
+        :raise AuthenticationFailed: if there is no active token
+        """
+        try:
+            return UserToken.objects.active().select_related('user').get(
+                key=key
+            )
+        except UserToken.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
@@ -1,6 +1,7 @@
 from rest_framework import exceptions
 
 from .models import User
+from .passwords import password_checker
 
 
 class UserAuthentication:
@@ -19,7 +20,8 @@ class UserAuthentication:
         """
         user = User.objects.filter(email=email).first()
 
-        if not user or not user.check_password(password):
+        # hashed in a bounded pool, see users.passwords
+        if not password_checker.check_user(user, password):
             return None
 
         return user
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_token_cache(app_configs, **kwargs):
+    """
+    Logged out and revoked tokens are dropped from the token cache, so
+    every process authenticating requests has to share it, or a process
+    keeps accepting them until its cache entries expire
+    """
+    if not isinstance(caches[settings.USER_TOKEN_CACHE], LocMemCache):
+        return []
+
+    return [Warning(
+        f'USER_TOKEN_CACHE {settings.USER_TOKEN_CACHE!r} is local to the '
+        f'process.',
+        hint='Set TOKEN_CACHE_URL to a cache shared by all the processes, '
+             'e.g. Redis or memcached, unless a single process serves '
+             'the API.',
+        id='users.W001',
+    )]
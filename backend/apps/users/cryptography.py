@@ -1,25 +1,151 @@
+""" Email codec module for account activation links
+
+Version 1 tokens are hex strings of space padded DES-ECB blocks, they are
+only decoded for links sent before version 2.
+Version 2 tokens are 'v2.' followed by urlsafe base64 of an AES-GCM nonce,
+ciphertext and tag, so they can not be forged or tampered with.
+"""
+import base64
+import hashlib
+from functools import lru_cache
+
+from Crypto.Cipher import AES, DES
+from Crypto.Random import get_random_bytes
 from django.conf import settings
-from Crypto.Cipher import DES
 
+V2_PREFIX = 'v2.'
+GCM_NONCE_SIZE = 12
+GCM_TAG_SIZE = 16
+
+
+@lru_cache(maxsize=None)
+def des_cipher(key):
+    """ ECB mode keeps no state between calls, so one cipher is reused """
+    return DES.new(key.encode(), DES.MODE_ECB)
+
+
+@lru_cache(maxsize=None)
+def aes_key(secret_key):
+    return hashlib.sha256(f'users.cryptography:{secret_key}'.encode()) \
+        .digest()
+
+
+def encode(encoding_text, version=None):
+    """
+    Encrypts a text into an URL safe token
+    :param encoding_text: str
+    :param version: int - token version, ENCODING_VERSION by default
+    :return: str
+    """
+    return encode_many([encoding_text], version)[0]
+
+
+def decode(decoding_token):
+    """
+    Decrypts a token of any version
+    :param decoding_token: str
+    :return: str
+    :raise ValueError: if the token is malformed or tampered with
+    """
+    return decode_many([decoding_token])[0]
+
+
+def encode_many(encoding_texts, version=None):
+    """
+    Encrypts texts, version 1 tokens are encrypted in a single call
+    :param encoding_texts: list of str
+    :param version: int - token version, ENCODING_VERSION by default
+    :return: list of str
+    """
+    version = version or settings.ENCODING_VERSION
+
+    if version == 1:
+        return _des_encode_many(encoding_texts)
+
+    return [_gcm_encode(text) for text in encoding_texts]
+
+
+def decode_many(decoding_tokens):
+    """
+    Decrypts tokens of any version keeping their order
+    :param decoding_tokens: list of str
+    :return: list of str
+    :raise ValueError: if any token is malformed or tampered with
+    """
+    decoded = [None] * len(decoding_tokens)
+    des_indexes = []
+
+    for index, token in enumerate(decoding_tokens):
+        if token.startswith(V2_PREFIX):
+            decoded[index] = _gcm_decode(token)
+        else:
+            des_indexes.append(index)
+
+    des_decoded = _des_decode_many([decoding_tokens[index]
+                                    for index in des_indexes])
+
+    for index, text in zip(des_indexes, des_decoded):
+        decoded[index] = text
+
+    return decoded
+
+
+def _des_encode_many(texts):
+    padded = []
+    for text in texts:
+        data = text.encode()
+        padded.append(data + b' ' * (-len(data) % DES.block_size))
+
+    encrypted = des_cipher(settings.ENCODING_DES_KEY).encrypt(b''.join(padded))
+
+    tokens, start = [], 0
+    for data in padded:
+        tokens.append(encrypted[start:start + len(data)].hex())
+        start += len(data)
+
+    return tokens
+
+
+def _des_decode_many(tokens):
+    encrypted = [bytes.fromhex(token) for token in tokens]
+    for data in encrypted:
+        if not data or len(data) % DES.block_size:
+            raise ValueError('Invalid token length')
+
+    decrypted = des_cipher(settings.ENCODING_DES_KEY).decrypt(
+        b''.join(encrypted)
+    )
+
+    texts, start = [], 0
+    for data in encrypted:
+        block = decrypted[start:start + len(data)]
+        texts.append(block.rstrip(b' ').decode())
+        start += len(data)
+
+    return texts
+
+
+def _gcm_encode(text):
+    nonce = get_random_bytes(GCM_NONCE_SIZE)
+    cipher = AES.new(aes_key(settings.SECRET_KEY), AES.MODE_GCM, nonce=nonce)
+    ciphertext, tag = cipher.encrypt_and_digest(text.encode())
 
-def encode(encoding_text):
+    token = base64.urlsafe_b64encode(nonce + ciphertext + tag).rstrip(b'=')
 
-    des = DES.new(settings.ENCODING_DES_KEY.encode(), DES.MODE_ECB)
+    return V2_PREFIX + token.decode()
 
-    while (len(encoding_text) % 8) != 0:
-        encoding_text += " "
-    encoded_text = des.encrypt(encoding_text.encode())
-    hex_representation = encoded_text.hex()
 
-    return hex_representation
+def _gcm_decode(token):
+    data = token[len(V2_PREFIX):]
+    data = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
 
+    if len(data) < GCM_NONCE_SIZE + GCM_TAG_SIZE:
+        raise ValueError('Invalid token length')
 
-def decode(decoding_hex):
-    des = DES.new(settings.ENCODING_DES_KEY.encode(), DES.MODE_ECB)
+    nonce = data[:GCM_NONCE_SIZE]
+    ciphertext = data[GCM_NONCE_SIZE:-GCM_TAG_SIZE]
+    tag = data[-GCM_TAG_SIZE:]
 
-    decoding_bytes = bytes.fromhex(decoding_hex)
-    decoded_bytes = des.decrypt(decoding_bytes)
-    decoded_text = decoded_bytes.decode()
-    cleared_text = str(decoded_text).rstrip()
+    cipher = AES.new(aes_key(settings.SECRET_KEY), AES.MODE_GCM, nonce=nonce)
 
-    return cleared_text
+    return cipher.decrypt_and_verify(ciphertext, tag).decode()
@@ -0,0 +1,100 @@
+""" Password hashers with parameters taken from settings
+
+PASSWORD_HASHER picks the hasher of new passwords, see settings.py.
+Parameters are read on every use, so a hash made with other parameters
+than the current ones is reported by must_update and upgraded on the
+next login, see users.passwords.
+"""
+import base64
+import hashlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+
+class ScryptPasswordHasher(hashers.BasePasswordHasher):
+    """
+    scrypt of hashlib (OpenSSL), memory hard like Argon2 and needs no
+    extra package. Costs n, r and p come from PASSWORD_SCRYPT.
+    """
+    algorithm = 'scrypt'
+    dklen = 64
+
+    @staticmethod
+    def params():
+        return settings.PASSWORD_SCRYPT
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        assert password is not None
+        assert salt and '$' not in salt
+
+        params = self.params()
+        n = n or params['n']
+        r = r or params['r']
+        p = p or params['p']
+
+        hash = hashlib.scrypt(
+            password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+            # what OpenSSL needs for the costs and a MiB of slack
+            maxmem=128 * r * (n + p + 2) + 2 ** 20, dklen=self.dklen,
+        )
+        hash = base64.b64encode(hash).decode('ascii').strip()
+
+        return f'{self.algorithm}${n}${r}${p}${salt}${hash}'
+
+    @staticmethod
+    def split(encoded):
+        algorithm, n, r, p, salt, hash = encoded.split('$', 5)
+
+        return algorithm, int(n), int(r), int(p), salt, hash
+
+    def verify(self, password, encoded):
+        algorithm, n, r, p, salt, _ = self.split(encoded)
+        assert algorithm == self.algorithm
+
+        return constant_time_compare(encoded,
+                                     self.encode(password, salt, n, r, p))
+
+    def safe_summary(self, encoded):
+        algorithm, n, r, p, salt, hash = self.split(encoded)
+
+        return OrderedDict([
+            (_('algorithm'), algorithm),
+            (_('n'), n),
+            (_('r'), r),
+            (_('p'), p),
+            (_('salt'), hashers.mask_hash(salt)),
+            (_('hash'), hashers.mask_hash(hash)),
+        ])
+
+    def must_update(self, encoded):
+        _, n, r, p, _, _ = self.split(encoded)
+        params = self.params()
+
+        return (n, r, p) != (params['n'], params['r'], params['p'])
+
+    def harden_runtime(self, password, encoded):
+        # costs are not lowered in place, must_update upgrades them
+        pass
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """
+    Argon2 with costs from PASSWORD_ARGON2 instead of the class defaults,
+    needs the argon2-cffi package
+    """
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2['time_cost']
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2['memory_cost']
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2['parallelism']
@@ -0,0 +1,52 @@
+""" Email transports module"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from sendgrid import SendGridAPIClient, Email
+from sendgrid.helpers.mail import Mail, Content
+
+
+EmailMessage = namedtuple('EmailMessage',
+                          ('from_email', 'to_email', 'subject', 'body'))
+
+
+class SendGridTransport:
+    """ Sends emails through SendGrid API """
+
+    client = None
+
+    def __init__(self):
+        if SendGridTransport.client is None:
+            SendGridTransport.client = SendGridAPIClient(
+                apikey=settings.SENDGRID_API_KEY
+            )
+
+    def send(self, message):
+        """
+        Sends an email
+        :param message: EmailMessage
+        :return: None
+        """
+        mail = Mail(Email(message.from_email), message.subject,
+                    Email(message.to_email),
+                    Content('text/plain', message.body))
+
+        self.client.client.mail.send.post(request_body=mail.get())
+
+
+class LocmemTransport:
+    """ Keeps sent emails in memory, to be used in tests """
+
+    outbox = []
+
+    def send(self, message):
+        self.outbox.append(message)
+
+
+def get_transport():
+    """
+    Returns an instance of the transport set in EMAIL_TRANSPORT setting
+    :return: transport
+    """
+    return import_string(settings.EMAIL_TRANSPORT)()
@@ -0,0 +1,440 @@
+import json
+import time
+import tracemalloc
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.urls import get_resolver
+from rest_framework.test import APIClient
+
+from dishes.models import Dish
+from distributions import milliseconds, percentile
+from dishes.utils import create_dishes, fork_dish
+from stoves.models import Cook, CookingRun, Stove
+from users.cryptography import encode
+from users.models import User, UserToken
+from users.tokens import account_activation_token
+
+PASSWORD = 'secret1!x'
+APPS_URLS = ('api/users/', 'api/dishes/', 'api/stoves/')
+
+# prepare(index) returns keyword arguments of APIClient.generic
+# and the client to send the request with
+Route = namedtuple('Route', ('route', 'method', 'prepare'))
+
+
+def walk_routes(patterns, prefix=''):
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from walk_routes(pattern.url_patterns,
+                                   prefix + str(pattern.pattern))
+        else:
+            yield prefix + str(pattern.pattern)
+
+
+def dish_data(name, timings, atomic_timings):
+    return {
+        'name': name,
+        'description': 'Benchmark dish',
+        'timings': [{
+            'name': f'timing-{timing}',
+            'atomic_timings': [{'seconds': 10 + atomic, 'power': 50}
+                               for atomic in range(atomic_timings)],
+        } for timing in range(timings)],
+    }
+
+
+class Fixture:
+    """ Seeds benchmark data and builds requests for every route """
+
+    def __init__(self, options):
+        self.options = options
+        self.sequence = 0
+
+        self.users = [self.create_user(f'bench-{index}@example.com')
+                      for index in range(options['users'])]
+        self.user = self.users[0]
+        self.admin = self.create_user('bench-admin@example.com',
+                                      is_staff=True)
+
+        for user in self.users:
+            create_dishes(user, [
+                dish_data(f'{user.id}-dish-{index}', options['timings'],
+                          options['atomic_timings'])
+                for index in range(options['dishes'])
+            ])
+        self.dish = Dish.objects.owned_by(self.user).first()
+        self.timing = self.dish.timings.first()
+
+        self.stoves = []
+        for index in range(options['stoves']):
+            stove = Stove.objects.create(serial_id=f'serial-{index}')
+            Cook.objects.create(user=self.user, stove=stove, is_chief=True)
+            Cook.objects.bulk_create([
+                Cook(user=user, stove=stove)
+                for user in self.users[1:options['cooks'] + 1]
+            ])
+            self.stoves.append(stove)
+        self.stove = self.stoves[0]
+
+        self.run = CookingRun.objects.create(stove=self.stove,
+                                             timing=self.timing)
+
+    def create_user(self, email, is_active=True, is_staff=False):
+        return User.objects.create_user(email=email, password=PASSWORD,
+                                        is_active=is_active,
+                                        is_staff=is_staff, fname='Bench')
+
+    def unique(self, prefix):
+        self.sequence += 1
+        return f'{prefix}-{self.sequence}'
+
+    @staticmethod
+    def client_for(user=None, token=None):
+        client = APIClient()
+        if user is not None:
+            token = token or UserToken.objects.get_or_create(
+                user=user, device_id=UserToken.DEFAULT_DEVICE_ID
+            )[0]
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        return client
+
+    def routes(self):
+        user_client = self.client_for(self.user)
+        cook_client = self.client_for(self.users[1])
+        admin_client = self.client_for(self.admin)
+        anonymous = self.client_for()
+
+        def json_body(client, data, **kwargs):
+            return dict(kwargs, client=client, data=json.dumps(data),
+                        content_type='application/json')
+
+        def logout(index):
+            user = self.create_user(self.unique('logout') + '@example.com')
+            return {'client': self.client_for(user)}
+
+        def revoke_tokens(index):
+            user = self.create_user(self.unique('revoke') + '@example.com')
+            for device in range(3):
+                UserToken.objects.create(user=user, device_id=f'd{device}')
+            return {'client': self.client_for(user)}
+
+        def revoke_device(index):
+            kwargs = revoke_tokens(index)
+            return dict(kwargs, path='/api/users/tokens/d0')
+
+        def activate(index):
+            user = self.create_user(self.unique('inactive') + '@example.com',
+                                    is_active=False)
+            token = account_activation_token.make_token(user)
+            return {'client': anonymous,
+                    'path': f'/api/users/activate/{encode(user.email)}/'
+                            f'{token}'}
+
+        def retry_activation(index):
+            user = self.create_user(self.unique('retry') + '@example.com',
+                                    is_active=False)
+            return json_body(anonymous, {'email': user.email})
+
+        def bulk_import(index):
+            body = '\n'.join(
+                json.dumps(dish_data(self.unique('bulk'), 2, 5))
+                for _ in range(10)
+            )
+            return {'client': user_client, 'data': body,
+                    'content_type': 'application/x-ndjson'}
+
+        def add_cook(index):
+            user = self.create_user(self.unique('cook') + '@example.com')
+            return json_body(user_client, {'new_cook_id': user.id})
+
+        def bulk_cooks(index, added):
+            users = [self.create_user(self.unique('bulk-cook') +
+                                      '@example.com') for _ in range(10)]
+            if added:
+                Cook.objects.bulk_create([
+                    Cook(user=user, stove=stove)
+                    for stove in self.stoves for user in users
+                ])
+
+            return json_body(user_client, {
+                'stove_ids': [stove.id for stove in self.stoves],
+                'user_ids': [user.id for user in users],
+            })
+
+        def claim_chief(index):
+            stove = Stove.objects.create(serial_id=self.unique('claim'))
+            return json_body(self.client_for(self.users[-1]),
+                             {'stove_serial_id': stove.serial_id},
+                             path=f'/api/stoves/{stove.id}/chiefs')
+
+        def replace_timing(index):
+            # the timing of a fresh fork is shared, so it is copied
+            fork = fork_dish(self.dish, self.user, self.unique('fork'), '')
+            timing = dish_data('', 1, self.options['atomic_timings'])
+            timing['timings'][0]['name'] = self.unique('timing')
+            return json_body(user_client, timing['timings'][0],
+                             path=f'/api/dishes/{fork.id}/timings/'
+                                  f'{self.timing.id}')
+
+        def samples_batch(index):
+            start = 1500000000000 + index * self.options['samples'] * 100
+            return json_body(user_client, {'samples': [
+                [start + sample * 100, sample % 101, 20 + sample / 100]
+                for sample in range(self.options['samples'])
+            ]}, path=samples)
+
+        dish_timings = f'/api/dishes/{self.dish.id}/timings'
+        program = f'{dish_timings}/{self.timing.id}/program'
+        cooks = f'/api/stoves/{self.stove.id}/cooks'
+        chiefs = f'/api/stoves/{self.stove.id}/chiefs'
+        runs = f'/api/stoves/{self.stove.id}/runs'
+        samples = f'{runs}/{self.run.id}/samples'
+
+        return [
+            Route('api/users/token-validation', 'GET',
+                  lambda index: {'client': user_client}),
+            Route('api/users/login', 'POST',
+                  lambda index: json_body(anonymous, {
+                      'email': self.user.email, 'password': PASSWORD,
+                  })),
+            Route('api/users/logout', 'POST', logout),
+            Route('api/users/tokens', 'GET',
+                  lambda index: {'client': user_client}),
+            Route('api/users/tokens', 'DELETE', revoke_tokens),
+            Route('api/users/tokens/<str:device_id>', 'DELETE',
+                  revoke_device),
+            Route('api/users/register', 'POST',
+                  lambda index: json_body(anonymous, {
+                      'email': self.unique('register') + '@example.com',
+                      'password': PASSWORD, 'fname': 'Bench',
+                  })),
+            Route('api/users/activate/<str:encrypted_email>/'
+                  '<slug:email_token>', 'POST', activate),
+            Route('api/users/activate/retry-activation', 'GET',
+                  retry_activation),
+            Route('api/dishes/', 'GET',
+                  lambda index: {'client': user_client}),
+            Route('api/dishes/', 'POST',
+                  lambda index: json_body(user_client, dish_data(
+                      self.unique('dish'), self.options['timings'],
+                      self.options['atomic_timings'],
+                  ))),
+            Route('api/dishes/bulk', 'POST', bulk_import),
+            Route('api/dishes/cache', 'GET',
+                  lambda index: {'client': admin_client}),
+            Route('api/dishes/search', 'GET',
+                  lambda index: {'client': user_client,
+                                 'path': '/api/dishes/search?q=benchmark'}),
+            Route('api/dishes/statistics', 'GET',
+                  lambda index: {'client': user_client}),
+            Route('api/dishes/statistics/users', 'GET',
+                  lambda index: {'client': admin_client}),
+            Route('api/dishes/<int:dish_id>/fork', 'POST',
+                  lambda index: json_body(user_client,
+                                          {'name': self.unique('fork')},
+                                          path=f'/api/dishes/{self.dish.id}/'
+                                               f'fork')),
+            Route('api/dishes/<int:dish_id>/timings', 'GET',
+                  lambda index: {'client': user_client,
+                                 'path': dish_timings}),
+            Route('api/dishes/<int:dish_id>/timings', 'POST',
+                  lambda index: json_body(
+                      user_client,
+                      dish_data('', 1, self.options['atomic_timings'])
+                      ['timings'][0],
+                      path=dish_timings,
+                  )),
+            Route('api/dishes/<int:dish_id>/timings/<int:timing_id>', 'PUT',
+                  replace_timing),
+            Route('api/dishes/<int:dish_id>/timings/<int:timing_id>/program',
+                  'GET', lambda index: {'client': user_client,
+                                        'path': program}),
+            Route('api/stoves/<int:stove_id>/cooks', 'GET',
+                  lambda index: {'client': user_client, 'path': cooks}),
+            Route('api/stoves/<int:stove_id>/cooks', 'POST',
+                  lambda index: dict(add_cook(index), path=cooks)),
+            Route('api/stoves/<int:stove_id>/chiefs', 'GET',
+                  lambda index: {'client': cook_client, 'path': chiefs}),
+            Route('api/stoves/<int:stove_id>/chiefs', 'POST', claim_chief),
+            Route('api/stoves/<int:stove_id>/dishes', 'POST',
+                  lambda index: json_body(user_client,
+                                          {'dish_id': self.dish.id},
+                                          path=f'/api/stoves/{self.stove.id}/'
+                                               f'dishes')),
+            Route('api/stoves/<int:stove_id>/runs', 'POST',
+                  lambda index: json_body(user_client,
+                                          {'timing_id': self.timing.id},
+                                          path=runs)),
+            Route('api/stoves/<int:stove_id>/runs/<int:run_id>/samples',
+                  'POST', samples_batch),
+            Route('api/stoves/<int:stove_id>/runs/<int:run_id>/samples',
+                  'GET', lambda index: {'client': user_client,
+                                        'path': samples}),
+            Route('api/stoves/cooks', 'POST',
+                  lambda index: bulk_cooks(index, added=False)),
+            Route('api/stoves/cooks', 'DELETE',
+                  lambda index: bulk_cooks(index, added=True)),
+            Route('api/stoves/membership-cache', 'GET',
+                  lambda index: {'client': admin_client}),
+        ]
+
+
+class Command(BaseCommand):
+    help = ('Seeds a test database and measures query counts, latency and '
+            'allocations of every API route')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--dishes', type=int, default=20,
+                            help='Dishes per user')
+        parser.add_argument('--timings', type=int, default=5,
+                            help='Timings per dish')
+        parser.add_argument('--atomic-timings', type=int, default=10,
+                            help='Atomic timings per timing')
+        parser.add_argument('--samples', type=int, default=10000,
+                            help='Telemetry samples per batch')
+        parser.add_argument('--stoves', type=int, default=5)
+        parser.add_argument('--cooks', type=int, default=3,
+                            help='Cooks per stove besides the chief')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--baseline', help='Baseline JSON file')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write results into the baseline file')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Allowed relative latency growth')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('At least 2 users are needed')
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+
+        try:
+            for alias in (settings.USER_TOKEN_CACHE,
+                          settings.STOVE_MEMBERSHIP_CACHE,
+                          settings.DISH_CACHE):
+                caches[alias].clear()
+
+            fixture = Fixture(options)
+            routes = fixture.routes()
+
+            self.check_coverage(routes)
+
+            # throttles stay on the path with limits no run reaches
+            rates = {scope: dict.fromkeys(kinds, '1000000/s')
+                     for scope, kinds in settings.THROTTLE_RATES.items()}
+            with override_settings(THROTTLE_RATES=rates):
+                results = {f'{route.method} {route.route}':
+                           self.measure(route, options['iterations'])
+                           for route in routes}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results)
+
+        if options['baseline']:
+            if options['save_baseline']:
+                with open(options['baseline'], 'w') as baseline_file:
+                    json.dump(results, baseline_file, indent=2,
+                              sort_keys=True)
+            else:
+                self.compare(results, options['baseline'],
+                             options['tolerance'])
+
+    def check_coverage(self, routes):
+        covered = {route.route for route in routes}
+        missing = [route for route in walk_routes(get_resolver().url_patterns)
+                   if route.startswith(APPS_URLS) and route not in covered]
+
+        for route in missing:
+            self.stderr.write(f'Route {route} is not benchmarked')
+
+    @staticmethod
+    def send(route, request):
+        client = request.pop('client')
+        path = request.pop('path', '/' + route.route)
+
+        return client.generic(route.method, path, **request)
+
+    def measure(self, route, iterations):
+        # warm up caches the same way repeated requests of a client would
+        self.send(route, route.prepare(-1))
+
+        latencies, queries = [], []
+        for index in range(iterations):
+            request = route.prepare(index)
+
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = self.send(route, request)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                latencies.append(time.perf_counter() - started)
+
+            queries.append(len(captured))
+
+            if response.status_code >= 400:
+                raise CommandError(f'{route.method} {route.route} answered '
+                                   f'{response.status_code}')
+
+        request = route.prepare(iterations)
+        tracemalloc.start()
+        response = self.send(route, request)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        latencies.sort()
+
+        return {
+            'queries': max(queries),
+            'p50_ms': milliseconds(percentile(latencies, 0.5)),
+            'p95_ms': milliseconds(percentile(latencies, 0.95)),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def report(self, results):
+        self.stdout.write(f'{"route":<64}{"queries":>8}{"p50 ms":>10}'
+                          f'{"p95 ms":>10}{"peak kB":>10}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<64}{result["queries"]:>8}{result["p50_ms"]:>10}'
+                f'{result["p95_ms"]:>10}{result["peak_kb"]:>10}'
+            )
+
+    def compare(self, results, baseline_path, tolerance):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                self.stderr.write(f'{name} is missing in the baseline')
+                continue
+
+            if result['queries'] > expected['queries']:
+                regressions.append(f'{name}: {result["queries"]} queries, '
+                                   f'baseline {expected["queries"]}')
+
+            for metric in ('p50_ms', 'p95_ms', 'peak_kb'):
+                if result[metric] > expected[metric] * (1 + tolerance):
+                    regressions.append(f'{name}: {metric} {result[metric]}, '
+                                       f'baseline {expected[metric]}')
+
+        if regressions:
+            raise CommandError('Regressions found:\n' +
+                               '\n'.join(regressions))
+
+        self.stdout.write('No regressions against the baseline')
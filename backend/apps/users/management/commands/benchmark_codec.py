@@ -0,0 +1,61 @@
+import timeit
+
+from Crypto.Cipher import DES
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users import cryptography
+
+
+def legacy_encode(encoding_text):
+    des = DES.new(settings.ENCODING_DES_KEY.encode(), DES.MODE_ECB)
+
+    while (len(encoding_text) % 8) != 0:
+        encoding_text += " "
+    encoded_text = des.encrypt(encoding_text.encode())
+
+    return encoded_text.hex()
+
+
+def legacy_decode(decoding_hex):
+    des = DES.new(settings.ENCODING_DES_KEY.encode(), DES.MODE_ECB)
+
+    decoded_bytes = des.decrypt(bytes.fromhex(decoding_hex))
+
+    return str(decoded_bytes.decode()).rstrip()
+
+
+class Command(BaseCommand):
+    help = 'Compares email codec timings of the legacy and current paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        emails = [f'cook.number.{index}@example.com'
+                  for index in range(options['emails'])]
+        v1_tokens = cryptography.encode_many(emails, version=1)
+        v2_tokens = cryptography.encode_many(emails, version=2)
+
+        cases = (
+            ('legacy encode', lambda: [legacy_encode(e) for e in emails]),
+            ('v1 encode', lambda: [cryptography.encode(e, version=1)
+                                   for e in emails]),
+            ('v1 encode_many',
+             lambda: cryptography.encode_many(emails, version=1)),
+            ('v2 encode', lambda: [cryptography.encode(e, version=2)
+                                   for e in emails]),
+            ('legacy decode', lambda: [legacy_decode(t) for t in v1_tokens]),
+            ('v1 decode', lambda: [cryptography.decode(t)
+                                   for t in v1_tokens]),
+            ('v1 decode_many', lambda: cryptography.decode_many(v1_tokens)),
+            ('v2 decode_many', lambda: cryptography.decode_many(v2_tokens)),
+        )
+
+        for name, case in cases:
+            seconds = min(timeit.repeat(case, number=1,
+                                        repeat=options['repeat']))
+            self.stdout.write(
+                f'{name:<16} {seconds * 1e6 / len(emails):8.2f} us/email'
+            )
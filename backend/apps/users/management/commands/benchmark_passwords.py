@@ -0,0 +1,114 @@
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+
+from distributions import milliseconds, percentile
+from users.passwords import PasswordCheckBusy, PasswordChecker
+
+PASSWORD = 'secret1!x'
+
+
+class Command(BaseCommand):
+    help = ('Measures login password checks per second and their latency '
+            'for every hasher and pool size, e.g. --hasher scrypt '
+            '--hasher pbkdf2 --workers 1 --workers 4')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasher', action='append',
+                            choices=sorted(settings.PASSWORD_HASHER_CLASSES),
+                            help='Hasher to measure, can be repeated, '
+                                 'all available ones by default')
+        parser.add_argument('--workers', action='append', type=int,
+                            help='PASSWORD_CHECK_WORKERS, can be repeated')
+        parser.add_argument('--queue-size', type=int,
+                            default=settings.PASSWORD_CHECK_QUEUE_SIZE)
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Logins at once, like request threads')
+        parser.add_argument('--logins', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if options['logins'] < 1:
+            raise CommandError('At least 1 login is needed')
+
+        hashers = options['hasher'] or sorted(settings.PASSWORD_HASHER_CLASSES)
+
+        self.stdout.write(f'{"hasher":<14}{"workers":>8}{"logins/s":>10}'
+                          f'{"p50 ms":>10}{"p99 ms":>10}{"refused":>9}')
+
+        for name in hashers:
+            path = settings.PASSWORD_HASHER_CLASSES[name]
+
+            try:
+                import_string(path)().encode(PASSWORD, 'availability')
+            except ValueError as error:
+                self.stdout.write(f'{name:<14}skipped: {error}')
+                continue
+
+            workers_counts = (options['workers'] or
+                              [settings.PASSWORD_CHECK_WORKERS])
+
+            for workers in workers_counts:
+                with override_settings(
+                        PASSWORD_HASHERS=[path],
+                        PASSWORD_CHECK_WORKERS=workers,
+                        PASSWORD_CHECK_QUEUE_SIZE=options['queue_size']):
+                    result = self.measure(options['concurrency'],
+                                          options['logins'])
+
+                self.stdout.write(
+                    f'{name:<14}{workers:>8}{result["rps"]:>10}'
+                    f'{result["p50_ms"]:>10}{result["p99_ms"]:>10}'
+                    f'{result["refused"]:>9}'
+                )
+
+    @staticmethod
+    def measure(concurrency, logins):
+        """
+        Checks the password from concurrency threads through a fresh
+        password checker, latencies are of the admitted checks
+        :return: dict of metrics
+        """
+        checker = PasswordChecker()
+        encoded = make_password(PASSWORD)
+        sent = itertools.count()
+
+        def login():
+            latencies, refused = [], 0
+
+            while next(sent) < logins:
+                started = time.perf_counter()
+                try:
+                    checker.check(PASSWORD, encoded)
+                except PasswordCheckBusy:
+                    refused += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+
+            return latencies, refused
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = [executor.submit(login) for _ in range(concurrency)]
+            results = [result.result() for result in results]
+        seconds = time.perf_counter() - started
+
+        latencies = sorted(itertools.chain.from_iterable(
+            latencies for latencies, _ in results
+        ))
+        refused = sum(refused for _, refused in results)
+
+        admitted = len(latencies)
+        latencies = latencies or [0]
+
+        return {
+            'rps': round(admitted / seconds, 1),
+            'p50_ms': milliseconds(percentile(latencies, 0.5)),
+            'p99_ms': milliseconds(percentile(latencies, 0.99)),
+            'refused': refused,
+        }
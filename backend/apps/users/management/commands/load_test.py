@@ -0,0 +1,136 @@
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from distributions import milliseconds, percentile
+
+DEFAULT_PATHS = ('/api/users/token-validation', '/api/dishes/')
+
+
+class Command(BaseCommand):
+    help = ('Sends concurrent GET requests to running deployments and '
+            'compares their requests per second and tail latency, e.g. '
+            '--target wsgi=http://127.0.0.1:8000 (gunicorn backend.wsgi) '
+            '--target asgi=http://127.0.0.1:8001 (uvicorn backend.asgi:'
+            'application) started on the same hardware and database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True,
+                            help='name=base URL, the first one is the '
+                                 'baseline of the comparison')
+        parser.add_argument('--path', action='append',
+                            help='Path to load, can be repeated')
+        parser.add_argument('--token', help='Token of the user to send')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Requests per target and path')
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--timeout', type=float, default=10)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('At least 1 request is needed')
+
+        targets = []
+        for target in options['target']:
+            name, separator, url = target.partition('=')
+            if not separator:
+                raise CommandError(f'Target {target} is not name=URL')
+            targets.append((name, url))
+
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+
+        self.stdout.write(f'{"target":<12}{"path":<36}{"req/s":>10}'
+                          f'{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+                          f'{"max ms":>10}{"errors":>8}')
+
+        for path in options['path'] or DEFAULT_PATHS:
+            results = []
+            for name, url in targets:
+                if options['warmup']:
+                    self.load(url, path, headers, options['concurrency'],
+                              options['warmup'], options['timeout'])
+                result = self.load(url, path, headers,
+                                   options['concurrency'],
+                                   options['requests'], options['timeout'])
+                results.append((name, result))
+
+                self.stdout.write(
+                    f'{name:<12}{path:<36}{result["rps"]:>10}'
+                    f'{result["p50_ms"]:>10}{result["p95_ms"]:>10}'
+                    f'{result["p99_ms"]:>10}{result["max_ms"]:>10}'
+                    f'{result["errors"]:>8}'
+                )
+
+            self.compare(results)
+
+    @staticmethod
+    def load(base_url, path, headers, concurrency, requests, timeout):
+        """
+        Sends requests from concurrency threads, each of them keeps its
+        connection alive
+        :return: dict of metrics
+        """
+        url = urlsplit(base_url)
+        connection_class = (HTTPSConnection if url.scheme == 'https'
+                            else HTTPConnection)
+        full_path = url.path.rstrip('/') + path
+        sent = itertools.count()
+
+        def worker():
+            connection = connection_class(url.netloc, timeout=timeout)
+            latencies, errors = [], 0
+
+            try:
+                while next(sent) < requests:
+                    started = time.perf_counter()
+                    try:
+                        connection.request('GET', full_path, headers=headers)
+                        response = connection.getresponse()
+                        response.read()
+                        failed = response.status >= 400
+                    except (OSError, HTTPException):
+                        connection.close()
+                        failed = True
+
+                    latencies.append(time.perf_counter() - started)
+                    errors += failed
+            finally:
+                connection.close()
+
+            return latencies, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = [executor.submit(worker) for _ in range(concurrency)]
+            results = [result.result() for result in results]
+        seconds = time.perf_counter() - started
+
+        latencies = sorted(itertools.chain.from_iterable(
+            latencies for latencies, _ in results
+        ))
+
+        return {
+            'rps': round(len(latencies) / seconds, 1),
+            'p50_ms': milliseconds(percentile(latencies, 0.5)),
+            'p95_ms': milliseconds(percentile(latencies, 0.95)),
+            'p99_ms': milliseconds(percentile(latencies, 0.99)),
+            'max_ms': milliseconds(latencies[-1]),
+            'errors': sum(errors for _, errors in results),
+        }
+
+    def compare(self, results):
+        (baseline_name, baseline), *others = results
+
+        for name, result in others:
+            self.stdout.write(
+                f'{name} against {baseline_name}: '
+                f'req/s x{result["rps"] / baseline["rps"]:.2f}, '
+                f'p99 x{result["p99_ms"] / baseline["p99_ms"]:.2f}'
+            )
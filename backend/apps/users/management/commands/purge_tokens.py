@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.authentication import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = ('Deletes expired tokens in batches, run it periodically, '
+            'e.g. from cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.USER_TOKEN_PURGE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            deleted = purge_expired_tokens(options['batch_size'])
+            total += deleted
+
+            if deleted < options['batch_size']:
+                break
+
+            time.sleep(options['pause'])
+
+        self.stdout.write(f'Deleted {total} expired tokens')
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.outbox import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Sends emails waiting in the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.EMAIL_OUTBOX_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the outbox')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to wait when the outbox is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_emails(options['batch_size'])
+
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+
+            if not options['loop']:
+                return
+
+            if sent + failed < options['batch_size']:
+                time.sleep(options['interval'])
@@ -0,0 +1,68 @@
+# Generated by Django 2.1.15 on 2026-10-18 23:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+BATCH_SIZE = 1000
+
+
+def copy_tokens(apps, schema_editor):
+    """
+    Copies tokens of rest_framework.authtoken, which is not installed
+    anymore, from its table if the database still has it. The table is
+    dropped by migration 0006_drop_authtoken.
+    """
+    connection = schema_editor.connection
+    if 'authtoken_token' not in connection.introspection.table_names():
+        return
+
+    UserToken = apps.get_model('users', 'UserToken')
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT key, user_id, created FROM authtoken_token '
+                       'ORDER BY key')
+
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+
+            batch = []
+            for key, user_id, created in rows:
+                # SQLite returns datetimes of raw queries as text in UTC
+                if isinstance(created, str):
+                    created = parse_datetime(created)
+                if settings.USE_TZ and timezone.is_naive(created):
+                    created = timezone.make_aware(created, timezone.utc)
+
+                batch.append(UserToken(
+                    key=key, user_id=user_id, created=created,
+                    expires_at=created + settings.USER_TOKEN_LIFETIME,
+                ))
+
+            UserToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserToken',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(copy_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.1.15 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_usertoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usertoken',
+            name='device_id',
+            field=models.CharField(default='default', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='usertoken',
+            name='last_used',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='usertoken',
+            index_together={('user', 'device_id')},
+        ),
+    ]
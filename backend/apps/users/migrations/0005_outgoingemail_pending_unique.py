@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def delete_duplicate_pending_emails(apps, schema_editor):
+    """ Keeps the newest pending email of every user """
+    OutgoingEmail = apps.get_model('users', 'OutgoingEmail')
+
+    newest = {}
+    for email_id, user_id in OutgoingEmail.objects.filter(sent=None) \
+            .order_by('id').values_list('id', 'user_id'):
+        newest[user_id] = email_id
+
+    OutgoingEmail.objects.filter(sent=None) \
+        .exclude(id__in=list(newest.values())).delete()
+
+
+class Migration(migrations.Migration):
+    """
+    Allows one pending email per user, so concurrent queueing of a user's
+    confirmation updates one row. Django 2.1 has no conditional unique
+    constraints, the partial index is created with SQL which SQLite and
+    PostgreSQL share.
+    """
+
+    dependencies = [
+        ('users', '0004_usertoken_device'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_pending_emails,
+                             migrations.RunPython.noop),
+        migrations.RunSQL(
+            ['CREATE UNIQUE INDEX users_outgoingemail_pending_user '
+             'ON users_outgoingemail (user_id) WHERE sent IS NULL'],
+            ['DROP INDEX users_outgoingemail_pending_user'],
+        ),
+    ]
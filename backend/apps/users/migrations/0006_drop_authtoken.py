@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Drops the table of rest_framework.authtoken, whose tokens were copied
+    to UserToken by migration 0003_usertoken
+    """
+
+    dependencies = [
+        ('users', '0005_outgoingemail_pending_unique'),
+    ]
+
+    operations = [
+        migrations.RunSQL(['DROP TABLE IF EXISTS authtoken_token'],
+                          migrations.RunSQL.noop),
+    ]
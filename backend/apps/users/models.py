@@ -1,5 +1,10 @@
+import binascii
+import os
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.db import models
+from django.utils import timezone
 from rest_framework import exceptions
 
 from .utils import UserManager
@@ -41,3 +46,77 @@ class User(AbstractBaseUser, PermissionsMixin):
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
             raise exceptions.NotFound(detail='User does not exist')
+
+
+class OutgoingEmail(models.Model):
+    """
+    Account confirmation email waiting in the outbox. A user has at most
+    one pending email, which migration 0005_outgoingemail_pending_unique
+    enforces with a partial unique index on user where sent is null.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='outgoing_emails')
+    to_email = models.EmailField(max_length=255)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    send_after = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('sent', 'send_after')),
+        ]
+
+
+class UserTokenQuerySet(models.QuerySet):
+
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+
+class UserToken(models.Model):
+    """
+    Authentication token of a device of a user, which expires
+    USER_TOKEN_LIFETIME after it is created. A user has a token per
+    device (a stove, a phone, a browser...), so devices log in, log out
+    and are revoked independently. The expiry is a column so that expired
+    tokens are rejected and purged by indexed queries, see
+    users.authentication and the purge_tokens command.
+    """
+    DEFAULT_DEVICE_ID = 'default'
+    DEVICE_ID_MAX_LENGTH = 64
+
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='tokens')
+    device_id = models.CharField(max_length=DEVICE_ID_MAX_LENGTH,
+                                 default=DEFAULT_DEVICE_ID)
+
+    created = models.DateTimeField(default=timezone.now)
+    # written at most once per USER_TOKEN_TOUCH_INTERVAL
+    last_used = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = UserTokenQuerySet.as_manager()
+
+    class Meta:
+        # login, listing and revocation of the tokens of a user
+        index_together = ('user', 'device_id')
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = binascii.hexlify(os.urandom(20)).decode()
+        if self.expires_at is None:
+            self.expires_at = self.created + settings.USER_TOKEN_LIFETIME
+
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.key
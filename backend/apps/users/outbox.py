@@ -0,0 +1,122 @@
+""" Outbox of emails which are sent by a worker out of request """
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .mail import get_transport
+from .models import OutgoingEmail
+from .utils import confirmation_email
+
+
+def queue_email_confirmation(user, to_email=None):
+    """
+    Puts an account confirmation into the outbox. A user has at most one
+    pending confirmation, queueing another one replaces it. A unique index
+    on pending emails makes concurrent calls update the same row.
+    :param user: User
+    :param to_email: target email to send confirmation
+    :return: OutgoingEmail
+    """
+    email, _ = OutgoingEmail.objects.update_or_create(
+        user=user, sent=None,
+        defaults={
+            'to_email': to_email if to_email else user.email,
+            'attempts': 0,
+            'send_after': timezone.now(),
+            'last_error': '',
+        }
+    )
+
+    return email
+
+
+def claim_emails(batch_size):
+    """
+    Takes a batch of due emails and postpones them for the time of sending,
+    so that concurrent workers do not pick the same emails
+    :param batch_size: int
+    :return: list of OutgoingEmail
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('user')
+            .filter(sent=None, send_after__lte=now,
+                    attempts__lt=settings.EMAIL_OUTBOX_MAX_ATTEMPTS)
+            .order_by('send_after')[:batch_size]
+        )
+
+        lease = now + settings.EMAIL_OUTBOX_LEASE
+        OutgoingEmail.objects.filter(id__in=[email.id for email in emails]) \
+            .update(send_after=lease)
+
+    for email in emails:
+        email.send_after = lease
+
+    return emails
+
+
+def send_email(email, transport):
+    """
+    Sends a claimed email unless its lease is over and another worker
+    claimed it, or it was queued again meanwhile. The lease is renewed
+    and committed before sending, so no row or transaction is held while
+    the transport sends. The email is marked sent right after, so a crash
+    re-sends at most this email.
+    :param email: OutgoingEmail claimed by claim_emails
+    :param transport: transport to send with
+    :return: bool or None if the email was not sent by this worker
+    """
+    lease = timezone.now() + settings.EMAIL_OUTBOX_LEASE
+    leased = OutgoingEmail.objects.filter(id=email.id, sent=None,
+                                          send_after=email.send_after)
+
+    if not leased.update(send_after=lease):
+        return None
+
+    leased = OutgoingEmail.objects.filter(id=email.id, send_after=lease)
+
+    try:
+        transport.send(confirmation_email(email.user, email.to_email))
+    except Exception as error:
+        email.attempts += 1
+        leased.update(
+            attempts=email.attempts,
+            send_after=timezone.now() + (
+                settings.EMAIL_OUTBOX_BACKOFF * 2 ** (email.attempts - 1)
+            ),
+            last_error=str(error),
+        )
+
+        return False
+
+    leased.update(sent=timezone.now())
+
+    return True
+
+
+def send_queued_emails(batch_size=None, transport=None):
+    """
+    Sends a batch of due emails. Failed emails are retried later with
+    an exponential backoff, only the newest email of a user is sent.
+    :param batch_size: int
+    :param transport: transport to send with, EMAIL_TRANSPORT by default
+    :return: (int, int) - numbers of sent and failed emails
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    transport = transport or get_transport()
+
+    newest = {}
+    for email in claim_emails(batch_size):
+        if email.user_id not in newest or email.id > newest[email.user_id].id:
+            newest[email.user_id] = email
+
+    OutgoingEmail.objects.filter(sent=None, user_id__in=list(newest)) \
+        .exclude(id__in=[email.id for email in newest.values()]).delete()
+
+    results = [send_email(email, transport) for email in newest.values()]
+
+    return results.count(True), results.count(False)
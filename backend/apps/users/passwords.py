@@ -0,0 +1,177 @@
+""" Password checks in a bounded pool of threads
+
+The pool caps concurrency, it does not take work off the request: the
+request thread blocks until its check is done, so the server worker
+stays busy for the whole hash. What it bounds is how many hashes run at
+once, PASSWORD_CHECK_WORKERS, which hashlib and argon2 compute without
+the GIL. At most PASSWORD_CHECK_QUEUE_SIZE more checks may wait for a
+thread, the others are refused right away, so a login storm is answered
+with 503 instead of every worker of the server waiting for hashing.
+
+A hash which is not made by the preferred hasher with its current costs
+is replaced after a successful check, in the pool and not in the login
+request.
+"""
+import threading
+from concurrent import futures
+
+from django.conf import settings
+from django.contrib.auth.hashers import (check_password, get_hasher,
+                                         identify_hasher, make_password)
+from django.db import connection
+from rest_framework import exceptions
+
+from .models import User
+
+
+class PasswordCheckBusy(exceptions.APIException):
+    status_code = 503
+    default_detail = 'Too many logins at once, try again later.'
+    default_code = 'password_check_busy'
+
+
+def needs_rehash(encoded):
+    """
+    Tells whether a valid hash should be made again with the preferred
+    hasher and costs
+    :param encoded: str
+    :return: bool
+    """
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+
+    preferred = get_hasher()
+
+    return (hasher.algorithm != preferred.algorithm or
+            preferred.must_update(encoded))
+
+
+def rehash(user_id, password, encoded):
+    """
+    Replaces the hash of a user unless the password was changed meanwhile
+    :param user_id: int
+    :param password: str
+    :param encoded: str - the checked hash
+    :return: bool - whether it was replaced
+    """
+    try:
+        return bool(User.objects.filter(pk=user_id, password=encoded)
+                    .update(password=make_password(password)))
+    finally:
+        # pool threads would keep a connection each
+        connection.close()
+
+
+class PasswordChecker:
+
+    def __init__(self):
+        self.checks = 0
+        self.refused = 0
+        self.rehashed = 0
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._rehashes = set()
+
+    def _submit(self, function, *args):
+        with self._lock:
+            if self._executor is None:
+                workers = settings.PASSWORD_CHECK_WORKERS
+
+                self._executor = futures.ThreadPoolExecutor(
+                    workers, thread_name_prefix='password-check'
+                )
+                self._slots = threading.BoundedSemaphore(
+                    workers + settings.PASSWORD_CHECK_QUEUE_SIZE
+                )
+
+        if not self._slots.acquire(blocking=False):
+            return None
+
+        future = self._executor.submit(function, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+
+        return future
+
+    def check(self, password, encoded):
+        """
+        Checks a password in the pool. Without a hash the password is
+        hashed anyway, so an unknown email takes as long as a wrong
+        password.
+        :param password: str
+        :param encoded: str or None
+        :return: bool
+        :raise PasswordCheckBusy: if the pool and its queue are full
+        """
+        if encoded is None:
+            future = self._submit(make_password, password)
+        else:
+            future = self._submit(check_password, password, encoded)
+
+        with self._lock:
+            self.checks += 1
+            self.refused += future is None
+
+        if future is None:
+            raise PasswordCheckBusy()
+
+        return encoded is not None and future.result()
+
+    def check_user(self, user, password):
+        """
+        Checks password of a user and upgrades an outdated hash in the
+        background
+        :param user: User or None
+        :param password: str
+        :return: bool
+        :raise PasswordCheckBusy: if the pool and its queue are full
+        """
+        encoded = user.password if user else None
+
+        if not self.check(password, encoded):
+            return False
+
+        if needs_rehash(encoded):
+            # skipped when the pool is busy, the next login does it
+            future = self._submit(rehash, user.pk, password, encoded)
+
+            if future is not None:
+                with self._lock:
+                    self._rehashes.add(future)
+                future.add_done_callback(self._rehashed)
+
+        return True
+
+    def _rehashed(self, future):
+        with self._lock:
+            self._rehashes.discard(future)
+            self.rehashed += (not future.exception() and future.result())
+
+    def wait_rehashes(self, timeout=None):
+        """
+        Waits for the pending background rehashes
+        :param timeout: float or None - seconds
+        :return: None
+        """
+        with self._lock:
+            pending = list(self._rehashes)
+
+        futures.wait(pending, timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'checks': self.checks,
+                'refused': self.refused,
+                'rehashed': self.rehashed,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.checks = self.refused = self.rehashed = 0
+
+
+password_checker = PasswordChecker()
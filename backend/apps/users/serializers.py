@@ -4,8 +4,8 @@ from django.contrib.auth import authenticate
 from rest_framework import exceptions, serializers
 
 from exceptions import ValidationError, NotFound, PermissionDenied
-from .models import User
-from .utils import send_email_confirmation
+from .models import User, UserToken
+from .outbox import queue_email_confirmation
 
 
 class BaseLoginSerializer(serializers.ModelSerializer):
@@ -16,6 +16,11 @@ class BaseLoginSerializer(serializers.ModelSerializer):
 
 
 class LoginSerializer(BaseLoginSerializer):
+    # tokens are kept per device, a device id fits in a URL path
+    device_id = serializers.RegexField(
+        r'^[\w.:-]+$', max_length=UserToken.DEVICE_ID_MAX_LENGTH,
+        default=UserToken.DEFAULT_DEVICE_ID,
+    )
 
     def validate(self, data):
         user = authenticate(email=data['email'], password=data['password'])
@@ -34,11 +39,13 @@ class LoginSerializer(BaseLoginSerializer):
 
             raise activation_error
 
+        data['user'] = user
+
         return data
 
     class Meta:
         model = User
-        fields = ('email', 'password')
+        fields = ('email', 'password', 'device_id')
         extra_kwargs = {
             'email': {
                 'validators': [],
@@ -51,7 +58,7 @@ class RegistrationSerializer(BaseLoginSerializer):
     def create(self, validated_data):
         user = User.objects.create_user(**validated_data, is_active=False)
 
-        send_email_confirmation(user)
+        queue_email_confirmation(user)
 
         return user
 
@@ -76,3 +83,16 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'email', 'fname', 'lname', 'birthdate', 'gender')
+
+
+class UserTokenSerializer(serializers.ModelSerializer):
+    """ Token of a device without its key, see UserTokensView """
+    current = serializers.SerializerMethodField()
+
+    def get_current(self, token):
+        return token.key == self.context['request'].auth.key
+
+    class Meta:
+        model = UserToken
+        fields = ('device_id', 'created', 'last_used', 'expires_at',
+                  'current')
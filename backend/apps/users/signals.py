@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_tokens
+from .models import User, UserToken
+
+
+@receiver((post_save, pre_delete), sender=User)
+def invalidate_user_tokens(sender, instance, update_fields=None, **kwargs):
+    """
+    Drops the cached tokens of a user, they keep the user as it was
+    cached, so deactivation or a change of is_staff would be seen only
+    after USER_TOKEN_CACHE_TIMEOUT. Queryset updates of users send no
+    signal and have to call invalidate_tokens themselves.
+    """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+
+    keys = list(UserToken.objects.filter(user_id=instance.pk)
+                .values_list('key', flat=True))
+    if not keys:
+        return
+
+    invalidate_tokens(keys)
+    # a request may cache the user it still reads before the commit
+    transaction.on_commit(lambda: invalidate_tokens(keys))
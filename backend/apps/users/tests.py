@@ -0,0 +1,794 @@
+import json
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import IntegrityError, connection, transaction
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import cryptography
+from .authentication import revoke_tokens, touch_token
+from .checks import check_token_cache
+from .mail import LocmemTransport
+from .hashers import ScryptPasswordHasher
+from .models import OutgoingEmail, User, UserToken
+from .outbox import queue_email_confirmation, send_queued_emails
+from .passwords import PasswordCheckBusy, PasswordChecker, password_checker
+from .throttling import CacheStore, LocalStore, Rate, get_store, parse_rate
+
+
+class TokenAuthenticationTest(TestCase):
+
+    def setUp(self):
+        caches[settings.USER_TOKEN_CACHE].clear()
+
+        self.user = User.objects.create_user(
+            email='cook@example.com', password='secret1!', is_active=True
+        )
+        self.token = UserToken.objects.create(user=self.user)
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_token_needs_no_query(self):
+        # the token lookup and the first last_used write
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/users/token-validation')
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/users/token-validation')
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_expires_after_lifetime(self):
+        self.assertEqual(self.token.expires_at,
+                         self.token.created + settings.USER_TOKEN_LIFETIME)
+
+    def test_expired_token_is_rejected(self):
+        UserToken.objects.filter(key=self.token.key).update(
+            expires_at=timezone.now()
+        )
+
+        response = self.client.get('/api/dishes/')
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_cached_token_expires_with_token(self):
+        self.client.get('/api/users/token-validation')
+
+        expired = self.token.expires_at + timezone.timedelta(seconds=1)
+        with mock.patch('users.authentication.timezone.now',
+                        return_value=expired):
+            response = self.client.get('/api/users/token-validation')
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_login_creates_token_once_the_active_one_expires(self):
+        def login():
+            response = APIClient().post('/api/users/login', {
+                'email': 'cook@example.com', 'password': 'secret1!',
+            })
+            return response.data['token']
+
+        get_store().clear()
+        self.assertEqual(login(), self.token.key)
+
+        UserToken.objects.update(expires_at=timezone.now())
+        key = login()
+
+        self.assertNotEqual(key, self.token.key)
+        self.assertEqual(UserToken.objects.active().get().key, key)
+
+    def test_expired_tokens_are_purged_in_batches(self):
+        expired = timezone.now() - timezone.timedelta(seconds=1)
+        for _ in range(5):
+            UserToken.objects.create(user=self.user, expires_at=expired)
+
+        output = StringIO()
+        with self.assertNumQueries(2 * 3):
+            call_command('purge_tokens', batch_size=2, pause=0,
+                         stdout=output)
+
+        self.assertIn('Deleted 5 expired tokens', output.getvalue())
+        self.assertEqual(list(UserToken.objects.all()), [self.token])
+
+    def test_revoked_cached_token_is_rejected(self):
+        self.client.get('/api/users/token-validation')
+
+        revoke_tokens(self.user)
+
+        response = self.client.get('/api/users/token-validation')
+        self.assertEqual(response.status_code, 401)
+
+    def test_saved_user_is_not_served_from_cache(self):
+        self.client.get('/api/users/token-validation')
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/dishes/statistics/users')
+        self.assertEqual(response.status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/api/users/token-validation')
+        self.assertEqual(response.status_code, 401)
+
+    def test_last_login_keeps_cached_token(self):
+        self.client.get('/api/users/token-validation')
+
+        self.user.save(update_fields=('last_login',))
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/users/token-validation')
+        self.assertEqual(response.status_code, 200)
+
+    def test_process_local_token_cache_is_reported(self):
+        self.assertEqual([warning.id for warning
+                          in check_token_cache(None)], ['users.W001'])
+
+    @override_settings(USER_TOKEN_CACHE='shared', CACHES=dict(
+        settings.CACHES,
+        shared={'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    ))
+    def test_shared_token_cache_is_accepted(self):
+        self.assertEqual(check_token_cache(None), [])
+
+    def test_logout_invalidates_cached_token(self):
+        self.client.get('/api/users/token-validation')
+
+        response = self.client.post('/api/users/logout')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/users/token-validation')
+        self.assertEqual(response.status_code, 401)
+
+
+class DeviceTokensTest(TestCase):
+
+    def setUp(self):
+        caches[settings.USER_TOKEN_CACHE].clear()
+        get_store().clear()
+
+        self.user = User.objects.create_user(
+            email='cook@example.com', password='secret1!', is_active=True
+        )
+
+    def login(self, device_id=None):
+        data = {'email': 'cook@example.com', 'password': 'secret1!'}
+        if device_id is not None:
+            data['device_id'] = device_id
+
+        response = APIClient().post('/api/users/login', data)
+        self.assertEqual(response.status_code, 200)
+
+        key = response.data['token']
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+
+        return client, key
+
+    def test_devices_get_tokens_of_their_own(self):
+        _, stove_key = self.login('stove-1')
+        _, phone_key = self.login('phone')
+        _, default_key = self.login()
+
+        self.assertEqual(len({stove_key, phone_key, default_key}), 3)
+        self.assertEqual(self.login('stove-1')[1], stove_key)
+        self.assertEqual(UserToken.objects.get(key=default_key).device_id,
+                         UserToken.DEFAULT_DEVICE_ID)
+
+    def test_device_id_is_validated(self):
+        response = APIClient().post('/api/users/login', {
+            'email': 'cook@example.com', 'password': 'secret1!',
+            'device_id': 'stove/1',
+        })
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_logout_keeps_other_devices(self):
+        stove, _ = self.login('stove')
+        phone, _ = self.login('phone')
+
+        self.assertEqual(phone.post('/api/users/logout').status_code, 200)
+
+        self.assertEqual(
+            phone.get('/api/users/token-validation').status_code, 401
+        )
+        self.assertEqual(
+            stove.get('/api/users/token-validation').status_code, 200
+        )
+
+    def test_tokens_are_listed_without_keys(self):
+        self.login('stove')
+        phone, _ = self.login('phone')
+
+        response = phone.get('/api/users/tokens')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(token['device_id'], token['current'])
+             for token in response.data],
+            [('phone', True), ('stove', False)]
+        )
+        self.assertNotIn('key', response.data[0])
+
+    def test_device_is_revoked(self):
+        stove, _ = self.login('stove')
+        phone, _ = self.login('phone')
+        stove.get('/api/users/token-validation')
+
+        response = phone.delete('/api/users/tokens/stove')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['revoked'], 1)
+        # the cached token is dropped too
+        self.assertEqual(
+            stove.get('/api/users/token-validation').status_code, 401
+        )
+        self.assertEqual(
+            phone.get('/api/users/token-validation').status_code, 200
+        )
+
+        response = phone.delete('/api/users/tokens/stove')
+        self.assertEqual(response.status_code, 404)
+
+    def test_devices_of_other_users_are_not_revoked(self):
+        other = User.objects.create_user(email='other@example.com',
+                                         password='secret1!', is_active=True)
+        UserToken.objects.create(user=other, device_id='stove')
+        phone, _ = self.login('phone')
+
+        response = phone.delete('/api/users/tokens/stove')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(UserToken.objects.filter(user=other).exists())
+
+    def test_all_devices_are_revoked(self):
+        stove, _ = self.login('stove')
+        phone, _ = self.login('phone')
+
+        response = phone.delete('/api/users/tokens')
+
+        self.assertEqual(response.data['revoked'], 2)
+        for client in (stove, phone):
+            self.assertEqual(
+                client.get('/api/users/token-validation').status_code, 401
+            )
+
+    def test_last_used_writes_are_coalesced(self):
+        stove, key = self.login('stove')
+
+        stove.get('/api/users/token-validation')
+        last_used = UserToken.objects.get(key=key).last_used
+        self.assertIsNotNone(last_used)
+
+        caches[settings.USER_TOKEN_CACHE].clear()
+        with self.assertNumQueries(1):
+            stove.get('/api/users/token-validation')
+        self.assertEqual(UserToken.objects.get(key=key).last_used, last_used)
+
+        later = last_used + settings.USER_TOKEN_TOUCH_INTERVAL
+        with mock.patch('users.authentication.timezone.now',
+                        return_value=later):
+            with self.assertNumQueries(1):
+                stove.get('/api/users/token-validation')
+            with self.assertNumQueries(0):
+                stove.get('/api/users/token-validation')
+
+        self.assertEqual(UserToken.objects.get(key=key).last_used, later)
+
+    def test_concurrent_touch_writes_once(self):
+        _, key = self.login('stove')
+        now = timezone.now()
+        first = UserToken.objects.get(key=key)
+        second = UserToken.objects.get(key=key)
+
+        touch_token(first, now)
+        touch_token(second, now + timezone.timedelta(seconds=1))
+
+        self.assertEqual(UserToken.objects.get(key=key).last_used, now)
+
+
+class FailingTransport:
+
+    def send(self, message):
+        raise ConnectionError('SendGrid is down')
+
+
+@override_settings(EMAIL_TRANSPORT='users.mail.LocmemTransport')
+class EmailOutboxTest(TestCase):
+
+    def setUp(self):
+        LocmemTransport.outbox = []
+
+        self.user = User.objects.create_user(email='new@example.com',
+                                             password='secret1!')
+
+    def test_registration_queues_confirmation(self):
+        response = APIClient().post('/api/users/register', {
+            'email': 'cook@example.com',
+            'password': 'secret1!',
+            'fname': 'Cook',
+        })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(LocmemTransport.outbox, [])
+        self.assertTrue(OutgoingEmail.objects.filter(
+            user__email='cook@example.com', sent=None
+        ).exists())
+
+    def test_worker_sends_queued_confirmation(self):
+        queue_email_confirmation(self.user)
+
+        call_command('send_queued_emails', stdout=StringIO())
+
+        message, = LocmemTransport.outbox
+        self.assertEqual(message.to_email, 'new@example.com')
+        self.assertIn('/api/users/activate/', message.body)
+        self.assertIsNotNone(OutgoingEmail.objects.get().sent)
+
+    def test_confirmations_are_deduplicated_per_user(self):
+        queue_email_confirmation(self.user)
+        queue_email_confirmation(self.user, 'other@example.com')
+
+        self.assertEqual(send_queued_emails(), (1, 0))
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+        self.assertEqual(LocmemTransport.outbox[0].to_email,
+                         'other@example.com')
+
+    def test_failed_email_is_retried_with_backoff(self):
+        queue_email_confirmation(self.user)
+
+        self.assertEqual(send_queued_emails(transport=FailingTransport()),
+                         (0, 1))
+
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('SendGrid is down', email.last_error)
+        self.assertGreater(email.send_after, timezone.now())
+
+        # not due yet
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+        OutgoingEmail.objects.update(send_after=timezone.now())
+        self.assertEqual(send_queued_emails(), (1, 0))
+
+    def test_sent_emails_are_not_sent_again_after_a_crash(self):
+        other = User.objects.create_user(email='other@example.com',
+                                         password='secret1!')
+        queue_email_confirmation(self.user)
+        queue_email_confirmation(other)
+
+        class Crash(BaseException):
+            pass
+
+        class CrashingTransport(LocmemTransport):
+
+            def send(self, message):
+                if LocmemTransport.outbox:
+                    raise Crash()
+                super().send(message)
+
+        with self.assertRaises(Crash):
+            send_queued_emails(transport=CrashingTransport())
+
+        self.assertEqual(
+            list(OutgoingEmail.objects.filter(sent=None)
+                 .values_list('user', flat=True)), [other.id]
+        )
+
+        # the lease of the claimed emails is over
+        OutgoingEmail.objects.update(send_after=timezone.now())
+        self.assertEqual(send_queued_emails(), (1, 0))
+        self.assertEqual([message.to_email
+                          for message in LocmemTransport.outbox],
+                         ['new@example.com', 'other@example.com'])
+
+    def test_user_has_one_pending_email(self):
+        queue_email_confirmation(self.user)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OutgoingEmail.objects.create(user=self.user,
+                                         to_email=self.user.email)
+
+        OutgoingEmail.objects.update(sent=timezone.now())
+        queue_email_confirmation(self.user)
+        self.assertEqual(OutgoingEmail.objects.count(), 2)
+
+    def test_email_queued_again_while_sending_is_kept(self):
+        queue_email_confirmation(self.user)
+        user = self.user
+
+        class RequeueingTransport(LocmemTransport):
+
+            def send(self, message):
+                super().send(message)
+                queue_email_confirmation(user, 'other@example.com')
+
+        self.assertEqual(send_queued_emails(transport=RequeueingTransport()),
+                         (1, 0))
+
+        email = OutgoingEmail.objects.get()
+        self.assertIsNone(email.sent)
+        self.assertEqual(email.to_email, 'other@example.com')
+
+        self.assertEqual(send_queued_emails(), (1, 0))
+        self.assertEqual([message.to_email
+                          for message in LocmemTransport.outbox],
+                         ['new@example.com', 'other@example.com'])
+
+    def test_email_is_given_up_after_max_attempts(self):
+        queue_email_confirmation(self.user)
+        OutgoingEmail.objects.update(
+            attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+        )
+
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+
+class EmailOutboxTransactionTest(TransactionTestCase):
+
+    def test_email_is_sent_out_of_transaction(self):
+        user = User.objects.create_user(email='new@example.com',
+                                        password='secret1!')
+        queue_email_confirmation(user)
+        in_transaction = []
+
+        class CheckingTransport(LocmemTransport):
+
+            def send(self, message):
+                in_transaction.append(connection.in_atomic_block)
+                super().send(message)
+
+        self.assertEqual(send_queued_emails(transport=CheckingTransport()),
+                         (1, 0))
+        self.assertEqual(in_transaction, [False])
+        self.assertIsNotNone(OutgoingEmail.objects.get().sent)
+
+
+class CryptographyTest(TestCase):
+
+    emails = ['cook@example.com', 'a@b.co', 'chief.of.stove@example.com']
+
+    def test_v1_tokens_match_legacy_links(self):
+        # encoded with the original per-call DES implementation
+        self.assertEqual(cryptography.encode('cook@example.com', version=1),
+                         'f085dd32565ad7321b19e15e9182ac1a')
+        self.assertEqual(
+            cryptography.decode('f085dd32565ad7321b19e15e9182ac1a'),
+            'cook@example.com'
+        )
+
+    def test_round_trip(self):
+        for version in (1, 2):
+            tokens = cryptography.encode_many(self.emails, version=version)
+
+            self.assertEqual(cryptography.decode_many(tokens), self.emails)
+            self.assertEqual([cryptography.decode(token)
+                              for token in tokens], self.emails)
+
+    def test_mixed_versions_are_decoded_in_order(self):
+        tokens = [cryptography.encode(email, version=version)
+                  for email, version in zip(self.emails, (2, 1, 2))]
+
+        self.assertTrue(tokens[0].startswith(cryptography.V2_PREFIX))
+        self.assertEqual(cryptography.decode_many(tokens), self.emails)
+
+    def test_tampered_token_is_rejected(self):
+        token = cryptography.encode('cook@example.com', version=2)
+        tampered = token[:-2] + ('A' if token[-2] != 'A' else 'B') + token[-1]
+
+        with self.assertRaises(ValueError):
+            cryptography.decode(tampered)
+
+        with self.assertRaises(ValueError):
+            cryptography.decode('abc')
+
+
+PBKDF2_HASHERS = ['django.contrib.auth.hashers.PBKDF2PasswordHasher']
+SCRYPT_HASHERS = ['users.hashers.ScryptPasswordHasher'] + PBKDF2_HASHERS
+
+
+@override_settings(PASSWORD_HASHERS=SCRYPT_HASHERS)
+class PasswordHashingTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+
+        self.user = User.objects.create_user(
+            email='cook@example.com', password='secret1!', is_active=True
+        )
+        self.client = APIClient()
+
+    def login(self, email='cook@example.com', password='secret1!'):
+        return self.client.post('/api/users/login',
+                                {'email': email, 'password': password})
+
+    def test_passwords_are_hashed_with_scrypt(self):
+        self.assertTrue(self.user.password.startswith('scrypt$16384$8$1$'))
+        self.assertTrue(check_password('secret1!', self.user.password))
+        self.assertFalse(check_password('secret1?', self.user.password))
+
+        summary = ScryptPasswordHasher().safe_summary(self.user.password)
+        self.assertEqual(summary['n'], 16384)
+
+    def test_changed_costs_need_update(self):
+        hasher = ScryptPasswordHasher()
+        self.assertFalse(hasher.must_update(self.user.password))
+
+        with self.settings(PASSWORD_SCRYPT={'n': 2 ** 10, 'r': 8, 'p': 1}):
+            self.assertTrue(hasher.must_update(self.user.password))
+            # old hashes are still verified
+            self.assertTrue(check_password('secret1!', self.user.password))
+
+    @override_settings(PASSWORD_HASHERS=settings.PASSWORD_HASHERS)
+    def test_pbkdf2_is_the_default(self):
+        user = User.objects.create_user(email='new@example.com',
+                                        password='secret1!')
+
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+    def test_login(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login(password='secret1?').status_code, 404)
+        self.assertEqual(self.login(email='nobody@example.com').status_code,
+                         404)
+
+    def test_login_is_refused_when_checks_are_busy(self):
+        with mock.patch.object(password_checker, '_submit',
+                               return_value=None):
+            response = self.login()
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_checks_over_the_queue_are_refused(self):
+        checker = PasswordChecker()
+        released = threading.Event()
+
+        with self.settings(PASSWORD_CHECK_WORKERS=1,
+                           PASSWORD_CHECK_QUEUE_SIZE=1):
+            busy = checker._submit(released.wait)
+            checker._submit(released.wait)
+
+            with self.assertRaises(PasswordCheckBusy):
+                checker.check('secret1!', self.user.password)
+
+            released.set()
+            busy.result()
+
+        self.assertTrue(checker.check('secret1!', self.user.password))
+        self.assertFalse(checker.check('secret1!', None))
+        self.assertEqual(checker.stats(), {
+            'checks': 3, 'refused': 1, 'rehashed': 0,
+        })
+
+
+@override_settings(PASSWORD_HASHERS=SCRYPT_HASHERS)
+class PasswordRehashTest(TransactionTestCase):
+
+    def setUp(self):
+        with self.settings(PASSWORD_HASHERS=PBKDF2_HASHERS):
+            self.user = User.objects.create_user(
+                email='cook@example.com', password='secret1!',
+                is_active=True
+            )
+
+    def test_outdated_hash_is_replaced_after_login(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+        response = APIClient().post('/api/users/login', {
+            'email': 'cook@example.com', 'password': 'secret1!',
+        })
+        self.assertEqual(response.status_code, 200)
+
+        password_checker.wait_rehashes(timeout=10)
+        self.user.refresh_from_db()
+
+        self.assertTrue(self.user.password.startswith('scrypt$'))
+        self.assertTrue(self.user.check_password('secret1!'))
+
+    def test_changed_password_is_not_replaced(self):
+        checker = PasswordChecker()
+        outdated = self.user.password
+        User.objects.filter(pk=self.user.pk).update(
+            password=make_password('other1!x')
+        )
+        self.user.password = outdated
+
+        self.assertTrue(checker.check_user(self.user, 'secret1!'))
+        checker.wait_rehashes(timeout=10)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('other1!x'))
+        self.assertEqual(checker.stats()['rehashed'], 0)
+
+
+class ThrottleStoresTest(SimpleTestCase):
+
+    def test_rates(self):
+        self.assertEqual(parse_rate('10/min'), Rate(10, 60))
+        self.assertEqual(parse_rate('100/15m'), Rate(100, 900))
+        self.assertEqual(parse_rate('3/day'), Rate(3, 86400))
+
+        with self.assertRaises(ValueError):
+            parse_rate('10 per minute')
+
+    def check_store(self, store):
+        rate = Rate(3, 60)
+
+        self.assertEqual([store.hit('key', rate) for _ in range(3)],
+                         [0, 0, 0])
+
+        wait = store.hit('key', rate)
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 60)
+
+        # other keys have their own counters
+        self.assertEqual(store.hit('other', rate), 0)
+
+    def test_local_store(self):
+        self.check_store(LocalStore())
+
+    def test_cache_store(self):
+        store = CacheStore()
+        store.clear()
+
+        self.check_store(store)
+
+    def test_refused_requests_are_not_counted(self):
+        store = CacheStore()
+        store.clear()
+        rate = Rate(1, 60)
+
+        store.hit('key', rate)
+        store.hit('key', rate)
+
+        window = int(time.time() / rate.period)
+        self.assertEqual(
+            store.cache.get(store.window_key('key', rate, window)), 1
+        )
+
+    def test_refunds(self):
+        rate = Rate(1, 60)
+
+        for store in (LocalStore(), CacheStore()):
+            store.clear()
+
+            store.hit('key', rate)
+            store.refund('key', rate)
+            self.assertEqual(store.hit('key', rate), 0)
+
+            # nothing to give back
+            store.refund('other', rate)
+            self.assertEqual(store.hit('other', rate), 0)
+
+    def test_cache_store_clears_only_its_cache(self):
+        caches['default'].set('kept', 1)
+
+        CacheStore().clear()
+
+        self.assertEqual(caches['default'].get('kept'), 1)
+
+    def test_local_store_keeps_recent_keys(self):
+        store = LocalStore()
+        rate = Rate(1, 60)
+
+        with self.settings(THROTTLE_LOCAL_MAX_KEYS=2):
+            for key in ('first', 'second', 'third'):
+                store.hit(key, rate)
+
+            # the first bucket was forgotten, so it is full again
+            self.assertEqual(store.hit('first', rate), 0)
+            self.assertGreater(store.hit('third', rate), 0)
+
+
+class ThrottlingTest(TestCase):
+
+    def setUp(self):
+        get_store().clear()
+
+        User.objects.create_user(email='cook@example.com',
+                                 password='secret1!', is_active=True)
+        self.client = APIClient()
+
+    def login(self, email='cook@example.com', **extra):
+        return self.client.post('/api/users/login',
+                                {'email': email, 'password': 'secret1!'},
+                                **extra)
+
+    @override_settings(THROTTLE_RATES={'login': {'email': '2/min'}})
+    def test_login_is_throttled_per_email(self):
+        self.assertEqual(self.login().status_code, 200)
+        # counted for the same email, though it does not match the account
+        self.assertEqual(self.login(email='COOK@example.com ').status_code,
+                         404)
+
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        self.assertEqual(self.login(email='other@example.com').status_code,
+                         404)
+
+    @override_settings(THROTTLE_RATES={'login': {'ip': '2/min',
+                                                 'email': '1/min'}})
+    def test_refused_requests_count_for_no_limit(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login().status_code, 429)
+
+        # the ip limit did not count the request refused per email
+        self.assertEqual(self.login(email='other@example.com').status_code,
+                         404)
+        self.assertEqual(self.login(email='third@example.com').status_code,
+                         429)
+
+    @override_settings(THROTTLE_RATES={'login': {'email': '1/min'},
+                                       'retry_activation': {'ip': '5/min'}})
+    def test_body_which_is_not_an_object(self):
+        for body in (['cook@example.com'], 'cook@example.com', 1):
+            response = self.client.post('/api/users/login', body,
+                                        format='json')
+            self.assertEqual(response.status_code, 400, body)
+
+            response = self.client.generic(
+                'GET', '/api/users/activate/retry-activation',
+                json.dumps(body), content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 422, body)
+
+    @override_settings(THROTTLE_RATES={'registration': {'ip': '1/hour'}})
+    def test_registration_is_throttled_per_ip(self):
+        def register(index, address):
+            return self.client.post('/api/users/register', {
+                'email': f'new-{index}@example.com', 'password': 'secret1!',
+                'fname': 'Cook',
+            }, REMOTE_ADDR=address).status_code
+
+        self.assertEqual(register(1, '10.0.0.1'), 201)
+        self.assertEqual(register(2, '10.0.0.1'), 429)
+        self.assertEqual(register(3, '10.0.0.2'), 201)
+
+    @override_settings(THROTTLE_RATES={'registration': {'ip': '1/hour'}})
+    def test_forwarded_for_is_not_trusted_without_proxies(self):
+        def register(index):
+            return self.client.post('/api/users/register', {
+                'email': f'new-{index}@example.com', 'password': 'secret1!',
+                'fname': 'Cook',
+            }, REMOTE_ADDR='10.0.0.1',
+                HTTP_X_FORWARDED_FOR=f'192.0.2.{index}').status_code
+
+        self.assertEqual(register(1), 201)
+        self.assertEqual(register(2), 429)
+        self.assertEqual(register(3), 429)
+
+    @override_settings(THROTTLE_RATES={'registration': {'ip': '1/hour'}},
+                       REST_FRAMEWORK={'NUM_PROXIES': 1})
+    def test_forwarded_for_is_read_behind_a_proxy(self):
+        def register(index, forwarded_for):
+            return self.client.post('/api/users/register', {
+                'email': f'new-{index}@example.com', 'password': 'secret1!',
+                'fname': 'Cook',
+            }, REMOTE_ADDR='10.0.0.1',
+                HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+        self.assertEqual(register(1, '192.0.2.1'), 201)
+        # only the address appended by the proxy is trusted
+        self.assertEqual(register(2, '198.51.100.7, 192.0.2.1'), 429)
+        self.assertEqual(register(3, '192.0.2.2'), 201)
+
+    @override_settings(THROTTLE_STORE='users.throttling.CacheStore',
+                       THROTTLE_RATES={'login': {'ip': '1/min'}})
+    def test_shared_store(self):
+        get_store().clear()
+
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login().status_code, 429)
+        self.assertEqual(self.login(REMOTE_ADDR='10.0.0.1').status_code, 200)
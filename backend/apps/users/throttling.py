@@ -0,0 +1,239 @@
+""" Request throttling
+
+A throttled view names its throttle_scope and THROTTLE_RATES sets the
+limits of every scope per key kind: 'ip' of the client, 'email' of the
+request body or the authenticated 'user'. A request is let through if
+it fits all the limits of its scope, a refused request is counted by
+none of them. The client 'ip' is REMOTE_ADDR unless
+REST_FRAMEWORK['NUM_PROXIES'] trusts X-Forwarded-For.
+
+Counters live in the THROTTLE_STORE, every check costs the same
+whatever the limits are:
+    LocalStore - token buckets in the memory of the process
+    CacheStore - sliding window counters in the THROTTLE_CACHE cache,
+                 shared by processes when it is Redis or memcached.
+                 The cache holds nothing else, clear() empties it.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+Rate = namedtuple('Rate', ('limit', 'period'))
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600,
+           'd': 86400, 'day': 86400}
+RATE_FORMAT = re.compile(r'^(\d+)/(\d*)(s|sec|m|min|h|hour|d|day)$')
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    :param rate: str - requests per period, e.g. '10/min' or '100/15m'
+    :return: Rate with the period in seconds
+    :raise ValueError: if the rate has another format
+    """
+    match = RATE_FORMAT.match(rate)
+    if not match:
+        raise ValueError(f'Rate {rate} is not requests/period')
+
+    limit, multiplier, unit = match.groups()
+
+    return Rate(int(limit), int(multiplier or 1) * PERIODS[unit])
+
+
+class LocalStore:
+    """
+    Token buckets of up to THROTTLE_LOCAL_MAX_KEYS keys, the least
+    recently used ones are forgotten first. A bucket holds up to limit
+    tokens, refills at limit per period and a request takes one token.
+    """
+
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, rate):
+        """
+        Takes a token of the key if there is one
+        :param key: str
+        :param rate: Rate
+        :return: float - 0 if allowed, else seconds until the next token
+        """
+        now = time.monotonic()
+        refill = rate.limit / rate.period
+
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (rate.limit, now))
+            tokens = min(rate.limit, tokens + (now - updated) * refill)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / refill
+
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > settings.THROTTLE_LOCAL_MAX_KEYS:
+                self._buckets.popitem(last=False)
+
+        return wait
+
+    def refund(self, key, rate):
+        """
+        Gives back a token taken by a request which was refused by another
+        limit
+        :param key: str
+        :param rate: Rate
+        :return: None
+        """
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(rate.limit, tokens + 1), updated)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheStore:
+    """
+    Sliding window counters: requests of the current fixed window plus
+    the previous window's share which still overlaps the sliding one.
+    Counters are changed with atomic incr and decr only, so processes
+    sharing the cache never lose a request.
+    """
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE]
+
+    @staticmethod
+    def window_key(key, rate, window):
+        return f'throttle:{key}:{rate.period}:{window}'
+
+    def hit(self, key, rate):
+        """
+        Counts a request of the key if it fits the window
+        :param key: str
+        :param rate: Rate
+        :return: float - 0 if allowed, else seconds until it would fit
+        """
+        position = time.time() / rate.period
+        window = int(position)
+        elapsed = position - window
+
+        current_key = self.window_key(key, rate, window)
+        self.cache.add(current_key, 0, 2 * rate.period)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # expired between add and incr
+            self.cache.add(current_key, 1, 2 * rate.period)
+            current = 1
+
+        previous = self.cache.get(self.window_key(key, rate, window - 1), 0)
+
+        if previous * (1 - elapsed) + current <= rate.limit:
+            return 0
+
+        # refused requests are not counted
+        self.cache.decr(current_key)
+
+        free = rate.limit - (current - 1)
+        if free <= 0 or not previous:
+            return (1 - elapsed) * rate.period
+
+        # until the overlapping share of the previous window leaves room
+        return max(0, 1 - free / previous - elapsed) * rate.period
+
+    def refund(self, key, rate):
+        """
+        Uncounts a request which was refused by another limit
+        :param key: str
+        :param rate: Rate
+        :return: None
+        """
+        window = int(time.time() / rate.period)
+
+        try:
+            self.cache.decr(self.window_key(key, rate, window))
+        except ValueError:
+            # the window is over, so is its count
+            pass
+
+    def clear(self):
+        self.cache.clear()
+
+
+@lru_cache(maxsize=None)
+def _store(path):
+    return import_string(path)()
+
+
+def get_store():
+    """
+    Returns the store set in THROTTLE_STORE setting, it is created once
+    per process
+    :return: LocalStore, CacheStore or another store with hit(key, rate)
+             and refund(key, rate)
+    """
+    return _store(settings.THROTTLE_STORE)
+
+
+class KeyedRateThrottle(BaseThrottle):
+    """
+    Applies THROTTLE_RATES of the view's throttle_scope, see the module
+    docstring
+    """
+
+    def __init__(self):
+        self.wait_seconds = 0
+
+    def get_key(self, kind, request):
+        if kind == 'ip':
+            return self.get_ident(request)
+        if kind == 'email':
+            # the body may be a JSON list or scalar
+            email = (request.data.get('email')
+                     if isinstance(request.data, dict) else None)
+            return email.strip().lower() if isinstance(email, str) else None
+        if kind == 'user':
+            return request.user.is_authenticated and str(request.user.id)
+
+        raise ValueError(f'Unknown throttle key {kind}')
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        store = get_store()
+        counted = []
+
+        for kind, rate in settings.THROTTLE_RATES.get(scope, {}).items():
+            value = self.get_key(kind, request)
+            if not value:
+                continue
+
+            digest = hashlib.md5(value.encode()).hexdigest()
+            key, rate = f'{scope}:{kind}:{digest}', parse_rate(rate)
+
+            self.wait_seconds = store.hit(key, rate)
+            if self.wait_seconds:
+                for counted_key, counted_rate in counted:
+                    store.refund(counted_key, counted_rate)
+
+                return False
+
+            counted.append((key, rate))
+
+        return True
+
+    def wait(self):
+        return self.wait_seconds
@@ -7,6 +7,8 @@ urlpatterns = [
         path('token-validation', views.TokenValidation.as_view()),
         path('login', views.UserLogin.as_view()),
         path('logout', views.UserLogout.as_view()),
+        path('tokens', views.UserTokensView.as_view()),
+        path('tokens/<str:device_id>', views.UserTokenDetailView.as_view()),
         path('register', views.UserRegistration.as_view()),
         path('activate/<str:encrypted_email>/<slug:email_token>',
              views.UserActivation.as_view()),
@@ -1,14 +1,10 @@
 from django.conf import settings
 from django.contrib.auth.models import BaseUserManager
-from sendgrid import SendGridAPIClient, Email
-from sendgrid.helpers.mail import Mail, Content
-from smtplib import SMTPException
 
 from .cryptography import encode
+from .mail import EmailMessage
 from .tokens import account_activation_token
 
-SG = SendGridAPIClient(apikey=settings.SENDGRID_API_KEY)
-
 
 class UserManager(BaseUserManager):
 
@@ -43,39 +39,26 @@ class UserManager(BaseUserManager):
         return self._create_user(email, password, **extra_fields)
 
 
-def send_email_confirmation(user, to_email=None):
+def confirmation_email(user, to_email=None):
     """
-    Sends an email on to_email
+    Builds an email with the account activation link
     :param user: User
     :param to_email: target email to send confirmation
-    :return: Boolean
+    :return: EmailMessage
     """
-
-    from_email = Email(settings.EMAIL_HOST_USER)
-    to_email = Email(to_email if to_email else user.email)
+    to_email = to_email if to_email else user.email
 
     email_token = account_activation_token.make_token(user)
 
-    encrypted_email = encode(to_email.email)
+    encrypted_email = encode(to_email)
 
-    subject = f'Confirm {to_email.email} on SStove'
-    content = Content('text/plain', (
-        f'We just needed to verify that {to_email.email} '
+    subject = f'Confirm {to_email} on SStove'
+    body = (
+        f'We just needed to verify that {to_email} '
         f'is your email address.'
         f' Just click the link below \n'
         f'{settings.LOCAL_DOMAIN}/api/users/activate/'
         f'{encrypted_email}/{email_token}'
-    ))
-
-    mail = Mail(from_email, subject, to_email, content)
-
-    try:
-        body = mail.get()
-
-        SG.client.mail.send.post(
-            request_body=body
-        )
-    except SMTPException:
-        return False
+    )
 
-    return True
+    return EmailMessage(settings.EMAIL_HOST_USER, to_email, subject, body)
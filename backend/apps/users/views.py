@@ -1,30 +1,34 @@
-from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.authtoken.models import Token
 from rest_framework.permissions import (AllowAny, IsAuthenticated)
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from exceptions import ValidationError
 
-from .serializers import (RegistrationSerializer, LoginSerializer)
+from .authentication import (ExpiringTokenAuthentication, invalidate_token,
+                             is_token_active, revoke_tokens)
+from .serializers import (RegistrationSerializer, LoginSerializer,
+                          UserTokenSerializer)
+from .throttling import KeyedRateThrottle
 from .tokens import account_activation_token
 from .cryptography import decode
-from .models import User
-from .utils import send_email_confirmation
+from .models import User, UserToken
+from .outbox import queue_email_confirmation
 
 
 class UserLogin(APIView):
 
     permission_classes = (AllowAny,)
+    throttle_classes = (KeyedRateThrottle,)
+    throttle_scope = 'login'
 
     def post(self, request):
         """
-        :param request: HttpRequest
-        :return: Response({user_token, user_id}, status)
+        Returns the active token of the device, devices of a user log in
+        and out independently
+        :param request: HttpRequest with {email, password, device_id}
+        :return: Response({token, device_id}, status)
                  Response({message}, status)
         """
         serializer = LoginSerializer(data=request.data)
@@ -34,39 +38,101 @@ class UserLogin(APIView):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        user = User.objects.get(email=serializer.validated_data['email'])
-        user_token, _ = Token.objects.get_or_create(user=user)
-
-        if not TokenValidation.is_token_active(user_token):
-            user_token.delete()
-            user_token = Token.objects.create(user=user)
+        user = serializer.validated_data['user']
+        device_id = serializer.validated_data['device_id']
+        # expired tokens are left to the purge_tokens command
+        user_token = UserToken.objects.active().filter(
+            user=user, device_id=device_id
+        ).first()
+        if user_token is None:
+            user_token = UserToken.objects.create(user=user,
+                                                  device_id=device_id)
 
         return Response({
             'token': user_token.key,
+            'device_id': device_id,
         }, status=status.HTTP_200_OK)
 
 
 class UserLogout(APIView):
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def post(self, request):
         """
-        Deletes user's token after logout
+        Deletes the token of the calling device after logout, other
+        devices stay logged in
         :param request: HttpRequest
         :return: Response({message}, status)
         """
-        token_key = request.META['HTTP_AUTHORIZATION'][6:]
-        Token.objects.get(key=token_key).delete()
+        token_key = request.auth.key
+        UserToken.objects.filter(key=token_key).delete()
+        invalidate_token(token_key)
 
         return Response({'message': 'User has been logged out'},
                         status=status.HTTP_200_OK)
 
 
+class UserTokensView(APIView):
+
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        """
+        Lists active tokens of the user's devices
+        :param request: HttpRequest
+        :return: Response([{device_id, created, last_used, expires_at,
+                            current}], status)
+        """
+        tokens = UserToken.objects.active().filter(
+            user=request.user
+        ).order_by('device_id', 'created')
+
+        serializer = UserTokenSerializer(tokens, many=True,
+                                         context={'request': request})
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        """
+        Revokes tokens of all the user's devices, the calling one included
+        :param request: HttpRequest
+        :return: Response({revoked}, status)
+        """
+        revoked = revoke_tokens(request.user)
+
+        return Response({'revoked': revoked}, status=status.HTTP_200_OK)
+
+
+class UserTokenDetailView(APIView):
+
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def delete(self, request, device_id):
+        """
+        Revokes tokens of a device of the user
+        :param request: HttpRequest
+        :param device_id: str
+        :return: Response({revoked}, status)
+        """
+        revoked = revoke_tokens(request.user, device_id)
+        if not revoked:
+            return Response(
+                {'message': f'Device {device_id} has no token'},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        return Response({'revoked': revoked}, status=status.HTTP_200_OK)
+
+
 class UserRegistration(APIView):
 
     permission_classes = (AllowAny,)
+    throttle_classes = (KeyedRateThrottle,)
+    throttle_scope = 'registration'
 
     def post(self, request):
         """
@@ -87,6 +153,8 @@ class UserRegistration(APIView):
 class UserActivation(APIView):
 
     permission_classes = (AllowAny,)
+    throttle_classes = (KeyedRateThrottle,)
+    throttle_scope = 'activation'
 
     def post(self, request, encrypted_email, email_token):
         """
@@ -97,7 +165,12 @@ class UserActivation(APIView):
         :return: Response({message}, status)
         """
 
-        email = decode(encrypted_email)
+        try:
+            email = decode(encrypted_email)
+        except ValueError:
+            return Response({'message': 'Invalid link'},
+                            status=status.HTTP_403_FORBIDDEN)
+
         user = get_object_or_404(User, email=email)
 
         if user.is_active:
@@ -118,6 +191,8 @@ class UserActivation(APIView):
 
 
 class UserRetryActivation(APIView):
+    throttle_classes = (KeyedRateThrottle,)
+    throttle_scope = 'retry_activation'
 
     def get(self, request):
         """
@@ -127,7 +202,8 @@ class UserRetryActivation(APIView):
         :return: Response({status, message})
         """
 
-        email = request.data.get('email')
+        email = (request.data.get('email')
+                 if isinstance(request.data, dict) else None)
         if not email:
             raise ValidationError('Email is required')
 
@@ -139,7 +215,7 @@ class UserRetryActivation(APIView):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        send_email_confirmation(user)
+        queue_email_confirmation(user)
 
         return Response(
             {'message': 'Confirmation email has been sent'},
@@ -148,7 +224,7 @@ class UserRetryActivation(APIView):
 
 
 class TokenValidation(APIView):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get(self, request):
@@ -156,17 +232,11 @@ class TokenValidation(APIView):
         :param request: HTTP request
         :return: Response(status)
         """
-        token_key = request.META.get('HTTP_AUTHORIZATION')[6:]
-        token = Token.objects.get(key=token_key)
-        if TokenValidation.is_token_active(token):
+        if TokenValidation.is_token_active(request.auth):
             return Response(status=status.HTTP_200_OK)
 
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
     @staticmethod
     def is_token_active(token):
-        if (timezone.now() > token.created + settings.USER_TOKEN_LIFETIME or
-                token is None):
-            return False
-
-        return True
+        return is_token_active(token)
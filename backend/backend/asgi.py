@@ -0,0 +1,47 @@
+"""
+ASGI config for backend project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``. Stove events (see stoves.streams) are served by
+coroutines, which hold no thread per connection; every other request is
+passed to the Django WSGI application through asgiref's WsgiToAsgi,
+whose thread pool is sized by the ASGI_THREADS environment variable.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from asgiref.wsgi import WsgiToAsgi  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+
+from stoves.streams import StoveEventsApp  # noqa: E402
+
+wsgi_handler = WSGIHandler()
+
+
+def django_application(environ, start_response):
+    """
+    Runs the Django WSGI handler for WsgiToAsgi, which neither sets the
+    length of chunked request bodies nor closes responses, so
+    request_finished would never be sent
+    :param environ: dict
+    :param start_response: callable
+    :return: iterable of bytes
+    """
+    if 'CONTENT_LENGTH' not in environ:
+        body = environ['wsgi.input']
+        environ['CONTENT_LENGTH'] = str(body.seek(0, os.SEEK_END))
+        body.seek(0)
+
+    response = wsgi_handler(environ, start_response)
+    try:
+        yield from response
+    finally:
+        response.close()
+
+
+application = StoveEventsApp(fallback=WsgiToAsgi(django_application))
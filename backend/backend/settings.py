@@ -31,7 +31,6 @@ INSTALLED_APPS = [
     'dishes',
     'stoves',
     'rest_framework',
-    'rest_framework.authtoken',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -79,6 +78,83 @@ DATABASES = {
 }
 
 
+# Cache
+
+CACHES = {
+    'default': env.cache(default='locmemcache://'),
+    # Revoked tokens are dropped from this cache, deployments running more
+    # than one process need a shared one (Redis, memcached), see
+    # users.checks.
+    'tokens': env.cache('TOKEN_CACHE_URL', default='locmemcache://tokens'),
+    # LocMemCache culls the least recently used entries over MAX_ENTRIES.
+    # Dish cache versions are invalidated in this cache, so deployments
+    # running more than one process need a shared one (Redis, memcached),
+    # see dishes.checks.
+    'dishes': env.cache(
+        'DISH_CACHE_URL', default='locmemcache://dishes?max_entries=10000'
+    ),
+    # Counters of users.throttling.CacheStore only, which clears it
+    'throttle': env.cache('THROTTLE_CACHE_URL',
+                          default='locmemcache://throttle'),
+}
+
+
+# Password hashing, see users.hashers and users.passwords.
+# PASSWORD_HASHER hashes new passwords, hashes made by the other hashers
+# are still verified and upgraded on login. It is Django's PBKDF2 unless
+# a deployment opts in to scrypt or argon2.
+PASSWORD_HASHER = env('PASSWORD_HASHER', default='pbkdf2')
+PASSWORD_HASHER_CLASSES = {
+    'scrypt': 'users.hashers.ScryptPasswordHasher',
+    # needs the argon2-cffi package
+    'argon2': 'users.hashers.Argon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'pbkdf2_sha1': 'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CLASSES.items()
+    if name != PASSWORD_HASHER
+]
+# 16 MiB and about 50 ms per hash with the defaults
+PASSWORD_SCRYPT = {
+    'n': env.int('PASSWORD_SCRYPT_N', default=2 ** 14),
+    'r': env.int('PASSWORD_SCRYPT_R', default=8),
+    'p': env.int('PASSWORD_SCRYPT_P', default=1),
+}
+# memory_cost is in KiB
+PASSWORD_ARGON2 = {
+    'time_cost': env.int('PASSWORD_ARGON2_TIME_COST', default=3),
+    'memory_cost': env.int('PASSWORD_ARGON2_MEMORY_COST', default=65536),
+    'parallelism': env.int('PASSWORD_ARGON2_PARALLELISM', default=4),
+}
+# Threads hashing passwords and checks waiting for them, checks over
+# both are refused with 503 instead of piling up behind a login storm.
+# It caps concurrent hashing only, the request still waits for its hash.
+PASSWORD_CHECK_WORKERS = env.int('PASSWORD_CHECK_WORKERS', default=4)
+PASSWORD_CHECK_QUEUE_SIZE = env.int('PASSWORD_CHECK_QUEUE_SIZE', default=64)
+
+REST_FRAMEWORK = {
+    # Reverse proxies in front of the app which append to X-Forwarded-For.
+    # 0 keys throttling on REMOTE_ADDR, any other value trusts that many
+    # addresses from the end of X-Forwarded-For, so it must match the
+    # deployment or clients can pick their own address.
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=0),
+}
+
+# Request throttling, see users.throttling. Rates are requests/period
+# per client 'ip', 'email' of the request body and authenticated 'user'.
+THROTTLE_STORE = env('THROTTLE_STORE',
+                     default='users.throttling.LocalStore')
+# counters of users.throttling.CacheStore
+THROTTLE_CACHE = 'throttle'
+THROTTLE_LOCAL_MAX_KEYS = 100000
+THROTTLE_RATES = {
+    'login': {'ip': '60/min', 'email': '10/min'},
+    'registration': {'ip': '20/hour'},
+    'activation': {'ip': '60/hour'},
+    'retry_activation': {'ip': '20/hour', 'email': '3/hour'},
+}
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -121,6 +197,14 @@ SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY')
 EMAIL_BACKEND = 'sendgrid_backend.SendgridBackend'
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 ENCODING_DES_KEY = 'ffffffff'
+ENCODING_VERSION = 2
+
+EMAIL_TRANSPORT = env('EMAIL_TRANSPORT',
+                      default='users.mail.SendGridTransport')
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF = timezone.timedelta(minutes=1)
+EMAIL_OUTBOX_LEASE = timezone.timedelta(minutes=5)
 
 
 LOCAL_DOMAIN = 'http://localhost:8000'
@@ -128,4 +212,36 @@ LOCAL_DOMAIN = 'http://localhost:8000'
 
 USER_TOKEN_DURATION_DAYS = 1
 USER_TOKEN_LIFETIME = timezone.timedelta(days=USER_TOKEN_DURATION_DAYS)
-
+USER_TOKEN_CACHE = 'tokens'
+USER_TOKEN_CACHE_TIMEOUT = 300
+# last_used of a token is written at most once per interval
+USER_TOKEN_TOUCH_INTERVAL = timezone.timedelta(minutes=5)
+# expired tokens deleted at once by the purge_tokens command
+USER_TOKEN_PURGE_BATCH_SIZE = 1000
+
+# Memberships are invalidated in this cache, deployments running more
+# than one process need a shared one (Redis, memcached), see stoves.checks
+STOVE_MEMBERSHIP_CACHE = 'default'
+STOVE_MEMBERSHIP_CACHE_TIMEOUT = 300
+
+# stove x user pairs of a bulk cooks request, see stoves.cooks
+STOVE_COOKS_MAX_BULK_SIZE = 10000
+
+# see stoves.events and stoves.streams
+STOVE_EVENTS_BROKER = env('STOVE_EVENTS_BROKER',
+                          default='stoves.events.LocalBroker')
+STOVE_EVENTS_QUEUE_SIZE = 100
+STOVE_EVENTS_KEEPALIVE = 15
+
+# Cooking run samples, see stoves.telemetry
+TELEMETRY_CHUNK_SIZE = 1000
+TELEMETRY_MAX_BATCH_SIZE = 50000
+
+DISHES_IMPORT_BATCH_SIZE = 500
+DISHES_PAGE_SIZE = 100
+DISHES_MAX_PAGE_SIZE = 1000
+DISHES_STREAM_CHUNK_SIZE = 500
+
+# Serialized dishes, see dishes.cache
+DISH_CACHE = 'dishes'
+DISH_CACHE_TIMEOUT = 3600